@@ -12,6 +12,7 @@ class APIConfig:
     host: str
     port: int
     bot_route: str
+    metrics_route: str | None = None
 
 
 def api_config() -> APIConfig:
@@ -26,4 +27,5 @@ def api_config() -> APIConfig:
         received_value = os.environ["PORT"]
         raise errors.ConfigurationError(f"Could not cast PORT ({received_value}) to an int.")
 
-    return APIConfig(host, port, bot_route)
+    metrics_route = os.environ.get("METRICS_ROUTE") or None
+    return APIConfig(host, port, bot_route, metrics_route)
@@ -1,7 +1,7 @@
 """Ida's HTTP API main functionality."""
 from ida_py import bot, server, transformer
 from ida_py.api.config import api_config
-from ida_py.api.utils import assert_post, convert_to_json_dict
+from ida_py.api.utils import assert_post
 
 API_CONFIG = api_config()
 
@@ -42,10 +42,9 @@ def telegram_webhook(request: server.Request) -> server.JSONResponse:
         Whenever the request was invalid or when the bot failed to process the update.
     """
     assert_post(request.method)
-    update_json = convert_to_json_dict(request.body)
 
     try:
-        update = transformer.from_dict(bot.TelegramUpdate, update_json)
+        update = transformer.from_json(bot.TelegramUpdate, request.body)
     except transformer.ValidationError as exc:
         raise server.ApiException({"ok": False, "error": str(exc)}, status_code=400)
 
@@ -59,6 +58,10 @@ def telegram_webhook(request: server.Request) -> server.JSONResponse:
     return server.JSONResponse({"ok": True})
 
 
+if API_CONFIG.metrics_route:
+    app.route(API_CONFIG.metrics_route)(server.metrics_endpoint)
+
+
 def run():
     """Serve Ida' API."""
     app.serve(API_CONFIG.host, API_CONFIG.port)
@@ -2,12 +2,23 @@
 from pathlib import Path
 from typing import Any
 
-from ida_py import urlrequest
+from ida_py import transformer, urlrequest
 from ida_py.bot.config import bot_config
 from ida_py.bot.errors import ExecutionError
-from ida_py.bot.models import Command, TelegramUpdate
+from ida_py.bot.models import (
+    Command,
+    File,
+    GetFile,
+    KeyboardButton,
+    ReplyKeyboardMarkup,
+    SendMessage,
+    SetWebhook,
+    TelegramUpdate,
+)
 
 LAST_MESSAGE_ID = Path(__file__).parent / "last_message_id"
+# Telegram does not serve files larger than this to bots
+MAX_FILE_SIZE = 20 * 1024 * 1024
 BOT_CONFIG = bot_config()
 
 
@@ -57,25 +68,30 @@ def send_message(text: str) -> dict[str, Any]:
     text : str
         Text of the message to be sent.
 
+    Raises
+    ------
+    ExecutionError
+        When Telegram did not send the message, e.g. after being rate limited too long.
+
     References
     ----------
     https://core.telegram.org/bots/api#sendmessage
     """
-    text_work = {"text": Command.WORK.value}
-    text_holiday = {"text": Command.HOLIDAY.value}
-    text_sick = {"text": Command.SICK.value}
-    buttons_row_1 = [text_work, text_holiday, text_sick]
-    reply_markup = {
-        "keyboard": [buttons_row_1],
-        "resize_keyboard": False,
-        "one_time_keyboard": True,
-    }
-    args = {"chat_id": BOT_CONFIG.chat_id, "text": text, "reply_markup": reply_markup}
+    buttons_row_1 = [
+        KeyboardButton(Command.WORK.value),
+        KeyboardButton(Command.HOLIDAY.value),
+        KeyboardButton(Command.SICK.value),
+    ]
+    reply_markup = ReplyKeyboardMarkup(keyboard=[buttons_row_1], one_time_keyboard=True)
+    args = SendMessage(chat_id=BOT_CONFIG.chat_id, text=text, reply_markup=reply_markup)
     endpoint = BOT_CONFIG.endpoint + "sendMessage"
-    response = urlrequest.post(endpoint, json=args)
+    response = urlrequest.post(endpoint, json=args, rate_limit_key=str(BOT_CONFIG.chat_id))
+    try:
+        response_json = response.json()
+        message_id = response_json["result"]["message_id"]
+    except (ValueError, TypeError, KeyError):
+        raise ExecutionError(f"Could not send the message. {response.body!r}")
     print("Sent message", text)
-    response_json = response.json()
-    message_id = response_json["result"]["message_id"]
     _write_last_message_id(message_id)
     return response_json
 
@@ -93,7 +109,7 @@ def set_webhook():
     """
     endpoint = BOT_CONFIG.endpoint + "setWebhook"
     url = f"https://{BOT_CONFIG.domain_name}{BOT_CONFIG.bot_route}"
-    args = {"url": url, "secret_token": BOT_CONFIG.webhook_token}
+    args = SetWebhook(url=url, secret_token=BOT_CONFIG.webhook_token)
     response = urlrequest.post(endpoint, json=args)
     response_json: dict = response.json()
     if not response_json.get("ok"):
@@ -102,6 +118,41 @@ def set_webhook():
     return response_json
 
 
+def download_file(file_id: str, path: Path) -> urlrequest.Download:
+    """Download a file that was sent to the bot, e.g. a photo of a receipt, to `path`.
+
+    Parameters
+    ----------
+    file_id : str
+        The identifier of the file, as found in the message.
+    path : Path
+        Where to write the file, an interrupted download to the same path is resumed.
+
+    Raises
+    ------
+    ExecutionError
+        When the file could not be found or downloaded.
+
+    References
+    ----------
+    https://core.telegram.org/bots/api#getfile
+    """
+    response = urlrequest.post(BOT_CONFIG.endpoint + "getFile", json=GetFile(file_id))
+    try:
+        file = transformer.from_dict(File, response.json()["result"])
+    except (ValueError, TypeError, KeyError, transformer.ValidationError):
+        raise ExecutionError(f"Could not get the file. {response.body!r}")
+    if file.file_path is None:
+        raise ExecutionError("The file can not be downloaded.")
+
+    # The endpoint is https://api.telegram.org/bot<token>/, files are served from /file/bot<token>/
+    url = BOT_CONFIG.endpoint.replace("/bot", "/file/bot", 1) + file.file_path
+    try:
+        return urlrequest.download(url, path, max_size=MAX_FILE_SIZE)
+    except urlrequest.RequestError as exc:
+        raise ExecutionError(f"Could not download the file. {exc}")
+
+
 def _write_last_message_id(message_id: int) -> None:
     LAST_MESSAGE_ID.write_text(str(message_id))
 
@@ -2,7 +2,9 @@
 from __future__ import annotations  # Required to support `Command.new()` return-type
 
 from dataclasses import dataclass, field
+from datetime import datetime
 from enum import Enum
+from typing import Literal
 
 
 class Command(Enum):
@@ -22,7 +24,7 @@ def new(cls, value: str) -> Command | None:
             return None
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Chat:
     """Represent a Chat from telegram.
 
@@ -32,13 +34,13 @@ class Chat:
     """
 
     id: int
-    type: str
+    type: Literal["private", "group", "supergroup", "channel"]
     first_name: str | None = None
     last_name: str | None = None
     username: str | None = None
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class User:
     """Represent a User from telegram.
 
@@ -53,23 +55,63 @@ class User:
     language_code: str | None = None
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
+class PhotoSize:
+    """Represent one size of a photo from telegram.
+
+    References
+    ----------
+    https://core.telegram.org/bots/api#photosize
+    """
+
+    file_id: str
+    file_unique_id: str
+    width: int
+    height: int
+    file_size: int | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class MessageEntity:
+    """Represent a special entity in a text message from telegram, e.g. a hashtag or a URL.
+
+    References
+    ----------
+    https://core.telegram.org/bots/api#messageentity
+    """
+
+    type: str
+    offset: int
+    length: int
+    url: str | None = None
+    user: User | None = None
+    language: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
 class Message:
     """Represent a Message from telegram.
 
+    The sizes of a photo are only decoded when they are accessed, as the bot rarely needs them.
+    The date is received as a unix timestamp and decoded to a datetime in UTC.
+
     References
     ----------
     https://core.telegram.org/bots/api#message
     """
 
-    date: int
+    date: datetime
     chat: Chat
     message_id: int
     from_: User | None = field(default=None, metadata={"alias": "from"})
     text: str | None = None
+    entities: list[MessageEntity] | None = None
+    photo: list[PhotoSize] | None = field(default=None, metadata={"lazy": True})
+    caption: str | None = None
+    caption_entities: list[MessageEntity] | None = None
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class TelegramUpdate:
     """Represent an incoming update from telegram.
 
@@ -80,3 +122,83 @@ class TelegramUpdate:
 
     update_id: int
     message: Message | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class KeyboardButton:
+    """Represent a button of a reply keyboard, its text is sent as a message when pressed.
+
+    References
+    ----------
+    https://core.telegram.org/bots/api#keyboardbutton
+    """
+
+    text: str
+
+
+@dataclass(frozen=True, slots=True)
+class ReplyKeyboardMarkup:
+    """Represent a custom keyboard with reply options.
+
+    References
+    ----------
+    https://core.telegram.org/bots/api#replykeyboardmarkup
+    """
+
+    keyboard: list[list[KeyboardButton]]
+    resize_keyboard: bool = False
+    one_time_keyboard: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class SendMessage:
+    """Represent the parameters of the sendMessage method.
+
+    References
+    ----------
+    https://core.telegram.org/bots/api#sendmessage
+    """
+
+    chat_id: int
+    text: str
+    reply_markup: ReplyKeyboardMarkup | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class SetWebhook:
+    """Represent the parameters of the setWebhook method.
+
+    References
+    ----------
+    https://core.telegram.org/bots/api#setwebhook
+    """
+
+    url: str
+    secret_token: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class GetFile:
+    """Represent the parameters of the getFile method.
+
+    References
+    ----------
+    https://core.telegram.org/bots/api#getfile
+    """
+
+    file_id: str
+
+
+@dataclass(frozen=True, slots=True)
+class File:
+    """Represent a file ready to be downloaded.
+
+    References
+    ----------
+    https://core.telegram.org/bots/api#file
+    """
+
+    file_id: str
+    file_unique_id: str
+    file_size: int | None = None
+    file_path: str | None = None
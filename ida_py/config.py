@@ -0,0 +1,22 @@
+"""Ida's common configuration helpers."""
+import os
+from typing import Any
+
+from ida_py import errors
+
+
+def optional_number(name: str, cast: type, default: Any) -> Any:
+    """Get the environment variable `name` cast to `cast`, or `default` when it is not exported.
+
+    Raises
+    ------
+    ConfigurationError
+        When the variable cannot be cast to `cast`.
+    """
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        raise errors.ConfigurationError(f"Could not cast {name} ({value}) to {cast.__name__}.")
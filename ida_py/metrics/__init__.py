@@ -0,0 +1,2 @@
+"""Ida's metrics."""
+from ida_py.metrics.main import REGISTRY, Counter, Gauge, Histogram, Registry
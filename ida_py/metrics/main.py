@@ -0,0 +1,168 @@
+"""Ida's metrics main functionality."""
+import threading
+from bisect import bisect_left
+from typing import Iterator
+
+LabelValues = tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+    """Represent a metric with a fixed set of label names, rendered in Prometheus text format."""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._lock = threading.Lock()
+
+    def render(self) -> str:
+        """Render the metric in the Prometheus text exposition format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return "\n".join(lines) + "\n"
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError()  # pragma: no cover
+
+    def _label_values(self, labels: dict[str, object]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _format_labels(self, label_values: LabelValues, **extra: str) -> str:
+        pairs = [*zip(self.label_names, label_values), *extra.items()]
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter(_Metric):
+    """Represent a value that only goes up, e.g. the amount of requests."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, label_names)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: object) -> None:
+        """Increment the value for the given labels by `amount`."""
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: object) -> float:
+        """Get the current value for the given labels."""
+        return self._values.get(self._label_values(labels), 0)
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            yield f"{self.name}{self._format_labels(label_values)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """Represent a value that can go up and down, e.g. the amount of requests in flight."""
+
+    type_name = "gauge"
+
+    def dec(self, amount: float = 1, **labels: object) -> None:
+        """Decrement the value for the given labels by `amount`."""
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Represent the distribution of observed values, e.g. latencies, over fixed buckets.
+
+    Only the bucket an observation falls in is incremented, the buckets are made cumulative when
+    they are rendered.
+    """
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[LabelValues, list[float]] = {}  # Bucket counts, then count and sum
+
+    def observe(self, value: float, **labels: object) -> None:
+        """Add an observation of `value` for the given labels."""
+        key = self._label_values(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def count(self, **labels: object) -> int:
+        """Get the amount of observations for the given labels."""
+        series = self._series.get(self._label_values(labels))
+        return int(series[-2]) if series else 0
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            all_series = [(key, list(series)) for key, series in self._series.items()]
+        for label_values, series in all_series:
+            cumulative = 0.0
+            for upper_bound, bucket_count in zip((*self.buckets, "+Inf"), series):
+                cumulative += bucket_count
+                labels = self._format_labels(label_values, le=str(upper_bound))
+                yield f"{self.name}_bucket{labels} {_format_value(cumulative)}"
+            labels = self._format_labels(label_values)
+            yield f"{self.name}_count{labels} {_format_value(series[-2])}"
+            yield f"{self.name}_sum{labels} {_format_value(series[-1])}"
+
+
+class Registry:
+    """Represent a collection of metrics that are rendered together."""
+
+    def __init__(self) -> None:
+        self.metrics: dict[str, _Metric] = {}
+
+    def counter(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> Counter:
+        """Register a Counter, or get the one that was registered under the same name."""
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> Gauge:
+        """Register a Gauge, or get the one that was registered under the same name."""
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """Register a Histogram, or get the one that was registered under the same name."""
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        return "".join(metric.render() for metric in self.metrics.values())
+
+    def _register(self, metric):
+        return self.metrics.setdefault(metric.name, metric)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+REGISTRY = Registry()
@@ -1,4 +1,5 @@
 """Ida's HTTP server."""
 from ida_py.server.errors import ApiException
 from ida_py.server.main import Application
+from ida_py.server.metrics import metrics_endpoint
 from ida_py.server.models import JSONResponse, Request
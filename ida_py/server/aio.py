@@ -0,0 +1,176 @@
+"""Ida's asyncio based HTTP server."""
+import asyncio
+import inspect
+import io
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import BinaryIO, cast
+
+from ida_py.server import metrics
+from ida_py.server.capture import Capture
+from ida_py.server.config import ServerConfig
+from ida_py.server.errors import ApiException
+from ida_py.server.models import Request, Response
+from ida_py.server.routing import Route, Router
+from ida_py.server.utils import (
+    RequestReader,
+    body_length,
+    build_response_parts,
+    wants_keep_alive,
+)
+
+
+class AsyncApplicationServer:
+    """Represent a server that handles all connections on an asyncio event loop.
+
+    Idle or slow connections only cost a coroutine, so many of them can coexist.
+    `async def` routes run inline on the loop, while regular routes run on a bounded pool of
+    threads to avoid blocking the loop.
+    """
+
+    def __init__(
+        self,
+        routes: list[Route],
+        max_workers: int | None = None,
+        max_in_flight: int | None = None,
+        keep_alive_timeout: float = ServerConfig.keep_alive_timeout,
+        max_keep_alive_requests: int = ServerConfig.max_keep_alive_requests,
+        max_header_size: int = ServerConfig.max_header_size,
+        max_body_size: int = ServerConfig.max_body_size,
+        capture: Capture | None = None,
+    ) -> None:
+        self.routes = routes
+        self.router = Router(routes)
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="ida-server")
+        self.max_in_flight = max_in_flight
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_keep_alive_requests = max_keep_alive_requests
+        self.max_header_size = max_header_size
+        self.max_body_size = max_body_size
+        self.capture = capture
+        self._in_flight: asyncio.Semaphore | None = None
+
+    def serve(self, host: str, port: int) -> None:
+        """Serve on host and port until the program is interrupted."""
+        try:
+            asyncio.run(self.serve_forever(host, port))
+        finally:
+            self.executor.shutdown(wait=True)
+            if self.capture is not None:
+                self.capture.close()
+
+    async def serve_forever(self, host: str, port: int) -> None:
+        """Start the server and keep serving until it is cancelled."""
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def start(self, host: str, port: int) -> asyncio.Server:
+        """Start listening on host and port without waiting for the server to stop."""
+        if self.max_in_flight:
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        return await asyncio.start_server(
+            self.handle_connection, host, port, reuse_address=True, backlog=128
+        )
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Handle the requests on the connection until either side wants to close it.
+
+        Like `TCPHandler`, the connection is kept open for further (possibly pipelined) requests
+        until it is idle for too long or the maximum of requests per connection was handled.
+        """
+        request_reader = RequestReader(self.max_header_size, self.max_body_size)
+        try:
+            for remaining in reversed(range(self.max_keep_alive_requests)):
+                try:
+                    request = await self._read_request(reader, request_reader)
+                except ApiException as exc:
+                    metrics.PARSE_FAILURES.inc(status=exc.status_code)
+                    await self._send_response(writer, exc, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                start = time.perf_counter()
+                keep_alive = remaining > 0 and wants_keep_alive(request)
+                async with self._in_flight or nullcontext():
+                    metrics.IN_FLIGHT.inc()
+                    try:
+                        route_name, response = await self._get_response(request)
+                    finally:
+                        metrics.IN_FLIGHT.dec()
+                bytes_out = await self._send_response(writer, response, keep_alive)
+                duration = time.perf_counter() - start
+                bytes_in = request_reader.last_request_size
+                metrics.observe_request(
+                    route_name, response.status_code, duration, bytes_in, bytes_out
+                )
+                if self.capture is not None:
+                    self.capture.record(request, response)
+                if not keep_alive:
+                    break
+            if writer.can_write_eof():
+                writer.write_eof()
+        except ConnectionError:
+            """The client went away, there is nobody left to answer."""
+        finally:
+            writer.close()
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader, request_reader: RequestReader
+    ) -> Request | None:
+        """Read until a complete request is received, None when the connection ends first."""
+        try:
+            while (request := request_reader.next_request()) is None:
+                data = await asyncio.wait_for(reader.read(65536), self.keep_alive_timeout)
+                if not data:
+                    return None
+                request_reader.feed(data)
+        except asyncio.TimeoutError:
+            return None
+        return request
+
+    @staticmethod
+    async def _send_response(
+        writer: asyncio.StreamWriter, response: Response, keep_alive: bool
+    ) -> int:
+        """Write the head and body without concatenating them, file bodies use sendfile.
+
+        The amount of bytes that were sent is returned.
+        """
+        head, body = build_response_parts(response, keep_alive)
+        size = len(head) + body_length(body)
+        if isinstance(body, io.BufferedIOBase):
+            with body:
+                writer.write(head)
+                await writer.drain()
+                loop = asyncio.get_running_loop()
+                # A buffered binary file is what sendfile reads from, its stub asks for IO[bytes]
+                file = cast(BinaryIO, body)
+                await loop.sendfile(writer.transport, file, offset=body.tell())
+            return size
+        writer.writelines([head, body])
+        await writer.drain()
+        return size
+
+    async def _get_response(self, request: Request) -> tuple[str, Response]:
+        """Get the name of the matched route and its response."""
+        route_name = metrics.UNMATCHED_ROUTE
+        try:
+            route_function, request.path_params = self.router.resolve(request.path)
+            route_name = route_function.__name__
+            return route_name, await self._call_route(route_function, request)
+        except ApiException as exc:
+            return route_name, exc
+        except Exception:
+            print(traceback.format_exc())
+            return route_name, ApiException({"ok": False}, 500)
+
+    async def _call_route(self, route_function, request: Request) -> Response:
+        if inspect.iscoroutinefunction(route_function):
+            return await route_function(request)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, route_function, request)
@@ -0,0 +1,165 @@
+"""Ida's HTTP server traffic capture."""
+import atexit
+import gzip
+import io
+import json
+import os
+import queue
+import random
+import threading
+import time
+import traceback
+from dataclasses import is_dataclass
+from pathlib import Path
+from typing import Any
+
+from ida_py import transformer
+from ida_py.server.models import Request, Response
+
+REDACTED = "[REDACTED]"
+
+
+class Capture:
+    """Represent a capture of the requests and responses handled by the server.
+
+    Recording an exchange only puts it on a bounded queue. A background thread drains the queue
+    and writes every exchange as a line of JSON to gzip compressed segments, which are rotated
+    once they hold `segment_size` (uncompressed) bytes. When the queue is full, the exchange is
+    dropped and counted in `dropped` instead of slowing down the request.
+
+    Parameters
+    ----------
+    directory : Path
+        The directory to write the segments to.
+    sample_rate : float, optional
+        The fraction of exchanges to capture, by default 1.0 (all of them).
+    queue_size : int, optional
+        The maximum amount of exchanges waiting to be written, by default 1024.
+    segment_size : int, optional
+        The uncompressed size after which a new segment is started, by default 16 MiB.
+    max_segments : int, optional
+        The amount of segments to keep, the oldest are removed first, by default 10.
+    redacted_headers : tuple[str, ...], optional
+        The (uppercase) names of the request headers whose value is redacted,
+        by default the telegram secret token.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        sample_rate: float = 1.0,
+        queue_size: int = 1024,
+        segment_size: int = 16 * 1024 * 1024,
+        max_segments: int = 10,
+        redacted_headers: tuple[str, ...] = ("X-TELEGRAM-BOT-API-SECRET-TOKEN",),
+    ) -> None:
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.redacted_headers = redacted_headers
+        self.dropped = 0
+        self.queue: queue.Queue[tuple[float, Request, Response] | None] = queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._segments: list[Path] = []
+        self._segment_count = 0
+        self._segment: io.TextIOWrapper | None = None
+        self._segment_written = 0
+
+    def record(self, request: Request, response: Response) -> None:
+        """Queue the exchange to be written, unless it is not sampled or the queue is full."""
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:  # nosec B311
+            return
+        if self._thread is None:
+            self._start()
+        try:
+            self.queue.put_nowait((time.time(), request, response))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def close(self) -> None:
+        """Write the exchanges that are still queued and close the current segment."""
+        if self._thread is None:
+            return
+        self.queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def _start(self) -> None:
+        """Start the writer, which is done lazily so each (forked) process starts its own."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.directory.mkdir(exist_ok=True, parents=True)
+            self._thread = threading.Thread(target=self._drain, name="ida-capture", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _drain(self) -> None:
+        while (exchange := self.queue.get()) is not None:
+            try:
+                self._write(*exchange)
+            except Exception:
+                print(traceback.format_exc())
+            if self.queue.empty() and self._segment is not None:
+                self._segment.flush()
+        self._close_segment()
+
+    def _write(self, timestamp: float, request: Request, response: Response) -> None:
+        line = json.dumps(self._to_record(timestamp, request, response)) + "\n"
+        if self._segment is None or self._segment_written >= self.segment_size:
+            self._rotate()
+        assert self._segment is not None
+        self._segment.write(line)
+        self._segment_written += len(line)
+
+    def _to_record(self, timestamp: float, request: Request, response: Response) -> dict:
+        headers = {
+            key: REDACTED if key in self.redacted_headers else value
+            for key, value in request.headers.items()
+        }
+        return {
+            "timestamp": timestamp,
+            "request": {
+                "method": request.method,
+                "path": request.path,
+                "query_params": request.query_params,
+                "headers": headers,
+                "body": request.body,
+            },
+            "response": {
+                "status_code": response.status_code,
+                "content_type": response.content_type,
+                "headers": response.headers,
+                "body": _to_json_value(response.body),
+            },
+        }
+
+    def _rotate(self) -> None:
+        self._close_segment()
+        name = f"{int(time.time())}-{os.getpid()}-{self._segment_count:04d}.jsonl.gz"
+        self._segment_count += 1
+        segment_path = self.directory / name
+        self._segment = gzip.open(segment_path, "wt", encoding="utf-8")
+        self._segment_written = 0
+        self._segments.append(segment_path)
+        while len(self._segments) > self.max_segments:
+            self._segments.pop(0).unlink(missing_ok=True)
+
+    def _close_segment(self) -> None:
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+
+def _to_json_value(body: Any) -> Any:
+    """Convert a response body to a value that can be dumped to JSON, file bodies are omitted."""
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        return bytes(body).decode(errors="replace")
+    if isinstance(body, io.BufferedIOBase):
+        return None
+    if is_dataclass(body):
+        return transformer.to_dict(body)
+    return body
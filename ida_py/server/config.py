@@ -2,9 +2,12 @@
 import os
 from dataclasses import dataclass
 from distutils.util import strtobool
-from typing import Literal
+from typing import Literal, get_args
 
 from ida_py import errors
+from ida_py.config import optional_number
+
+Concurrency = Literal["single", "thread", "process", "asyncio"]
 
 
 @dataclass
@@ -12,15 +15,58 @@ class ServerConfig:
     """Represent the configuration for the HTTP server."""
 
     write_to_file: Literal[0, 1] = 0
+    concurrency: Concurrency = "thread"
+    max_workers: int | None = None
+    max_in_flight: int | None = None
+    keep_alive_timeout: float = 5.0
+    max_keep_alive_requests: int = 100
+    max_header_size: int = 16 * 1024
+    max_body_size: int = 1024 * 1024
+    drain_timeout: float = 20.0
+    capture_directory: str | None = None
+    capture_sample_rate: float = 1.0
+    capture_queue_size: int = 1024
 
 
 def server_config() -> ServerConfig:
     """Attempt to get the config's fields from the environment."""
     try:
-        write_to_file = strtobool(os.environ["WRITE_TO_FILE"])
-    except KeyError:
-        return ServerConfig()
+        write_to_file = strtobool(os.environ.get("WRITE_TO_FILE", "0"))
     except ValueError as exc:
         raise errors.ConfigurationError(f"Please export {exc} as a boolean environment variable.")
 
-    return ServerConfig(write_to_file=write_to_file)
+    concurrency = os.environ.get("SERVER_CONCURRENCY", ServerConfig.concurrency)
+    if concurrency not in get_args(Concurrency):
+        raise errors.ConfigurationError(
+            f"SERVER_CONCURRENCY ({concurrency}) should be one of {get_args(Concurrency)}."
+        )
+
+    return ServerConfig(
+        write_to_file=write_to_file,
+        concurrency=concurrency,  # type: ignore[arg-type]
+        max_workers=_optional_int("SERVER_MAX_WORKERS"),
+        max_in_flight=_optional_int("SERVER_MAX_IN_FLIGHT"),
+        keep_alive_timeout=optional_number(
+            "SERVER_KEEP_ALIVE_TIMEOUT", float, ServerConfig.keep_alive_timeout
+        ),
+        max_keep_alive_requests=optional_number(
+            "SERVER_MAX_KEEP_ALIVE_REQUESTS", int, ServerConfig.max_keep_alive_requests
+        ),
+        max_header_size=optional_number(
+            "SERVER_MAX_HEADER_SIZE", int, ServerConfig.max_header_size
+        ),
+        max_body_size=optional_number("SERVER_MAX_BODY_SIZE", int, ServerConfig.max_body_size),
+        drain_timeout=optional_number("SERVER_DRAIN_TIMEOUT", float, ServerConfig.drain_timeout),
+        capture_directory=os.environ.get("CAPTURE_DIRECTORY") or None,
+        capture_sample_rate=optional_number(
+            "CAPTURE_SAMPLE_RATE", float, ServerConfig.capture_sample_rate
+        ),
+        capture_queue_size=optional_number(
+            "CAPTURE_QUEUE_SIZE", int, ServerConfig.capture_queue_size
+        ),
+    )
+
+
+def _optional_int(name: str) -> int | None:
+    """Get the environment variable `name` as an int, or None when it is not exported."""
+    return optional_number(name, int, None)
@@ -1,108 +1,358 @@
 """Ida's HTTP server main functionality."""
+import asyncio
+import os
 import re
+import selectors
 import signal
 import socketserver
+import time
 import traceback
-from datetime import datetime, timezone
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from socket import SHUT_WR, socket
-from typing import Callable, NoReturn
-
-from ida_py.server.config import server_config
+from socket import SHUT_WR, SO_REUSEPORT, SOL_SOCKET, socket, socketpair
+from threading import BoundedSemaphore, Lock, Thread, local
+from typing import Any, Callable, Coroutine, NoReturn, cast
+
+from ida_py.server import metrics
+from ida_py.server.aio import AsyncApplicationServer
+from ida_py.server.capture import Capture
+from ida_py.server.config import Concurrency, server_config
 from ida_py.server.errors import ApiException
-from ida_py.server.utils import build_response, parse_request
-
-Route = tuple[re.Pattern, Callable]
+from ida_py.server.models import Request, Response
+from ida_py.server.routing import Route, Router
+from ida_py.server.supervisor import Supervisor
+from ida_py.server.utils import RequestReader, send_response, wants_keep_alive
 
 SERVER_CONFIG = server_config()
+# The event loop per handler thread, on which the async routes requested on that thread run
+_EVENT_LOOPS = local()
+
+
+def server_capture() -> Capture | None:
+    """Create the traffic capture when WRITE_TO_FILE is enabled, by default in tests/data/server."""
+    if not SERVER_CONFIG.write_to_file:
+        return None
+    root = Path(__file__).parent.parent.parent
+    directory = SERVER_CONFIG.capture_directory or root / "tests" / "data" / "server"
+    return Capture(
+        Path(directory),
+        sample_rate=SERVER_CONFIG.capture_sample_rate,
+        queue_size=SERVER_CONFIG.capture_queue_size,
+    )
+
+
+@dataclass
+class KeptAlive:
+    """Represent a kept-alive connection between two requests, see `TCPHandler`."""
+
+    reader: RequestReader
+    remaining: int  # The amount of requests the connection may still send
 
 
 class ApplicationServer(socketserver.TCPServer):
-    """Represent a TCPServer that supports routes and whose address can be reused."""
+    """Represent a TCPServer that supports routes and whose address can be reused.
+
+    With `reuse_port`, several processes can bind the same port (SO_REUSEPORT) and the kernel
+    balances the connections between them. Once `draining`, responses ask to close the connection.
+
+    A connection is closed after a single request, as a kept-alive connection would block the
+    server until it sends its next request. Subclasses that can wait for idle connections without
+    blocking set `keep_alive`, the idle connections are then put in `idle` by the handler.
+    """
 
     allow_reuse_address = True
+    request_queue_size = 128
+    keep_alive = False
+    capture: Capture | None
+    draining: bool
+
+    def __init__(
+        self,
+        *args,
+        routes: list[Route] | None = None,
+        capture: Capture | None = None,
+        reuse_port: bool = False,
+        **kwargs,
+    ) -> None:
+        self.routes = routes if routes is not None else []
+        self.router = Router(self.routes)
+        self.capture = capture
+        self.allow_reuse_port = reuse_port
+        self.draining = False
+        self.idle: dict[socket, KeptAlive] = {}
+        super().__init__(*args, **kwargs)
 
-    def __init__(self, *args, routes: list[Route] | None = None, **kwargs) -> None:
-        self.routes = routes or []
+    def server_bind(self) -> None:
+        """Bind the socket, allowing other processes to bind the same port with `reuse_port`."""
+        if self.allow_reuse_port:
+            self.socket.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+        super().server_bind()
+
+    def server_close(self) -> None:
+        """Close the server and write the exchanges that are still waiting to be captured."""
+        super().server_close()
+        if self.capture is not None:
+            self.capture.close()
+
+
+class ThreadPoolApplicationServer(ApplicationServer):
+    """Represent an ApplicationServer that handles its requests on a bounded pool of threads.
+
+    Accepting new connections blocks once `max_in_flight` requests are being handled, which leaves
+    the remaining connections in the listen backlog instead of queueing them without bounds.
+    Connections are kept alive between requests, while idle they are watched by a single thread
+    (see `IdleConnections`) instead of holding a pool thread and an in-flight slot.
+    """
+
+    keep_alive = True
+
+    def __init__(
+        self, *args, max_workers: int | None = None, max_in_flight: int | None = None, **kwargs
+    ) -> None:
+        max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="ida-server")
+        self.in_flight = BoundedSemaphore(max_in_flight or max_workers * 2)
+        self.idle_connections = IdleConnections(
+            self.process_request, self.shutdown_request, SERVER_CONFIG.keep_alive_timeout
+        )
         super().__init__(*args, **kwargs)
 
+    def process_request(self, request, client_address) -> None:
+        """Submit the request to the pool once a slot is available."""
+        self.in_flight.acquire()
+        future = self.executor.submit(self._process_request_in_pool, request, client_address)
+        future.add_done_callback(self._release_slot)
+
+    def server_close(self) -> None:
+        """Stop listening, close the idle connections, then wait for the requests in flight."""
+        self.socket.close()
+        self.idle_connections.close()
+        self.executor.shutdown(wait=True)
+        super().server_close()
+
+    def _process_request_in_pool(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.idle.pop(request, None)
+            self.handle_error(request, client_address)
+        finally:
+            if request in self.idle:
+                self.idle_connections.add(request, client_address)
+            else:
+                self.shutdown_request(request)
+
+    def _release_slot(self, _: Future) -> None:
+        self.in_flight.release()
+
+
+class IdleConnections:
+    """Represent the kept-alive connections that wait for their next request.
+
+    A single thread watches them with a selector. A connection is handed to `resume` once it is
+    readable, or to `close` once it was idle for `timeout` seconds or the watcher is closed.
+    """
+
+    def __init__(
+        self, resume: Callable[[socket, Any], None], close: Callable[[socket], None], timeout: float
+    ) -> None:
+        self.resume = resume
+        self.close_connection = close
+        self.timeout = timeout
+        self._added: list[tuple[socket, Any]] = []
+        self._closed = False
+        self._lock = Lock()
+        self._wakeup_reader, self._wakeup_writer = socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._wakeup_writer.setblocking(False)
+        self._thread = Thread(target=self._watch, name="ida-server-idle", daemon=True)
+        self._thread.start()
+
+    def add(self, tcp_socket: socket, client_address: Any) -> None:
+        """Watch the connection until its next request arrives."""
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._added.append((tcp_socket, client_address))
+        if closed:
+            self.close_connection(tcp_socket)
+        else:
+            self._wake_up()
+
+    def close(self) -> None:
+        """Stop watching and close the idle connections."""
+        with self._lock:
+            self._closed = True
+        self._wake_up()
+        self._thread.join()
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+
+    def _wake_up(self) -> None:
+        try:
+            self._wakeup_writer.send(b"\0")
+        except OSError:
+            """The watcher is woken up already when the socket buffer is full."""
+
+    def _watch(self) -> None:
+        deadlines: dict[socket, float] = {}
+        with selectors.DefaultSelector() as selector:
+            selector.register(self._wakeup_reader, selectors.EVENT_READ)
+            while True:
+                with self._lock:
+                    added, self._added = self._added, []
+                    closed = self._closed
+                now = time.monotonic()
+                for tcp_socket, client_address in added:
+                    selector.register(tcp_socket, selectors.EVENT_READ, client_address)
+                    deadlines[tcp_socket] = now + self.timeout
+                if closed:
+                    break
+
+                timeout = min(deadlines.values()) - now if deadlines else None
+                for key, _ in selector.select(timeout):
+                    if key.fileobj is self._wakeup_reader:
+                        self._drain_wakeups()
+                        continue
+                    tcp_socket = cast(socket, key.fileobj)
+                    selector.unregister(tcp_socket)
+                    del deadlines[tcp_socket]
+                    self.resume(tcp_socket, key.data)
+
+                now = time.monotonic()
+                for tcp_socket in [conn for conn, deadline in deadlines.items() if deadline <= now]:
+                    selector.unregister(tcp_socket)
+                    del deadlines[tcp_socket]
+                    self.close_connection(tcp_socket)
+
+        for tcp_socket in deadlines:
+            self.close_connection(tcp_socket)
+
+    def _drain_wakeups(self) -> None:
+        try:
+            while self._wakeup_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            """Every wake-up was read."""
+
 
 class TCPHandler(socketserver.BaseRequestHandler):
-    """Represent a TCPHandler which handles request and ensures the tcp_socket is shutdown."""
+    """Represent a TCPHandler which handles request and ensures the tcp_socket is shutdown.
+
+    When the server supports it, the connection is kept open for further (possibly pipelined)
+    requests, which are handled in the order they were received, until either side asks to close
+    it, it is idle for SERVER_CONFIG.keep_alive_timeout seconds or
+    SERVER_CONFIG.max_keep_alive_requests were handled. Once no further request was received, the
+    connection is put in the server's `idle` connections instead of waiting for it.
+    """
 
     def handle(self):
-        """Handle the tcp request."""
+        """Handle the tcp requests."""
         tcp_socket: socket = self.request
-        request_str = tcp_socket.recv(4096).decode()
-        self._write_to_file(request_str, "request")
+        tcp_socket.settimeout(SERVER_CONFIG.keep_alive_timeout)
+        server = self._application_server()
+        connection = server.idle.pop(tcp_socket, None) or KeptAlive(
+            RequestReader(SERVER_CONFIG.max_header_size, SERVER_CONFIG.max_body_size),
+            SERVER_CONFIG.max_keep_alive_requests,
+        )
+        reader = connection.reader
+        while connection.remaining > 0:
+            connection.remaining -= 1
+            try:
+                request = self._read_request(tcp_socket, reader)
+            except ApiException as exc:
+                metrics.PARSE_FAILURES.inc(status=exc.status_code)
+                send_response(tcp_socket, exc, keep_alive=False)
+                return
+            if request is None:
+                return
+            if not self._handle_request(tcp_socket, request, reader, connection.remaining > 0):
+                return
+            if reader.is_idle():
+                server.idle[tcp_socket] = connection
+                return
+
+    def _handle_request(
+        self, tcp_socket: socket, request: Request, reader: RequestReader, allow_keep_alive: bool
+    ) -> bool:
+        """Handle a single request and return whether the connection should be kept alive."""
+        server = self._application_server()
+        start = time.perf_counter()
+        metrics.IN_FLIGHT.inc()
+        keep_alive = (
+            allow_keep_alive
+            and server.keep_alive
+            and not server.draining
+            and wants_keep_alive(request)
+        )
+        route_name = metrics.UNMATCHED_ROUTE
+        response: Response
         try:
-            request = parse_request(request_str)
-            route_function = self._get_route_function(request.path)
-            response = route_function(request)
+            route_function, request.path_params = self._resolve_route(request.path)
+            route_name = route_function.__name__
+            result: Response | Coroutine[Any, Any, Response] = route_function(request)
+            if isinstance(result, Response):
+                response = result
+            else:
+                response = _event_loop().run_until_complete(result)
         except ApiException as exc:
             response = exc
         except Exception:
             print(traceback.format_exc())
             response = ApiException({"ok": False}, 500)
-        response_str = build_response(response)
-        self._write_to_file(response_str, "response")
-        response_bytes = response_str.encode()
-        tcp_socket.sendall(response_bytes)
+        finally:
+            metrics.IN_FLIGHT.dec()
+        bytes_out = send_response(tcp_socket, response, keep_alive)
+        duration = time.perf_counter() - start
+        metrics.observe_request(
+            route_name, response.status_code, duration, reader.last_request_size, bytes_out
+        )
+        if server.capture is not None:
+            server.capture.record(request, response)
+        return keep_alive
+
+    @staticmethod
+    def _read_request(tcp_socket: socket, reader: RequestReader) -> Request | None:
+        """Read until the reader holds a complete request, None when the connection ends first."""
+        try:
+            while (request := reader.next_request()) is None:
+                data = tcp_socket.recv(65536)
+                if not data:
+                    return None
+                reader.feed(data)
+        except (TimeoutError, ConnectionError):
+            return None
+        return request
 
     def finish(self):
-        """Try to shutdown the tcp_socket in a safe way."""
+        """Try to shutdown the tcp_socket in a safe way, unless it is kept alive."""
         tcp_socket: socket = self.request
+        if tcp_socket in self._application_server().idle:
+            return
         try:
             tcp_socket.shutdown(SHUT_WR)
         except OSError:
             """Happens when the transport endpoint is not connected."""
 
-    def _get_route_function(self, searched_path: str) -> Callable:
-        """Get the route fuction for the searched_path.
+    def _resolve_route(self, searched_path: str) -> tuple[Callable, dict[str, str]]:
+        """Get the route function and path parameters for the searched_path, see `Router.resolve`.
 
         This function only works for ApplicationServer instances.
-        A default 404 is returned when no route matches searched_path.
-        If you would like to override the default 404, define a route with a wildcard route_path
-        e.g.::
-
-            @app.route("/.*")
-            def fallback_route(request):
-                raise ApiException({"ok": False, "error": "Custom 404!"}, status_code=404)
-
-        IMPORTANT: The routes are added by-occurrence, so make sure to define the wildcard
-        route_path as the last route, any routes added later will not be available.
-
-        Parameters
-        ----------
-        searched_path : str
-            The route that the user attempted to visit.
-
-        Returns
-        -------
-        Callable
-            The callable corresponding to the visited route.
-
-        Raises
-        ------
-        ApiException
-            In case no route was found.
         """
+        return self._application_server().router.resolve(searched_path)
+
+    def _application_server(self) -> ApplicationServer:
         assert isinstance(self.server, ApplicationServer), f"{type(self.server)} is not supported."
-        route = next((route for route in self.server.routes if route[0].match(searched_path)), None)
-        if route is None:
-            raise ApiException({"ok": False}, status_code=404)
-        return route[1]
+        return self.server
 
-    @staticmethod
-    def _write_to_file(text: str, name: str) -> None:
-        if not SERVER_CONFIG.write_to_file:
-            return
-        now_timestamp = int(datetime.now(tz=timezone.utc).timestamp())
-        root = Path(__file__).parent.parent.parent
-        destination_dir = root / "tests" / "data" / "server" / str(now_timestamp)
-        destination_dir.mkdir(exist_ok=True, parents=True)
-        filepath = destination_dir / f"{name}.txt"
-        filepath.write_text(text, newline="\n")
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    """Get the event loop of the current thread, it is reused by all async routes on the thread."""
+    loop = getattr(_EVENT_LOOPS, "loop", None)
+    if loop is None:
+        loop = _EVENT_LOOPS.loop = asyncio.new_event_loop()
+    return loop
 
 
 class Application:
@@ -134,11 +384,20 @@ def _inner():
 
         return _decorator
 
-    def serve(self, host: str, port: int):
+    def serve(
+        self,
+        host: str,
+        port: int,
+        concurrency: Concurrency | None = None,
+        max_workers: int | None = None,
+        max_in_flight: int | None = None,
+    ):
         """Activate the server.
 
         This will keep running until you interrupt the program with Ctrl-C.
-        The SIGTERM signal will also interrupt the program.
+        The SIGTERM signal will also interrupt the program, the "thread" and "process" servers
+        finish the requests in flight before exiting. With "process", SIGHUP restarts the workers
+        one at a time.
 
         Parameters
         ----------
@@ -146,10 +405,72 @@ def serve(self, host: str, port: int):
             The host on which we will listen for requests.
         port : int
             The port on which we will listen for requests.
+        concurrency : Concurrency, optional
+            How requests are served, by default SERVER_CONFIG.concurrency:
+            "single" handles one request at a time without keep-alive, "thread" handles requests on
+            a bounded pool of threads, "process" supervises `max_workers` processes that each run a
+            thread pool on the same port (see `Supervisor`) and "asyncio" serves all connections
+            from an event loop (see `AsyncApplicationServer`).
+        max_workers : int, optional
+            The number of threads or processes, by default SERVER_CONFIG.max_workers.
+            When unset, the threads default to cpu_count + 4 and the processes to cpu_count.
+        max_in_flight : int, optional
+            The maximum of requests handled at once per process, by default
+            SERVER_CONFIG.max_in_flight. When unset, it defaults to twice the number of threads.
         """
-        with ApplicationServer((host, port), TCPHandler, routes=self.routes) as server:
+        concurrency = concurrency or SERVER_CONFIG.concurrency
+        max_workers = max_workers or SERVER_CONFIG.max_workers
+        max_in_flight = max_in_flight or SERVER_CONFIG.max_in_flight
+        capture = server_capture()
+        if concurrency == "single":
+            with ApplicationServer(
+                (host, port), TCPHandler, routes=self.routes, capture=capture
+            ) as server:
+                server.serve_forever()
+            return
+        if concurrency == "asyncio":
+            AsyncApplicationServer(
+                self.routes,
+                max_workers=max_workers,
+                max_in_flight=max_in_flight,
+                keep_alive_timeout=SERVER_CONFIG.keep_alive_timeout,
+                max_keep_alive_requests=SERVER_CONFIG.max_keep_alive_requests,
+                max_header_size=SERVER_CONFIG.max_header_size,
+                max_body_size=SERVER_CONFIG.max_body_size,
+                capture=capture,
+            ).serve(host, port)
+            return
+
+        if concurrency == "process":
+            self._serve_supervised(host, port, max_workers or os.cpu_count() or 1, max_in_flight)
+            return
+        with ThreadPoolApplicationServer(
+            (host, port),
+            TCPHandler,
+            routes=self.routes,
+            capture=capture,
+            max_workers=max_workers,
+            max_in_flight=max_in_flight,
+        ) as server:
             server.serve_forever()
 
+    def _serve_supervised(
+        self, host: str, port: int, processes: int, max_in_flight: int | None
+    ) -> None:
+        """Serve from `processes` supervised workers that each bind the port, see `Supervisor`."""
+
+        def create_server() -> ThreadPoolApplicationServer:
+            return ThreadPoolApplicationServer(
+                (host, port),
+                TCPHandler,
+                routes=self.routes,
+                capture=server_capture(),
+                max_in_flight=max_in_flight,
+                reuse_port=True,
+            )
+
+        Supervisor(create_server, processes, drain_timeout=SERVER_CONFIG.drain_timeout).run()
+
     @staticmethod
     def shutdown(*_) -> NoReturn:
         """Shutdown by raising a KeyboardInterrupt."""
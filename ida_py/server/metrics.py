@@ -0,0 +1,44 @@
+"""Ida's HTTP server metrics."""
+from ida_py.metrics import REGISTRY
+from ida_py.server.models import Request, Response
+
+UNMATCHED_ROUTE = "unmatched"
+
+REQUESTS = REGISTRY.counter(
+    "ida_server_requests_total", "Requests handled per route and status.", ("route", "status")
+)
+REQUEST_DURATION = REGISTRY.histogram(
+    "ida_server_request_duration_seconds",
+    "Time spent handling a request, per route and status.",
+    ("route", "status"),
+)
+REQUEST_BYTES = REGISTRY.counter(
+    "ida_server_request_bytes_total", "Bytes received per route and status.", ("route", "status")
+)
+RESPONSE_BYTES = REGISTRY.counter(
+    "ida_server_response_bytes_total", "Bytes sent per route and status.", ("route", "status")
+)
+IN_FLIGHT = REGISTRY.gauge("ida_server_requests_in_flight", "Requests being handled.")
+PARSE_FAILURES = REGISTRY.counter(
+    "ida_server_parse_failures_total", "Requests that could not be read, per status.", ("status",)
+)
+
+
+def observe_request(
+    route: str, status_code: int, duration: float, bytes_in: int, bytes_out: int
+) -> None:
+    """Record a handled request in the server's metrics."""
+    REQUESTS.inc(route=route, status=status_code)
+    REQUEST_DURATION.observe(duration, route=route, status=status_code)
+    REQUEST_BYTES.inc(bytes_in, route=route, status=status_code)
+    RESPONSE_BYTES.inc(bytes_out, route=route, status=status_code)
+
+
+def metrics_endpoint(_: Request) -> Response:
+    """Return all metrics in the Prometheus text format.
+
+    This route is opt-in, register it with e.g. ``app.route("/metrics")(metrics_endpoint)``.
+    Every process keeps its own metrics, so with the "process" concurrency a scrape only sees the
+    worker that happened to accept it.
+    """
+    return Response(REGISTRY.render(), content_type="text/plain; version=0.0.4")
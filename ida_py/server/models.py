@@ -5,7 +5,7 @@
 ListStr = list[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class Request:
     """Represent a Request."""
 
@@ -14,11 +14,17 @@ class Request:
     path: str
     query_params: dict[str, ListStr] = field(default_factory=dict)
     body: str = ""
+    version: str = "HTTP/1.1"
+    path_params: dict[str, str] = field(default_factory=dict)
 
 
 @dataclass
 class Response:
-    """Represent a Response."""
+    """Represent a Response.
+
+    Responses are not slotted, as ApiException is both a JSONResponse and an exception, whose
+    instance layouts can not be combined.
+    """
 
     body: Any
     status_code: int = 200
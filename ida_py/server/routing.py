@@ -0,0 +1,124 @@
+"""Ida's HTTP server routing."""
+import re
+from typing import Callable
+
+from ida_py.server.errors import ApiException
+
+Route = tuple[re.Pattern, Callable]
+
+_REGEX_SPECIAL_CHARACTERS = frozenset(".^$*+?{}[]\\|()")
+_NAMED_GROUP = re.compile(r"\(\?P(<|=)(\w+)")
+# Numbered backreferences and conditionals, whose numbers change once the route is merged
+_NUMBERED_REFERENCE = re.compile(r"\\[1-9]|\(\?\(\d")
+_DEFAULT_FLAGS = re.compile("").flags
+
+
+class Router:
+    """Represent a compiled dispatcher for routes, searched by-occurrence.
+
+    Literal routes (e.g. "/ping") are resolved through a dictionary, while all other routes are
+    merged into a single regular expression, so the cost of routing does not grow with the amount
+    of routes. Named groups of a route, e.g. "/invoices/(?P<invoice_id>[0-9]+)", are returned as the
+    path parameters. Routes that can not be merged, e.g. with flags or numbered backreferences, are
+    matched on their own.
+
+    The routes are compiled on first use, and compiled again whenever routes were added.
+
+    Parameters
+    ----------
+    routes : list[Route]
+        The routes to dispatch to, in order of occurrence.
+    """
+
+    def __init__(self, routes: list[Route]) -> None:
+        self.routes = routes
+        self._compiled_count = -1
+        self._literals: dict[str, int] = {}
+        self._pattern: re.Pattern | None = None
+        self._separate: list[tuple[int, re.Pattern]] = []
+        self._group_names: dict[str, tuple[int, list[tuple[str, str]]]] = {}
+
+    def resolve(self, searched_path: str) -> tuple[Callable, dict[str, str]]:
+        """Get the route function and path parameters for the searched_path.
+
+        A default 404 is returned when no route matches searched_path.
+        If you would like to override the default 404, define a route with a wildcard route_path
+        e.g.::
+
+            @app.route("/.*")
+            def fallback_route(request):
+                raise ApiException({"ok": False, "error": "Custom 404!"}, status_code=404)
+
+        IMPORTANT: The routes are added by-occurrence, so make sure to define the wildcard
+        route_path as the last route, any routes added later will not be available.
+
+        Parameters
+        ----------
+        searched_path : str
+            The route that the user attempted to visit.
+
+        Returns
+        -------
+        tuple[Callable, dict[str, str]]
+            The callable corresponding to the visited route and its path parameters.
+
+        Raises
+        ------
+        ApiException
+            In case no route was found.
+        """
+        if self._compiled_count != len(self.routes):
+            self._compile()
+
+        index = self._literals.get(searched_path, len(self.routes))
+        path_params = {}
+        match = self._pattern.match(searched_path) if self._pattern else None
+        if match:
+            pattern_index, group_names = self._group_names[match.lastgroup or ""]
+            if pattern_index < index:
+                index = pattern_index
+                path_params = {name: match.group(group) for group, name in group_names}
+        for pattern_index, pattern in self._separate:
+            if pattern_index >= index:
+                break
+            if separate_match := pattern.match(searched_path):
+                index, path_params = pattern_index, separate_match.groupdict()
+                break
+
+        if index == len(self.routes):
+            raise ApiException({"ok": False}, status_code=404)
+        return self.routes[index][1], path_params
+
+    def _compile(self) -> None:
+        self._literals = {}
+        self._group_names = {}
+        self._separate = []
+        alternatives = []
+        for index, (pattern, _) in enumerate(self.routes):
+            path = pattern.pattern.removesuffix("$")
+            if not _REGEX_SPECIAL_CHARACTERS.intersection(path):
+                self._literals.setdefault(path, index)
+                continue
+            route_group = f"_route{index}"
+            renamed = _NAMED_GROUP.sub(rf"(?P\1{route_group}_\2", pattern.pattern)
+            alternative = f"(?P<{route_group}>{renamed})"
+            if not _can_merge(pattern, alternative):
+                self._separate.append((index, pattern))
+                continue
+            group_names = [(f"{route_group}_{name}", name) for name in pattern.groupindex]
+            self._group_names[route_group] = (index, group_names)
+            alternatives.append(alternative)
+
+        self._pattern = re.compile("|".join(alternatives)) if alternatives else None
+        self._compiled_count = len(self.routes)
+
+
+def _can_merge(pattern: re.Pattern, alternative: str) -> bool:
+    """Check whether the route's pattern still means the same as an alternative of a merged one."""
+    if pattern.flags != _DEFAULT_FLAGS or _NUMBERED_REFERENCE.search(pattern.pattern):
+        return False
+    try:
+        re.compile(alternative)
+    except re.error:
+        return False  # e.g. an inline flag, which is only allowed at the start of an expression
+    return True
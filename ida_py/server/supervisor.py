@@ -0,0 +1,239 @@
+"""Ida's multi-process HTTP server supervisor."""
+import os
+import select
+import signal
+import threading
+import time
+import traceback
+from typing import TYPE_CHECKING, Callable, NoReturn
+
+from ida_py.server.config import ServerConfig
+
+if TYPE_CHECKING:
+    from ida_py.server.main import ApplicationServer
+
+POLL_INTERVAL = 0.1
+MIN_UPTIME = 1.0
+MAX_RESPAWN_DELAY = 30.0
+
+
+class Supervisor:
+    """Represent a supervisor that keeps `processes` worker processes serving.
+
+    Every worker creates (and binds) its own server through `create_server`, which is expected to
+    set SO_REUSEPORT so all workers listen on the same port and the kernel balances connections
+    between them. The supervisor itself never accepts connections, it only manages the workers:
+
+    - A worker that exits without being asked to is restarted, until there are `processes`
+      workers again. While workers fail to start or crash right after starting, the supervisor
+      waits before the next attempt, from MIN_UPTIME seconds doubling up to MAX_RESPAWN_DELAY.
+    - SIGTERM (or Ctrl-C) drains the workers: they stop accepting, answer the connections left in
+      their listen backlog, finish the requests in flight and exit. Workers that did not finish
+      within `drain_timeout` seconds are killed.
+    - SIGHUP restarts the workers one at a time. The replacement is started and listening before
+      the old worker is drained, so the port is served throughout the restart.
+
+    Note that workers are forked from the supervisor, so a rolling restart gives every worker a
+    fresh state but does not load changed code.
+
+    Parameters
+    ----------
+    create_server : Callable[[], ApplicationServer]
+        Create the server of a worker, it is called in the worker process.
+    processes : int
+        The number of worker processes.
+    drain_timeout : float, optional
+        The seconds a worker gets to finish its requests in flight, by default 20.0.
+    ready_timeout : float, optional
+        The seconds a worker gets to start listening, by default 10.0.
+    """
+
+    def __init__(
+        self,
+        create_server: "Callable[[], ApplicationServer]",
+        processes: int,
+        drain_timeout: float = ServerConfig.drain_timeout,
+        ready_timeout: float = 10.0,
+    ) -> None:
+        self.create_server = create_server
+        self.processes = processes
+        self.drain_timeout = drain_timeout
+        self.ready_timeout = ready_timeout
+        self.workers: dict[int, float] = {}
+        self._stopping: set[int] = set()
+        self._signals: list[int] = []
+        self._respawn_at = 0.0
+        self._respawn_delay = MIN_UPTIME
+
+    def run(self) -> None:
+        """Start the workers and supervise them until SIGTERM or SIGINT is received."""
+        handled_signals = (signal.SIGTERM, signal.SIGINT, signal.SIGHUP)
+        previous_handlers = {sig: signal.signal(sig, self._on_signal) for sig in handled_signals}
+        try:
+            self._refill()
+            while True:
+                self._reap()
+                while self._signals:
+                    if self._signals.pop(0) != signal.SIGHUP:
+                        return
+                    self._rolling_restart()
+                time.sleep(POLL_INTERVAL)
+        finally:
+            self._stop(list(self.workers))
+            for sig, handler in previous_handlers.items():
+                signal.signal(sig, handler)
+
+    def _on_signal(self, signum: int, _) -> None:
+        """Queue the signal, it is handled by the supervising loop instead of the handler."""
+        self._signals.append(signum)
+
+    def _spawn(self) -> int | None:
+        """Fork a worker and return its pid once it is listening, None when it failed to start."""
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover (runs in the forked worker)
+            os.close(read_fd)
+            _run_worker(self.create_server, write_fd)
+        os.close(write_fd)
+        self.workers[pid] = time.monotonic()
+        try:
+            readable, _, _ = select.select([read_fd], [], [], self.ready_timeout)
+            ready = bool(readable) and os.read(read_fd, 1) == b"1"
+        finally:
+            os.close(read_fd)
+        if not ready:
+            print(f"Worker {pid} did not start listening within {self.ready_timeout} seconds.")
+            self._stop([pid])
+            return None
+        return pid
+
+    def _reap(self) -> None:
+        """Collect the workers that exited without being asked to, then replace them."""
+        now = time.monotonic()
+        for pid, started in list(self.workers.items()):
+            if pid in self._stopping or not _has_exited(pid):
+                continue
+            del self.workers[pid]
+            print(f"Worker {pid} exited unexpectedly, restarting it.")
+            if now - started < MIN_UPTIME:
+                self._back_off()
+        self._refill()
+
+    def _refill(self) -> None:
+        """Start workers until there are `processes` again, unless it is too soon after a failure.
+
+        The backoff is reset once all workers have been up for MIN_UPTIME seconds.
+        """
+        now = time.monotonic()
+        missing = self.processes - len(self.workers)
+        if missing <= 0:
+            if all(now - started >= MIN_UPTIME for started in self.workers.values()):
+                self._respawn_delay = MIN_UPTIME
+            return
+        if now < self._respawn_at:
+            return
+        for _ in range(missing):
+            if self._spawn() is None:
+                missing = self.processes - len(self.workers)
+                print(f"{missing} worker(s) missing, retrying in {self._respawn_delay} seconds.")
+                self._back_off()
+                return
+
+    def _back_off(self) -> None:
+        self._respawn_at = time.monotonic() + self._respawn_delay
+        self._respawn_delay = min(2 * self._respawn_delay, MAX_RESPAWN_DELAY)
+
+    def _rolling_restart(self) -> None:
+        """Replace the workers one at a time, stop when a replacement fails to start."""
+        for pid in list(self.workers):
+            if self._spawn() is None:
+                print("Aborted the rolling restart, the new worker did not start.")
+                return
+            self._stop([pid])
+
+    def _stop(self, pids: list[int]) -> None:
+        """Ask the workers to drain and wait for them, the ones that take too long are killed."""
+        self._stopping.update(pids)
+        for pid in pids:
+            _signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.drain_timeout
+        remaining = set(pids)
+        while remaining and time.monotonic() < deadline:
+            remaining = {pid for pid in remaining if not _has_exited(pid)}
+            if remaining:
+                time.sleep(POLL_INTERVAL)
+        for pid in remaining:
+            print(f"Worker {pid} did not drain within {self.drain_timeout} seconds, killing it.")
+            _signal(pid, signal.SIGKILL)
+            _has_exited(pid, block=True)
+        for pid in pids:
+            self.workers.pop(pid, None)
+            self._stopping.discard(pid)
+
+
+def _run_worker(create_server: "Callable[[], ApplicationServer]", ready_fd: int) -> NoReturn:
+    """Serve until SIGTERM, after which the requests in flight are finished before exiting.
+
+    Ctrl-C reaches the whole process group, the workers ignore it and wait for the supervisor.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    status = 1
+    try:
+        with create_server() as server:
+            signal.signal(signal.SIGTERM, lambda *_: _drain(server))
+            os.write(ready_fd, b"1")
+            os.close(ready_fd)
+            server.serve_forever()
+            _serve_backlog(server)
+        status = 0
+    except Exception:
+        print(traceback.format_exc())
+    finally:
+        os._exit(status)
+
+
+def _drain(server: "ApplicationServer") -> None:
+    """Stop serving, after `serve_forever` returned the backlog is handled and the server closed.
+
+    `shutdown` blocks until `serve_forever` returns, so it can not be called from the signal
+    handler, which runs on the thread that is serving.
+    """
+    server.draining = True
+    threading.Thread(target=server.shutdown, daemon=True).start()
+
+
+def _serve_backlog(server: "ApplicationServer") -> None:
+    """Handle the connections left in the listen backlog once `serve_forever` returned.
+
+    The kernel keeps queueing connections on the listening socket until it is closed, with
+    SO_REUSEPORT a share of all new ones. Closing it with connections in its backlog would reset
+    them, so they are accepted (without blocking) and answered first.
+    """
+    server.socket.setblocking(False)
+    while True:
+        try:
+            request, client_address = server.get_request()
+        except OSError:  # BlockingIOError once the backlog is empty
+            return
+        try:
+            server.process_request(request, client_address)
+        except Exception:
+            server.handle_error(request, client_address)
+            server.shutdown_request(request)
+
+
+def _has_exited(pid: int, block: bool = False) -> bool:
+    try:
+        exited_pid, _ = os.waitpid(pid, 0 if block else os.WNOHANG)
+    except ChildProcessError:
+        return True
+    return exited_pid == pid
+
+
+def _signal(pid: int, signum: int) -> None:
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        """The worker already exited."""
@@ -1,65 +1,342 @@
 """Ida's HTTP server utils."""
-import json
+import io
+import os
+import string
+from functools import lru_cache
+from socket import socket
+from typing import Union
 from urllib.parse import parse_qs, urlparse
 
+from ida_py import transformer
+from ida_py.server.errors import ApiException
 from ida_py.server.models import Request, Response
 
+HEX_DIGITS = string.hexdigits.encode()
 
-def build_response(response: Response) -> str:
-    """Build a string response from the given Response object."""
-    headers = _build_headers_str(response)
-    body = _build_body_str(response)
-    response_str = _build_response_str(response, headers, body)
-    return response_str
+Body = Union[bytes, memoryview, io.BufferedIOBase]
 
 
-def parse_request(request_str: str) -> Request:
-    """Parse the given request string to a Request object."""
-    request_lines = request_str.splitlines()
-    if not request_lines:
-        raise TypeError("Malformed request.")  # This is likely a connect attempt
-    method, url_str, _ = request_lines[0].split(" ")
-    empty_line_index = request_lines.index("")  # Everything below the first empty line is body
-    headers = _parse_headers(request_lines, empty_line_index)
-    body = _parse_body(request_lines, empty_line_index)
-    url = urlparse(url_str)
-    return Request(method, headers, url.path, parse_qs(url.query), body)
+class RequestReader:
+    """Represent a buffer that incrementally reads the requests received on a connection.
 
+    Bytes are fed as they arrive. The headers are read up to the empty line that ends them, after
+    which exactly `Content-Length` bytes of body are read, or the chunks of a chunked body.
+    This allows reading several (pipelined) requests from one connection, in the order they were
+    sent. The limits are checked before anything is buffered beyond them, so an oversized request
+    is rejected as soon as its size is known.
 
-def _build_body_str(response: Response) -> str:
-    if isinstance(response.body, str):
-        return response.body
-    return json.dumps(response.body)
+    Parameters
+    ----------
+    max_header_size : int
+        The maximum size of the request line and headers, a 431 is raised beyond it.
+    max_body_size : int
+        The maximum size of the (unchunked) body, a 413 is raised beyond it.
+    """
 
+    def __init__(self, max_header_size: int, max_body_size: int) -> None:
+        self.max_header_size = max_header_size
+        self.max_body_size = max_body_size
+        self.last_request_size = 0  # The amount of bytes the last complete request consisted of
+        self._request_size = 0
+        self._buffer = bytearray()
+        self._searched = 0  # Bytes of the buffer that are known not to contain the header end
+        self._request: Request | None = None  # A request whose body is not fully received yet
+        self._content_length = 0
+        self._chunked = False
+        self._chunk_size: int | None = None  # The size of the chunk being read, if any
+        self._body = bytearray()
 
-def _build_headers_str(response: Response) -> str:
-    headers = "\n".join(f"{key}: {value}" for key, value in response.headers.items())
-    if headers:
-        headers += "\n"  # Append a new-line in case additional headers are present.
-    return headers
+    def feed(self, data: bytes) -> None:
+        """Append data received on the connection to the buffer."""
+        self._buffer += data
+
+    def is_idle(self) -> bool:
+        """Check whether nothing of a next request was received yet."""
+        return not self._buffer and self._request is None
+
+    def next_request(self) -> Request | None:
+        """Pop the next complete request from the buffer, None if it is not fully received yet.
+
+        Raises
+        ------
+        ApiException
+            Whenever the request is malformed (400), or its body (413) or headers (431) are too
+            large. The connection can not be used for further requests after this.
+        """
+        if self._request is None and not self._read_head():
+            return None
+        assert self._request is not None
+        body = self._read_chunked_body() if self._chunked else self._read_body()
+        if body is None:
+            return None
+
+        request, self._request = self._request, None
+        request.body = _decode(body)
+        self.last_request_size, self._request_size = self._request_size, 0
+        return request
+
+    def _read_head(self) -> bool:
+        header_end = _find_header_end(self._buffer, self._searched)
+        if header_end is None:
+            if len(self._buffer) > self.max_header_size:
+                raise ApiException({"ok": False, "error": "Headers too large."}, 431)
+            self._searched = max(len(self._buffer) - 3, 0)
+            return False
+        if header_end > self.max_header_size:
+            raise ApiException({"ok": False, "error": "Headers too large."}, 431)
+
+        head = bytes(self._buffer[:header_end])
+        self._consume(header_end)
+        self._searched = 0
+        self._request = _parse_head(head)
+        headers = self._request.headers
+        self._chunked = "chunked" in headers.get("TRANSFER-ENCODING", "").lower()
+        self._content_length = 0 if self._chunked else _parse_content_length(headers)
+        if self._content_length > self.max_body_size:
+            raise ApiException({"ok": False, "error": "Body too large."}, 413)
+        return True
+
+    def _read_body(self) -> bytes | None:
+        if len(self._buffer) < self._content_length:
+            return None
+        body = bytes(self._buffer[: self._content_length])
+        self._consume(self._content_length)
+        return body
+
+    def _read_chunked_body(self) -> bytes | None:
+        while True:
+            if self._chunk_size is None:
+                line = self._read_line()
+                if line is None:
+                    return None
+                self._chunk_size = _parse_chunk_size(line)
+                if len(self._body) + self._chunk_size > self.max_body_size:
+                    raise ApiException({"ok": False, "error": "Body too large."}, 413)
+            if self._chunk_size == 0:
+                return self._read_trailers()
+
+            chunk_end = self._chunk_size
+            if len(self._buffer) < chunk_end + 1:
+                return None
+            line_ending = 1 if self._buffer[chunk_end] == ord("\n") else 2
+            if len(self._buffer) < chunk_end + line_ending:
+                return None
+            if self._buffer[chunk_end : chunk_end + line_ending] not in (b"\n", b"\r\n"):
+                raise ApiException({"ok": False, "error": "Malformed chunk."}, 400)
+            self._body += self._buffer[:chunk_end]
+            self._consume(chunk_end + line_ending)
+            self._chunk_size = None
+
+    def _read_trailers(self) -> bytes | None:
+        """Skip the trailers, which end with an empty line, and return the collected body."""
+        while (line := self._read_line()) is not None:
+            if not line.strip():
+                body = bytes(self._body)
+                self._body.clear()
+                self._chunk_size = None
+                return body
+        return None
+
+    def _read_line(self) -> bytes | None:
+        line_end = self._buffer.find(b"\n")
+        if line_end == -1:
+            if len(self._buffer) > self.max_header_size:
+                raise ApiException({"ok": False, "error": "Line too long."}, 400)
+            return None
+        line = bytes(self._buffer[:line_end])
+        self._consume(line_end + 1)
+        return line
+
+    def _consume(self, size: int) -> None:
+        self._request_size += size
+        del self._buffer[:size]
+
+
+def body_length(body: Body) -> int:
+    """Get the length of a body in bytes, for a file that is what is left to read from it."""
+    if isinstance(body, memoryview):
+        return body.nbytes
+    if isinstance(body, bytes):
+        return len(body)
+    try:
+        return os.fstat(body.fileno()).st_size - body.tell()
+    except (AttributeError, OSError):
+        """Not a regular file, seek to its end to compute the remaining length."""
+    position = body.tell()
+    length = body.seek(0, os.SEEK_END) - position
+    body.seek(position)
+    return length
+
+
+def build_response(response: Response, keep_alive: bool = False) -> bytes:
+    """Build the bytes of a response from the given Response object.
+
+    A file-like body is read completely, use `send_response` to avoid that.
+    """
+    head, body = build_response_parts(response, keep_alive)
+    if isinstance(body, io.BufferedIOBase):
+        return head + body.read()
+    return head + body
+
+
+def build_response_parts(response: Response, keep_alive: bool = False) -> tuple[bytes, Body]:
+    """Build the head (status line and headers) and the body of a response, both as bytes.
+
+    The body is not copied when it is already bytes, a memoryview or a file-like object.
+    """
+    body = _build_body(response)
+    head_prefix = _build_head_prefix(response.status_code, response.content_type, keep_alive)
+    head = head_prefix % body_length(body) + _build_headers(response) + b"\n"
+    return head, body
+
+
+def send_response(tcp_socket: socket, response: Response, keep_alive: bool = False) -> int:
+    """Send a response on the socket and return the amount of bytes that were sent.
 
+    The head and body are sent together with scatter-gather I/O (`socket.sendmsg`) instead of
+    being concatenated, and file bodies are sent with `socket.sendfile` (`os.sendfile` when the
+    file is a regular file), so large bodies are never copied into a single buffer.
+    """
+    head, body = build_response_parts(response, keep_alive)
+    size = len(head) + body_length(body)
+    if isinstance(body, io.BufferedIOBase):
+        with body:
+            tcp_socket.sendall(head)
+            tcp_socket.sendfile(body, offset=body.tell())
+        return size
+    _send_all(tcp_socket, [head, body])
+    return size
 
-def _build_response_str(response: Response, headers: str, body: str) -> str:
-    return (
-        f"HTTP/1.1 {response.status_code}\n"
-        f"Content-Type: {response.content_type}; charset=utf-8\n"
-        f"Content-Length: {len(body)}\n"
-        "Connection: close\n"
-        f"{headers}"
-        f"\n"
-        f"{body}"
+
+def parse_request(request_bytes: bytes | str) -> Request:
+    """Parse a complete request to a Request object, everything after the headers is the body."""
+    if isinstance(request_bytes, str):
+        request_bytes = request_bytes.encode()
+    header_end = _find_header_end(request_bytes)
+    if header_end is None:
+        raise ApiException({"ok": False, "error": "Malformed request."}, 400)
+    request = _parse_head(request_bytes[:header_end])
+    request.body = _decode(request_bytes[header_end:])
+    return request
+
+
+def wants_keep_alive(request: Request) -> bool:
+    """Check whether the client wants to keep the connection open after the request.
+
+    HTTP/1.1 connections are persistent unless `Connection: close` is sent, while HTTP/1.0
+    connections are only kept open on `Connection: keep-alive`.
+    """
+    connection = request.headers.get("CONNECTION", "")
+    tokens = {token.strip().lower() for token in connection.split(",")}
+    if request.version == "HTTP/1.0":
+        return "keep-alive" in tokens
+    return "close" not in tokens
+
+
+def _build_body(response: Response) -> Body:
+    body = response.body
+    if isinstance(body, str):
+        return body.encode()
+    if isinstance(body, (bytes, memoryview, io.BufferedIOBase)):
+        return body
+    if isinstance(body, bytearray):
+        return memoryview(body)
+    return transformer.to_json(body)
+
+
+def _build_headers(response: Response) -> bytes:
+    if not response.headers:
+        return b""
+    return "".join(f"{key}: {value}\n" for key, value in response.headers.items()).encode()
+
+
+@lru_cache(maxsize=256)
+def _build_head_prefix(status_code: int, content_type: str, keep_alive: bool) -> bytes:
+    """Build the constant part of the head, with a %d placeholder for the Content-Length."""
+    connection = "keep-alive" if keep_alive else "close"
+    head_prefix = (
+        f"HTTP/1.1 {status_code}\n"
+        f"Content-Type: {content_type}; charset=utf-8\n"
+        "Content-Length: %d\n"
+        f"Connection: {connection}\n"
     )
+    return head_prefix.encode()
+
+
+def _send_all(tcp_socket: socket, buffers: list[bytes | memoryview]) -> None:
+    """Send all buffers with as few system calls as possible, without concatenating them."""
+    if not hasattr(tcp_socket, "sendmsg"):  # pragma: no cover (e.g. on Windows)
+        for buffer in buffers:
+            tcp_socket.sendall(buffer)
+        return
 
+    views = [memoryview(buffer).cast("B") for buffer in buffers if len(buffer)]
+    while views:
+        sent = tcp_socket.sendmsg(views)
+        while views and sent >= len(views[0]):
+            sent -= len(views.pop(0))
+        if sent:
+            views[0] = views[0][sent:]
 
-def _parse_body(request_lines: list[str], empty_line_index: int) -> str:
-    body_lines = request_lines[empty_line_index + 1 :]
-    return "".join(body_lines)
 
+def _decode(data: bytes) -> str:
+    try:
+        return data.decode()
+    except UnicodeDecodeError:
+        raise ApiException({"ok": False, "error": "Malformed request."}, 400)
 
-def _parse_headers(request_lines: list[str], empty_line_index: int) -> dict[str, str]:
+
+def _find_header_end(buffer: bytes | bytearray, start: int = 0) -> int | None:
+    """Find the index right after the empty line that ends the headers, if received already.
+
+    Lines are allowed to end on a bare LF, as well as on CRLF.
+    """
+    ends = []
+    for separator in (b"\r\n\r\n", b"\n\n"):
+        index = buffer.find(separator, start)
+        if index != -1:
+            ends.append(index + len(separator))
+    return min(ends, default=None)
+
+
+def _parse_head(head: bytes) -> Request:
+    """Parse the request line and headers, without the body."""
+    request_line, *header_lines = _decode(head).split("\n")
+    try:
+        method, url_str, version = request_line.strip().split(" ")
+    except ValueError:
+        raise ApiException({"ok": False, "error": "Malformed request."}, 400)
+    headers = _parse_headers(header_lines)
+    url = urlparse(url_str)
+    return Request(method, headers, url.path, parse_qs(url.query), version=version)
+
+
+def _parse_headers(header_lines: list[str]) -> dict[str, str]:
     headers = {}
-    for line in request_lines[1:empty_line_index]:
-        key, value = (part.strip() for part in line.split(":", 1))
-        uppercase_key = key.upper()
-        headers[uppercase_key] = value
+    for line in header_lines:
+        if not line.strip():
+            continue
+        key, separator, value = line.partition(":")
+        if not separator:
+            raise ApiException({"ok": False, "error": "Malformed header."}, 400)
+        headers[key.strip().upper()] = value.strip()
     return headers
+
+
+def _parse_content_length(headers: dict[str, str]) -> int:
+    try:
+        content_length = int(headers.get("CONTENT-LENGTH", 0))
+    except ValueError:
+        content_length = -1
+    if content_length < 0:
+        raise ApiException({"ok": False, "error": "Invalid Content-Length."}, 400)
+    return content_length
+
+
+def _parse_chunk_size(line: bytes) -> int:
+    size, _, _ = line.partition(b";")  # Ignore chunk extensions
+    size = size.strip()
+    # Only hex digits, int() would also accept a sign, underscores and a 0x prefix
+    if not size or size.strip(HEX_DIGITS):
+        raise ApiException({"ok": False, "error": "Malformed chunk."}, 400)
+    return int(size, 16)
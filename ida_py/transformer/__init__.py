@@ -1,3 +1,5 @@
 """Ida's transformer."""
+from ida_py.transformer.coercions import register_coercion
 from ida_py.transformer.errors import ValidationError
-from ida_py.transformer.main import from_dict
+from ida_py.transformer.main import from_dict, from_dicts, from_json, to_dict, to_json
+from ida_py.transformer.plans import clear_cache
@@ -0,0 +1,35 @@
+"""Ida's transformer JSON backends."""
+import json
+from typing import Any, Callable
+
+from ida_py import errors
+from ida_py.transformer.config import transformer_config
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover (orjson is an optional dependency)
+    orjson = None  # type: ignore[assignment]
+
+TRANSFORMER_CONFIG = transformer_config()
+
+Loads = Callable[[bytes | str], Any]
+
+
+def get_loads(json_backend: str) -> Loads:
+    """Get the function that parses JSON with the backend, see `TransformerConfig.json_backend`.
+
+    Both backends raise a ValueError on invalid JSON.
+
+    Raises
+    ------
+    ConfigurationError
+        Whenever the orjson backend is requested but orjson is not installed.
+    """
+    if json_backend == "json" or (json_backend == "auto" and orjson is None):
+        return json.loads
+    if orjson is None:
+        raise errors.ConfigurationError("Please install orjson to use it as the JSON backend.")
+    return orjson.loads
+
+
+loads = get_loads(TRANSFORMER_CONFIG.json_backend)
@@ -0,0 +1,254 @@
+"""Ida's transformer code generation."""
+import linecache
+import time
+from dataclasses import MISSING
+from types import NoneType
+from typing import TYPE_CHECKING, Any, Callable
+
+from ida_py.transformer.config import transformer_config
+from ida_py.transformer.errors import ValidationError
+from ida_py.transformer.profiling import PROFILE
+
+if TYPE_CHECKING:
+    from ida_py.transformer.plans import DecodePlan, FieldPlan
+
+TRANSFORMER_CONFIG = transformer_config()
+JSON_SCALARS = frozenset({str, int, float, bool, NoneType, None})
+
+
+def compile_decoder(plan: "DecodePlan") -> Callable[[dict], Any]:
+    """Generate, compile and set the decoder of the plan and of its nested plans.
+
+    Like the `__init__` that `dataclasses` generates, the decoder is a function specialized for a
+    single dataclass: every field is looked up by its (alias) name, checked and converted inline,
+    without looping over the fields. The source is kept in `plan.source` and printed when
+    TRANSFORMER_DEBUG is enabled. When TRANSFORMER_PROFILE is enabled, every field is timed into
+    `PROFILE`.
+
+    Parameters
+    ----------
+    plan : DecodePlan
+        The plan to generate the decoder for.
+
+    Returns
+    -------
+    Callable[[dict], Any]
+        A function that decodes a dictionary into an instance of `plan.cls`.
+    """
+    namespace: dict[str, Any] = {
+        "cls": plan.cls,
+        "ValidationError": ValidationError,
+        "valid_keys": plan.valid_keys,
+        "MISSING": MISSING,
+        "unknown_key": _unknown_key_error(plan),
+    }
+    function_name = f"decode_{plan.cls.__name__}"
+    lines = [f"def {function_name}(values):"]
+    lines.append("    if not valid_keys.issuperset(values):")
+    lines.append("        raise unknown_key(values)")
+    for index, field in enumerate(plan.fields):
+        field_lines = _field_lines(index, field, plan, namespace)
+        if TRANSFORMER_CONFIG.profile:
+            field_lines = _profiled_lines(index, field, plan, field_lines, namespace)
+        lines.extend(field_lines)
+    arguments = ", ".join(f"{field.name}=f{index}" for index, field in enumerate(plan.fields))
+    lines.append(f"    return cls({arguments})")
+
+    plan.source = _compile(lines, plan, namespace)
+    plan.decode = namespace[function_name]
+    for dependency in plan.dependencies:
+        if dependency.decode is None:
+            compile_decoder(dependency)
+    return plan.decode
+
+
+def compile_encoder(
+    plan: "DecodePlan", encode_value: Callable[[Any, bool], Any]
+) -> Callable[[Any, bool], dict]:
+    """Generate, compile and set the encoder of the plan, the inverse of its decoder.
+
+    The encoder reads every field of an instance of `plan.cls` into a dictionary under its (alias)
+    name. Fields whose type annotation only allows JSON scalars are copied as is, other values are
+    passed to `encode_value`, which encodes containers and nested dataclasses. When `skip_none` is
+    passed, fields that are None and default to None are left out. The source is kept in
+    `plan.encode_source`.
+
+    Parameters
+    ----------
+    plan : DecodePlan
+        The plan to generate the encoder for.
+    encode_value : Callable[[Any, bool], Any]
+        Encode a value that is not a JSON scalar, given `skip_none`.
+
+    Returns
+    -------
+    Callable[[Any, bool], dict]
+        A function that encodes an instance of `plan.cls` (and `skip_none`) into a dictionary.
+    """
+    namespace: dict[str, Any] = {"encode_value": encode_value}
+    function_name = f"encode_{plan.cls.__name__}"
+    lines = [f"def {function_name}(obj, skip_none):", "    result = {}"]
+    for field in plan.fields:
+        lines.append(f"    # {field.name}: {field.type_annotation}")
+        if (
+            field.error is None
+            and field.converter is None
+            and JSON_SCALARS.issuperset(field.allowed_types)
+        ):
+            expression = "value"
+        else:
+            expression = "encode_value(value, skip_none)"
+        lines.append(f"    value = obj.{field.name}")
+        if field.default is None:
+            lines.append("    if value is not None or not skip_none:")
+            lines.append(f"        result[{field.lookup_name!r}] = {expression}")
+        else:
+            lines.append(f"    result[{field.lookup_name!r}] = {expression}")
+    lines.append("    return result")
+
+    plan.encode_source = _compile(lines, plan, namespace, "encode")
+    plan.encode = namespace[function_name]
+    return plan.encode
+
+
+def _compile(lines: list[str], plan: "DecodePlan", namespace: dict[str, Any], kind="decode") -> str:
+    """Execute the generated lines in `namespace` and register their source for tracebacks."""
+    source = "\n".join(lines) + "\n"
+    filename = f"<ida_py.transformer {kind} {plan.cls.__module__}.{plan.cls.__qualname__}>"
+    exec(compile(source, filename, "exec"), namespace)  # nosec B102
+    linecache.cache[filename] = (len(source), None, lines, filename)
+    if TRANSFORMER_CONFIG.debug:
+        print(source)
+    return source
+
+
+def _field_lines(
+    index: int, field: "FieldPlan", plan: "DecodePlan", namespace: dict[str, Any]
+) -> list[str]:
+    """Generate the lines that decode a single field into the local variable `f{index}`."""
+    obj_name = plan.cls.__name__
+    lookup_name = field.lookup_name
+    lines = [
+        f"    # {field.name}: {field.type_annotation}",
+        f"    value = values.get({lookup_name!r}, MISSING)",
+        "    if value is MISSING:",
+    ]
+    if field.default is not MISSING:
+        namespace[f"default{index}"] = field.default
+        lines.append(f"        value = default{index}")
+    elif field.default_factory is not MISSING:
+        namespace[f"default_factory{index}"] = field.default_factory
+        lines.append(f"        value = default_factory{index}()")
+    else:
+        namespace[f"required{index}"] = (
+            f"'{lookup_name}' is a required field for {obj_name}. "
+            f"Valid types: {field.type_annotation}"
+        )
+        lines.append(f"        raise ValidationError(required{index})")
+
+    if field.error is not None:
+        namespace[f"error{index}"] = str(field.error)
+        lines.append("    else:")
+        lines.append(f"        raise ValidationError(error{index})")
+        lines.append(f"    f{index} = value")
+        return lines
+
+    lines.append("    elif value is None:")
+    if field.none_allowed:
+        lines.append("        pass")
+    else:
+        namespace[
+            f"none_error{index}"
+        ] = f"'{lookup_name}' can not be None for {obj_name}. Valid types: {field.type_annotation}"
+        lines.append(f"        raise ValidationError(none_error{index})")
+
+    if field.converter is not None:
+        namespace[f"convert{index}"] = field.converter
+        lines.append("    else:")
+        lines.append(f"        value = convert{index}(value)")
+    elif field.nested is not None:
+        namespace[f"nested{index}"] = field.nested
+        namespace[f"invalid{index}"] = _invalid_value_error(field, obj_name)
+        lines.append("    elif isinstance(value, dict):")
+        lines.append(f"        value = nested{index}.decode(value)")
+        lines.append("    else:")
+        lines.append(f"        raise invalid{index}(value)")
+    else:
+        namespace[f"coerce{index}"] = _coercer(field, obj_name)
+        if len(field.allowed_types) == 1:
+            namespace[f"type{index}"] = field.allowed_types[0]
+            lines.append(f"    elif type(value) is not type{index}:")
+        else:
+            namespace[f"allowed_types{index}"] = field.allowed_types
+            lines.append(f"    elif type(value) not in allowed_types{index}:")
+        lines.append(f"        value = coerce{index}(value)")
+    lines.append(f"    f{index} = value")
+    return lines
+
+
+def _profiled_lines(
+    index: int,
+    field: "FieldPlan",
+    plan: "DecodePlan",
+    field_lines: list[str],
+    namespace: dict[str, Any],
+) -> list[str]:
+    """Wrap the lines that decode a field in a timer that records into `PROFILE`."""
+    if field.error is not None:
+        converter_key = "error"
+    elif field.converter is not None:
+        converter_key = field.converter.__name__
+    elif field.nested is not None:
+        converter_key = "nested"
+    else:
+        converter_key = "type_check"
+    namespace["perf_counter_ns"] = time.perf_counter_ns
+    namespace[f"record{index}"] = PROFILE.recorder(
+        f"{plan.cls.__name__}.{field.name}", converter_key
+    )
+    comment, *decode_lines = field_lines
+    return [
+        comment,
+        f"    start{index} = perf_counter_ns()",
+        *decode_lines,
+        f"    record{index}(perf_counter_ns() - start{index})",
+    ]
+
+
+def _coercer(field: "FieldPlan", obj_name: str) -> Callable[[Any], Any]:
+    """Create the function that converts a value whose type is not one of the allowed types."""
+    allowed_types = field.allowed_types
+    invalid_value_error = _invalid_value_error(field, obj_name)
+
+    def coerce(value: Any) -> Any:
+        if value in allowed_types:
+            return value
+        for allowed_type in allowed_types:
+            try:
+                return allowed_type(value)
+            except (TypeError, ValueError):
+                """Continue to the next allowed_type in case conversion failed."""
+        raise invalid_value_error(value)
+
+    return coerce
+
+
+def _invalid_value_error(field: "FieldPlan", obj_name: str) -> Callable[[Any], ValidationError]:
+    def invalid_value_error(value: Any) -> ValidationError:
+        return ValidationError(
+            f"'{value}' is invalid for the field '{field.lookup_name}' on {obj_name}. "
+            f"Valid types: {field.type_annotation}"
+        )
+
+    return invalid_value_error
+
+
+def _unknown_key_error(plan: "DecodePlan") -> Callable[[dict], ValidationError]:
+    def unknown_key_error(values: dict) -> ValidationError:
+        value_key = next(key for key in values if key not in plan.valid_keys)
+        return ValidationError(
+            f"'{value_key}' is an invalid field for {plan.cls.__name__}. "
+            f"Valid fields: {[field.name for field in plan.fields]}"
+        )
+
+    return unknown_key_error
@@ -0,0 +1,117 @@
+"""Ida's transformer coercions."""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable
+
+Decoder = Callable[[Any], Any]
+
+
+@dataclass(frozen=True)
+class Coercion:
+    """Represent how values are converted to and from a type that JSON has no notion of.
+
+    `decode` is called once per field with the target type (e.g. a specific Enum), when its plan is
+    built. It returns the function that converts a (JSON loaded) value to that type, which raises
+    a ValueError or TypeError for values it does not accept. `encode` converts an instance back to
+    a JSON compatible value.
+    """
+
+    decode: Callable[[type], Decoder]
+    encode: Callable[[Any], Any]
+
+
+_COERCIONS: dict[type, Coercion] = {}
+
+
+def register_coercion(
+    target_type: type, decode: Callable[[type], Decoder], encode: Callable[[Any], Any]
+) -> None:
+    """Register how values are converted to and from `target_type` and its subclasses.
+
+    Plans that were built before are not affected, use `clear_cache` to rebuild them.
+
+    Parameters
+    ----------
+    target_type : type
+        The type of the fields the coercion applies to, subclasses included.
+    decode : Callable[[type], Decoder]
+        Create the function that converts a value to the type of a field, see `Coercion`.
+    encode : Callable[[Any], Any]
+        Convert an instance to a JSON compatible value.
+    """
+    _COERCIONS[target_type] = Coercion(decode, encode)
+
+
+def get_coercion(cls: type) -> Coercion | None:
+    """Get the coercion registered for `cls` or for the closest of its base classes."""
+    for base in cls.__mro__:
+        coercion = _COERCIONS.get(base)
+        if coercion is not None:
+            return coercion
+    return None
+
+
+def _decode_enum(enum_cls: type[Enum]) -> Decoder:
+    """Look the member up by its value."""
+    members = {member.value: member for member in enum_cls}
+
+    def decode_enum(value: Any) -> Enum:
+        if type(value) is enum_cls:
+            return value
+        member = members.get(value)
+        if member is None:
+            raise ValueError(f"{value!r} is not a valid {enum_cls.__name__}")
+        return member
+
+    return decode_enum
+
+
+def _decode_datetime(datetime_cls: type[datetime]) -> Decoder:
+    """Convert epoch timestamps (in UTC, like Telegram's dates) and ISO 8601 strings."""
+
+    def decode_datetime(value: Any) -> datetime:
+        value_type = type(value)
+        if value_type is datetime_cls:
+            return value
+        if value_type is int or value_type is float:
+            try:
+                return datetime_cls.fromtimestamp(value, tz=timezone.utc)
+            except (OverflowError, OSError):
+                raise ValueError(f"{value!r} is out of range")
+        if value_type is str:
+            return datetime_cls.fromisoformat(value)
+        raise TypeError(f"{value_type.__name__} can not be converted to a datetime")
+
+    return decode_datetime
+
+
+def _encode_datetime(value: datetime) -> int | float:
+    timestamp = value.timestamp()
+    return int(timestamp) if timestamp.is_integer() else timestamp
+
+
+def _decode_decimal(decimal_cls: type[Decimal]) -> Decoder:
+    """Convert strings and integers, floats are refused as they already lost their precision."""
+
+    def decode_decimal(value: Any) -> Decimal:
+        value_type = type(value)
+        if value_type is decimal_cls:
+            return value
+        if value_type is not str and value_type is not int:
+            raise TypeError(f"{value_type.__name__} can not be converted to a Decimal")
+        try:
+            decimal = decimal_cls(value)
+        except ArithmeticError:
+            raise ValueError(f"{value!r} is not a number")
+        if not decimal.is_finite():
+            raise ValueError(f"{value!r} is not a finite number")
+        return decimal
+
+    return decode_decimal
+
+
+register_coercion(Enum, _decode_enum, lambda value: value.value)
+register_coercion(datetime, _decode_datetime, _encode_datetime)
+register_coercion(Decimal, _decode_decimal, str)
@@ -0,0 +1,37 @@
+"""Ida's transformer configuration."""
+import os
+from dataclasses import dataclass
+from distutils.util import strtobool
+
+from ida_py import errors
+
+JSON_BACKENDS = ("auto", "json", "orjson")
+
+
+@dataclass
+class TransformerConfig:
+    """Represent the configuration for the transformer.
+
+    `json_backend` is the library `from_json` parses with, "auto" uses orjson when it is installed
+    and the standard library's json otherwise. `profile` makes the generated decoders time every
+    field, see `Profile`.
+    """
+
+    debug: bool = False
+    profile: bool = False
+    json_backend: str = "auto"
+
+
+def transformer_config() -> TransformerConfig:
+    """Attempt to get the config's fields from the environment."""
+    try:
+        debug = strtobool(os.environ.get("TRANSFORMER_DEBUG", "0"))
+        profile = strtobool(os.environ.get("TRANSFORMER_PROFILE", "0"))
+    except ValueError as exc:
+        raise errors.ConfigurationError(f"Please export {exc} as a boolean environment variable.")
+    json_backend = os.environ.get("TRANSFORMER_JSON_BACKEND", "auto")
+    if json_backend not in JSON_BACKENDS:
+        raise errors.ConfigurationError(
+            f"Please export TRANSFORMER_JSON_BACKEND as one of {', '.join(JSON_BACKENDS)}."
+        )
+    return TransformerConfig(debug=bool(debug), json_backend=json_backend, profile=bool(profile))
@@ -0,0 +1,328 @@
+"""Ida's transformer container support."""
+import inspect
+from collections.abc import Sequence
+from dataclasses import is_dataclass
+from types import NoneType, UnionType
+from typing import TYPE_CHECKING, Any, Callable, Literal, Union, get_args, get_origin
+
+from ida_py.transformer.coercions import Decoder, get_coercion
+from ida_py.transformer.errors import ValidationError
+
+if TYPE_CHECKING:
+    from _typeshed import DataclassInstance
+
+Converter = Callable[[Any], Any]
+
+_UNCONVERTED = object()
+
+
+class LazyList(Sequence):
+    """Represent a list whose items are validated and converted on first access.
+
+    Decoding a large list is postponed until its items are actually used, any ValidationError of
+    an item is therefore raised when that item is accessed. Comparing a LazyList to a list
+    compares the converted items.
+
+    Parameters
+    ----------
+    values : list
+        The raw (e.g. JSON loaded) items.
+    convert : Converter
+        Validate and convert a single item.
+    """
+
+    __slots__ = ("_values", "_convert", "_items")
+
+    def __init__(self, values: list, convert: Converter) -> None:
+        self._values = values
+        self._convert = convert
+        self._items = [_UNCONVERTED] * len(values)
+
+    def __getitem__(self, index):
+        """Get the converted item at index, or a list of the converted items in a slice."""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        item = self._items[index]
+        if item is _UNCONVERTED:
+            item = self._items[index] = self._convert(self._values[index])
+        return item
+
+    def __len__(self) -> int:
+        """Get the amount of items, without converting them."""
+        return len(self._values)
+
+    def __eq__(self, other: object) -> bool:
+        """Compare the converted items to those of another list or LazyList."""
+        if isinstance(other, (list, LazyList)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        """Represent the LazyList by its converted items."""
+        return f"LazyList({list(self)!r})"
+
+    def __reduce__(self) -> tuple[type, tuple[list]]:
+        """Pickle the LazyList as a list of its converted items, its converter is a closure."""
+        return list, (list(self),)
+
+
+def needs_converter(type_annotation: Any) -> bool:
+    """Check whether the type annotation (or one of its unions) needs a converter.
+
+    That is the case for generics (e.g. list[int] or Literal["a", "b"]) and for the types that
+    have a registered coercion (e.g. datetime), see `register_coercion`.
+    """
+    if _is_union(type_annotation):
+        return any(needs_converter(arg) for arg in get_args(type_annotation))
+    if get_origin(type_annotation) is not None:
+        return True
+    return inspect.isclass(type_annotation) and get_coercion(type_annotation) is not None
+
+
+def build_converter(
+    type_annotation: Any,
+    path: str,
+    obj_name: str,
+    get_nested_plan: Callable[["type[DataclassInstance]"], Any],
+    lazy: bool = False,
+) -> Converter:
+    """Build a function that validates and converts a value to `type_annotation`.
+
+    Lists, tuples and dictionaries are converted item by item, any combination with unions,
+    Optional, Literal, (nested) dataclasses and types with a registered coercion is supported.
+
+    Parameters
+    ----------
+    type_annotation : Any
+        The type to convert values to.
+    path : str
+        The (alias) name of the field, items are suffixed with "[]" and dict values with "{}".
+    obj_name : str
+        The name of the dataclass that holds the field.
+    get_nested_plan : Callable[[type[DataclassInstance]], Any]
+        Get the decode plan of a dataclass.
+    lazy : bool, optional
+        Wrap lists in a LazyList instead of converting their items immediately, by default False.
+
+    Returns
+    -------
+    Converter
+        The function that converts a single value.
+
+    Raises
+    ------
+    ValidationError
+        Whenever the type annotation is not supported.
+    """
+
+    def invalid(value: Any) -> ValidationError:
+        return ValidationError(
+            f"'{value}' is invalid for the field '{path}' on {obj_name}. "
+            f"Valid types: {type_annotation}"
+        )
+
+    def build_item_converter(item_type: Any, suffix: str) -> Converter:
+        return build_converter(item_type, path + suffix, obj_name, get_nested_plan)
+
+    origin, args = get_origin(type_annotation), get_args(type_annotation)
+    if type_annotation is Any:
+        return _identity
+    if type_annotation is None or type_annotation is NoneType:
+        return _none_converter(invalid)
+    if _is_union(type_annotation):
+        alternatives = [
+            (_native_types(arg), build_converter(arg, path, obj_name, get_nested_plan, lazy))
+            for arg in args
+            if arg is not NoneType
+        ]
+        return _union_converter(type_annotation, alternatives, invalid)
+    if origin is Literal:
+        return _literal_converter(args, invalid)
+    if origin is list:
+        convert_item = build_item_converter(args[0] if args else Any, "[]")
+        return _list_converter(convert_item, invalid, lazy)
+    if origin is tuple:
+        if len(args) == 2 and args[1] is Ellipsis:
+            return _variadic_tuple_converter(build_item_converter(args[0], "[]"), invalid)
+        converters = [build_item_converter(arg, "[]") for arg in args or (Any,)]
+        return _tuple_converter(converters, invalid)
+    if origin is dict:
+        key_type, value_type = args if args else (Any, Any)
+        convert_key = build_item_converter(key_type, "")
+        convert_value = build_item_converter(value_type, "{}")
+        return _dict_converter(convert_key, convert_value, invalid)
+    if origin is None and isinstance(type_annotation, type) and is_dataclass(type_annotation):
+        return _dataclass_converter(get_nested_plan(type_annotation), invalid)
+    if origin is None and inspect.isclass(type_annotation):
+        coercion = get_coercion(type_annotation)
+        if coercion is not None:
+            return _coercion_converter(coercion.decode(type_annotation), invalid)
+        return _class_converter((type_annotation,), invalid)
+
+    raise ValidationError(f"Unexpected type {type_annotation}")
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _is_union(type_annotation: Any) -> bool:
+    return isinstance(type_annotation, UnionType) or get_origin(type_annotation) == Union
+
+
+def _none_converter(invalid: Callable[[Any], ValidationError]) -> Converter:
+    def convert_none(value: Any) -> None:
+        if value is not None:
+            raise invalid(value)
+
+    return convert_none
+
+
+def _class_converter(allowed_types: tuple, invalid: Callable[[Any], ValidationError]) -> Converter:
+    """Keep values of an allowed type, otherwise try to call each allowed type on the value."""
+
+    def convert_class(value: Any) -> Any:
+        if type(value) in allowed_types or value in allowed_types:
+            return value
+        for allowed_type in allowed_types:
+            try:
+                return allowed_type(value)
+            except (TypeError, ValueError):
+                """Continue to the next allowed_type in case conversion failed."""
+        raise invalid(value)
+
+    return convert_class
+
+
+def _coercion_converter(decode: Decoder, invalid: Callable[[Any], ValidationError]) -> Converter:
+    """Convert with the decoder of a registered coercion, which was resolved for the field."""
+
+    def convert_coercion(value: Any) -> Any:
+        try:
+            return decode(value)
+        except (TypeError, ValueError):
+            raise invalid(value)
+
+    return convert_coercion
+
+
+def _literal_converter(values: tuple, invalid: Callable[[Any], ValidationError]) -> Converter:
+    """Keep values that equal one of the literals and have the same type, so 1 is not True."""
+    allowed = frozenset((type(value), value) for value in values)
+    literal_types = frozenset(type(value) for value in values)
+
+    def convert_literal(value: Any) -> Any:
+        value_type = type(value)
+        if value_type in literal_types and (value_type, value) in allowed:
+            return value
+        raise invalid(value)
+
+    return convert_literal
+
+
+def _native_types(type_annotation: Any) -> tuple:
+    """Get the types of (JSON loaded) values that convert to type_annotation without coercion."""
+    origin = get_origin(type_annotation)
+    if origin is Literal:
+        return tuple({type(arg) for arg in get_args(type_annotation)})
+    if origin in (list, tuple):
+        return (list, tuple)
+    if origin is dict or is_dataclass(type_annotation):
+        return (dict,)
+    if origin is None and inspect.isclass(type_annotation):
+        return (type_annotation,)
+    return ()
+
+
+def _union_converter(
+    type_annotation: Any,
+    alternatives: list[tuple[tuple, Converter]],
+    invalid: Callable[[Any], ValidationError],
+) -> Converter:
+    """Convert to the first alternative of the union that accepts the value.
+
+    A union of plain classes keeps the original behaviour: a value of any of the classes is kept
+    as is, before trying to call each class on the value. Otherwise the alternatives that the
+    value's type naturally converts to (e.g. a list for list[int]) are tried first, so a list is
+    not coerced by calling another alternative such as str on it.
+    """
+    args = get_args(type_annotation)
+    none_allowed = NoneType in args
+    classes = tuple(arg for arg in args if arg is not NoneType)
+    if not any(needs_converter(arg) or is_dataclass(arg) for arg in classes):
+        alternatives = [((), _class_converter(classes, invalid))]
+
+    def convert_union(value: Any) -> Any:
+        if value is None and none_allowed:
+            return None
+        value_type = type(value)
+        natural = [convert for native, convert in alternatives if value_type in native]
+        for convert in natural + [convert for _, convert in alternatives]:
+            try:
+                return convert(value)
+            except ValidationError:
+                """Continue to the next alternative in case conversion failed."""
+        raise invalid(value)
+
+    return convert_union
+
+
+def _list_converter(
+    convert_item: Converter, invalid: Callable[[Any], ValidationError], lazy: bool
+) -> Converter:
+    def convert_list(value: Any) -> list | LazyList:
+        if not isinstance(value, list):
+            raise invalid(value)
+        if lazy:
+            return LazyList(value, convert_item)
+        return [convert_item(item) for item in value]
+
+    return convert_list
+
+
+def _variadic_tuple_converter(
+    convert_item: Converter, invalid: Callable[[Any], ValidationError]
+) -> Converter:
+    """Convert tuple[X, ...] item by item."""
+
+    def convert_variadic_tuple(value: Any) -> tuple:
+        if not isinstance(value, (list, tuple)):
+            raise invalid(value)
+        return tuple(convert_item(item) for item in value)
+
+    return convert_variadic_tuple
+
+
+def _tuple_converter(
+    converters: list[Converter], invalid: Callable[[Any], ValidationError]
+) -> Converter:
+    """Convert tuple[X, Y] position by position."""
+
+    def convert_tuple(value: Any) -> tuple:
+        if not isinstance(value, (list, tuple)) or len(value) != len(converters):
+            raise invalid(value)
+        return tuple(convert(item) for convert, item in zip(converters, value))
+
+    return convert_tuple
+
+
+def _dict_converter(
+    convert_key: Converter, convert_value: Converter, invalid: Callable[[Any], ValidationError]
+) -> Converter:
+    def convert_dict(value: Any) -> dict:
+        if not isinstance(value, dict):
+            raise invalid(value)
+        return {convert_key(key): convert_value(item) for key, item in value.items()}
+
+    return convert_dict
+
+
+def _dataclass_converter(plan: Any, invalid: Callable[[Any], ValidationError]) -> Converter:
+    """Decode with the plan's decoder, which is looked up on use as it may still be compiled."""
+
+    def convert_dataclass(value: Any) -> Any:
+        if not isinstance(value, dict):
+            raise invalid(value)
+        return plan.decode(value)
+
+    return convert_dataclass
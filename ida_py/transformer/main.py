@@ -1,16 +1,27 @@
 """Ida's transformer main functionality."""
-import inspect
-from dataclasses import MISSING, Field, is_dataclass
-from types import NoneType, UnionType
-from typing import Any, Union, get_args, get_origin
-
+import json
+import pickle
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import is_dataclass
+from functools import partial
+from itertools import islice
+from typing import Any, Callable
+
+from ida_py.transformer import backends
+from ida_py.transformer.coercions import get_coercion
+from ida_py.transformer.containers import LazyList
 from ida_py.transformer.errors import ValidationError
+from ida_py.transformer.plans import encode_value, get_plan
 
 
 def from_dict(obj: Any, values: dict) -> Any:
     """Transform the dictionary `values` into `obj`, which is assumed to be a dataclass.
 
-    The type hints of the `obj` are used to cast the values to the correct typing.
+    The type hints of the `obj` are used to cast the values to the correct typing. They are
+    resolved once per dataclass into a decode plan (see `get_plan`), for which a specialized
+    decoder is generated (see `compile_decoder`) that is reused by later calls.
 
     Parameters
     ----------
@@ -29,90 +40,176 @@ def from_dict(obj: Any, values: dict) -> Any:
     ValidationError
         Whenever the transformer failed to validate or instantiate the object.
     """
-    data = {}
-    field_dict: dict[str, Field] = obj.__dataclass_fields__
-    type_annotations = inspect.get_annotations(obj, eval_str=True)
-    field_dict_values = field_dict.values()
-    aliases = [field.metadata["alias"] for field in field_dict_values if "alias" in field.metadata]
-    for value_key in values.keys():
-        if value_key not in field_dict and value_key not in aliases:
-            raise ValidationError(
-                f"'{value_key}' is an invalid field for {obj.__name__}. "
-                f"Valid fields: {list(field_dict)}"
-            )
-
-    for name, field in field_dict.items():
-        lookup_name = field.metadata.get("alias", name)
-        type_annotation = type_annotations[name]
-
-        if lookup_name not in values:
-            if field.default is not MISSING:
-                default_value = field.default
-            elif field.default_factory is not MISSING:
-                default_value = field.default_factory()
-            else:
-                raise ValidationError(
-                    f"'{lookup_name}' is a required field for {obj.__name__}. "
-                    f"Valid types: {type_annotation}"
-                )
-            data[name] = default_value
-        else:
-            value = values[lookup_name]
-            if value is None and not _none_allowed(type_annotation):
-                raise ValidationError(
-                    f"'{lookup_name}' can not be None for {obj.__name__}. "
-                    f"Valid types: {type_annotation}"
-                )
-
-            # Check if we should do some recursive converting
-            # TODO: Support recursive converting on iterables. Currently the need for this
-            #  conversion is not needed, but once the need rises, the check should be
-            #  implemented around here.
-            allowed_types = _get_allowed_types(type_annotation)
-            for allowed_type in allowed_types:
-                if is_dataclass(allowed_type):
-                    data[name] = from_dict(allowed_type, values[lookup_name])
-                    break
-
-            if name in data:
-                continue  # We recursively converted
-
-            if type(value) not in allowed_types and value not in allowed_types:
-                for allowed_type in allowed_types:
-                    try:
-                        value = allowed_type(value)
-                    except (TypeError, ValueError):
-                        """Continue to the next allowed_type in case conversion failed."""
-                        continue
-                    else:
-                        break
-                else:
-                    raise ValidationError(
-                        f"'{value}' is invalid for the field '{lookup_name}' on {obj.__name__}. "
-                        f"Valid types: {type_annotation}"
-                    )
-
-            data[name] = value
-
-    return obj(**data)
-
-
-def _none_allowed(type_annotation: Any):
-    if type_annotation is None:
-        return True
-    if inspect.isclass(type_annotation):
-        # When a type is a class, they are generally not Optional.
-        return False
-    if isinstance(type_annotation, UnionType) or get_origin(type_annotation) == Union:
-        return NoneType in get_args(type_annotation)
-
-    raise ValidationError(f"Unexpected type {type_annotation}")
-
-
-def _get_allowed_types(type_annotation: Any) -> tuple:
-    if type_annotation is None or inspect.isclass(type_annotation):
-        return (type_annotation,)
-    if isinstance(type_annotation, UnionType) or get_origin(type_annotation) == Union:
-        return get_args(type_annotation)
-
-    raise ValidationError(f"Unexpected type {type_annotation}")
+    decode = get_plan(obj).decode
+    assert decode is not None
+    return decode(values)
+
+
+def from_json(obj: Any, data: bytes | str) -> Any:
+    """Transform the JSON object `data` into `obj`, which is assumed to be a dataclass.
+
+    The JSON is parsed with orjson when it is installed (see `TransformerConfig.json_backend`),
+    after which the values are decoded like `from_dict`. The decoder checks for unknown keys
+    before converting any value, so an object that is rejected is not converted any further.
+
+    Parameters
+    ----------
+    obj : Any
+        A dataclass object.
+    data : bytes | str
+        The JSON encoded object, e.g. the body of a request.
+
+    Returns
+    -------
+    Any
+        An instance of `obj`.
+
+    Raises
+    ------
+    ValidationError
+        Whenever `data` is not a valid JSON object or the transformer failed to validate or
+        instantiate the object.
+    """
+    try:
+        values = backends.loads(data)
+    except ValueError:
+        raise ValidationError("Invalid JSON.")
+    if not isinstance(values, dict):
+        raise ValidationError("Unsupported JSON.")
+    return from_dict(obj, values)
+
+
+def from_dicts(
+    obj: Any, values_iterable: Iterable[dict], processes: int | None = None, chunk_size: int = 256
+) -> Iterator[Any]:
+    """Transform every dictionary in `values_iterable` into `obj`, see `from_dict`.
+
+    The results are yielded in the order of `values_iterable`, as soon as they are decoded. A
+    dictionary that fails to validate does not abort the batch: its ValidationError is yielded in
+    place of the instance, so every result lines up with its input.
+
+    Parameters
+    ----------
+    obj : Any
+        A dataclass object.
+    values_iterable : Iterable[dict]
+        The values of each instance, e.g. a generator over captured updates.
+    processes : int, optional
+        Decode on a pool of this many processes, by default None (in the current process).
+        Only worth it for very large batches, as the values and instances are pickled. The items
+        of lazy fields are converted when the instances are sent back.
+    chunk_size : int, optional
+        The amount of dictionaries sent to a process at once, by default 256.
+
+    Yields
+    ------
+    Any
+        An instance of `obj` or the ValidationError of the dictionary at the same position.
+    """
+    if processes is None:
+        decode = get_plan(obj).decode
+        assert decode is not None
+        for values in values_iterable:
+            yield _decode_or_error(decode, obj, values)
+        return
+
+    executor = ProcessPoolExecutor(processes)
+    try:
+        pending: deque[Future] = deque()
+        for chunk in _chunks(values_iterable, chunk_size):
+            pending.append(executor.submit(_decode_chunk, obj, chunk))
+            if len(pending) >= processes * 2:
+                yield from map(pickle.loads, pending.popleft().result())
+        while pending:
+            yield from map(pickle.loads, pending.popleft().result())
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def to_dict(obj: Any, skip_none: bool = False) -> dict:
+    """Transform the dataclass instance `obj` into a dictionary, the inverse of `from_dict`.
+
+    Fields are written under their alias (e.g. `from_` as "from"), nested dataclasses and
+    containers are encoded recursively. The encoder is generated once per dataclass from its
+    decode plan (see `compile_encoder`).
+
+    Parameters
+    ----------
+    obj : Any
+        An instance of a dataclass.
+    skip_none : bool, optional
+        Leave out the fields that are None and default to None, by default False.
+
+    Returns
+    -------
+    dict
+        The JSON compatible values of `obj`.
+    """
+    assert is_dataclass(obj) and not isinstance(obj, type), f"{obj!r} is not a dataclass instance."
+    return encode_value(obj, skip_none)
+
+
+def to_json(value: Any, skip_none: bool = False) -> bytes:
+    """Dump `value` to JSON, dataclass instances are encoded like `to_dict`, wherever they occur.
+
+    Unlike `json.dumps(to_dict(obj))`, no intermediate dictionaries are built for values that are
+    JSON compatible already, e.g. a response body like `{"ok": True, "result": message}`.
+
+    Parameters
+    ----------
+    value : Any
+        A dataclass instance, or any JSON compatible value that may hold dataclass instances.
+    skip_none : bool, optional
+        Leave out the dataclass fields that are None and default to None, by default False.
+
+    Returns
+    -------
+    bytes
+        The UTF-8 encoded JSON.
+    """
+    return json.dumps(value, default=partial(_encode_default, skip_none=skip_none)).encode()
+
+
+def _encode_default(value: Any, skip_none: bool) -> Any:
+    """Encode the values `json.dumps` does not support itself."""
+    if is_dataclass(value) and not isinstance(value, type):
+        return encode_value(value, skip_none)
+    if isinstance(value, LazyList):
+        return list(value)
+    coercion = get_coercion(type(value))
+    if coercion is not None:
+        return coercion.encode(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_or_error(decode: Callable[[dict], Any], obj: Any, values: Any) -> Any:
+    if not isinstance(values, dict):
+        return ValidationError(f"'{values}' is invalid for {obj.__name__}, expected a dict.")
+    try:
+        return decode(values)
+    except ValidationError as exc:
+        return exc
+
+
+def _decode_chunk(obj: Any, chunk: list[dict]) -> list[bytes]:
+    """Decode a chunk of dictionaries in a pool process, the plan is built once per process.
+
+    Every result is pickled on its own: pickling converts the items of lazy fields, so an item
+    that fails to convert only replaces its own result by its ValidationError.
+    """
+    decode = get_plan(obj).decode
+    assert decode is not None
+    return [_pickle_result(_decode_or_error(decode, obj, values)) for values in chunk]
+
+
+def _pickle_result(result: Any) -> bytes:
+    try:
+        return pickle.dumps(result)
+    except ValidationError as exc:
+        return pickle.dumps(exc)
+
+
+def _chunks(iterable: Iterable[dict], chunk_size: int) -> Iterator[list[dict]]:
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
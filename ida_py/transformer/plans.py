@@ -0,0 +1,206 @@
+"""Ida's transformer plans."""
+import inspect
+import threading
+from dataclasses import Field, dataclass, field, fields, is_dataclass
+from types import NoneType, UnionType
+from typing import TYPE_CHECKING, Any, Callable, Union, get_args, get_origin
+from weakref import WeakKeyDictionary
+
+from ida_py.transformer.codegen import JSON_SCALARS, compile_decoder, compile_encoder
+from ida_py.transformer.coercions import get_coercion
+from ida_py.transformer.containers import (
+    Converter,
+    LazyList,
+    build_converter,
+    needs_converter,
+)
+from ida_py.transformer.errors import ValidationError
+
+if TYPE_CHECKING:
+    from _typeshed import DataclassInstance
+
+
+@dataclass
+class FieldPlan:
+    """Represent what is needed to decode (and encode) a single field of a dataclass.
+
+    Fields whose type annotation involves containers (e.g. `list[PhotoSize] | None`) are decoded
+    by their `converter`, see `build_converter`. When the type annotation of the field is not
+    supported, `error` holds the ValidationError to raise once a value for the field is actually
+    received.
+    """
+
+    name: str
+    lookup_name: str
+    type_annotation: Any
+    default: Any
+    default_factory: Any
+    allowed_types: tuple = ()
+    none_allowed: bool = False
+    nested: "DecodePlan | None" = None
+    converter: Converter | None = None
+    error: ValidationError | None = None
+
+
+@dataclass
+class DecodePlan:
+    """Represent the resolved fields of a dataclass, built once and reused for every decode.
+
+    Only the fields that are passed to `__init__` are part of the plan, so dataclasses that are
+    frozen, slotted or have fields with `init=False` are decoded and encoded alike.
+
+    The plans of nested dataclasses are resolved as well, a dataclass that (indirectly) refers to
+    itself shares its own plan. `dependencies` holds the plans of all nested dataclasses, also
+    those in containers. `decode` and `encode` are the decoder and encoder generated for the plan,
+    see `compile_decoder` and `compile_encoder`, and `source` and `encode_source` their source code.
+    """
+
+    cls: type
+    dataclass_fields: dict[str, Field]
+    fields: list[FieldPlan] = field(default_factory=list)
+    dependencies: list["DecodePlan"] = field(default_factory=list)
+    valid_keys: frozenset[str] = frozenset()
+    decode: Callable[[dict], Any] | None = None
+    encode: Callable[[Any, bool], dict] | None = None
+    source: str = ""
+    encode_source: str = ""
+
+
+_PLANS: "WeakKeyDictionary[type, DecodePlan]" = WeakKeyDictionary()
+_LOCK = threading.RLock()
+
+
+def get_plan(cls: "type[DataclassInstance]") -> DecodePlan:
+    """Get the cached decode plan of the dataclass `cls`, it is built on first use.
+
+    A plan is built again when the fields of `cls` were replaced, e.g. when the dataclass
+    decorator was applied again, use `clear_cache` after changing the fields in any other way.
+    """
+    plan = _PLANS.get(cls)
+    if plan is not None and plan.dataclass_fields is cls.__dataclass_fields__:
+        return plan
+    with _LOCK:
+        building: dict[type, DecodePlan] = {}
+        plan = _build_plan(cls, building)
+        compile_decoder(plan)
+        for built_plan in building.values():
+            compile_encoder(built_plan, encode_value)
+        _PLANS.update(building)
+    return plan
+
+
+def encode_value(value: Any, skip_none: bool = False) -> Any:
+    """Encode a value into JSON compatible values, dataclasses are encoded by their plan's encoder.
+
+    Lists, tuples and dictionaries are encoded item by item, tuples become lists. Values of a type
+    with a registered coercion are encoded by it (e.g. a datetime to its epoch timestamp). Any
+    other value is returned as is.
+    """
+    value_type = type(value)
+    if value_type in JSON_SCALARS:
+        return value
+    if is_dataclass(value_type):
+        encode = get_plan(value_type).encode
+        assert encode is not None
+        return encode(value, skip_none)
+    if isinstance(value, (list, tuple, LazyList)):
+        return [encode_value(item, skip_none) for item in value]
+    if isinstance(value, dict):
+        return {key: encode_value(item, skip_none) for key, item in value.items()}
+    coercion = get_coercion(value_type)
+    if coercion is not None:
+        return coercion.encode(value)
+    return value
+
+
+def clear_cache() -> None:
+    """Forget all decode plans, they are built again on their next use."""
+    with _LOCK:
+        _PLANS.clear()
+
+
+def _build_plan(cls: "type[DataclassInstance]", building: dict[type, DecodePlan]) -> DecodePlan:
+    """Build the plan of `cls`, the plans that are being built are kept in `building`."""
+    dataclass_fields: dict[str, Field] = cls.__dataclass_fields__
+    plan = DecodePlan(cls, dataclass_fields)
+    building[cls] = plan
+
+    type_annotations: dict[str, Any] = {}
+    for base in reversed(cls.__mro__):
+        if is_dataclass(base):
+            type_annotations.update(inspect.get_annotations(base, eval_str=True))
+
+    def get_dependency(nested_cls: "type[DataclassInstance]") -> DecodePlan:
+        nested_plan = _get_nested_plan(nested_cls, building)
+        plan.dependencies.append(nested_plan)
+        return nested_plan
+
+    for dataclass_field in fields(cls):
+        if not dataclass_field.init:
+            continue
+        name = dataclass_field.name
+        field_plan = FieldPlan(
+            name=name,
+            lookup_name=dataclass_field.metadata.get("alias", name),
+            type_annotation=type_annotations[name],
+            default=dataclass_field.default,
+            default_factory=dataclass_field.default_factory,
+        )
+        type_annotation = field_plan.type_annotation
+        try:
+            if needs_converter(type_annotation):
+                field_plan.none_allowed = NoneType in get_args(type_annotation)
+                field_plan.converter = build_converter(
+                    type_annotation,
+                    field_plan.lookup_name,
+                    cls.__name__,
+                    get_dependency,
+                    lazy=dataclass_field.metadata.get("lazy", False),
+                )
+            else:
+                field_plan.allowed_types = _get_allowed_types(type_annotation)
+                field_plan.none_allowed = _none_allowed(type_annotation)
+        except ValidationError as exc:
+            field_plan.error = exc
+        for allowed_type in field_plan.allowed_types:
+            if isinstance(allowed_type, type) and is_dataclass(allowed_type):
+                field_plan.nested = get_dependency(allowed_type)
+                break
+        plan.fields.append(field_plan)
+
+    plan.valid_keys = frozenset(field_plan.name for field_plan in plan.fields).union(
+        field_plan.lookup_name for field_plan in plan.fields
+    )
+    return plan
+
+
+def _get_nested_plan(
+    cls: "type[DataclassInstance]", building: dict[type, DecodePlan]
+) -> DecodePlan:
+    if cls in building:
+        return building[cls]
+    plan = _PLANS.get(cls)
+    if plan is not None and plan.dataclass_fields is cls.__dataclass_fields__:
+        return plan
+    return _build_plan(cls, building)
+
+
+def _none_allowed(type_annotation: Any):
+    if type_annotation is None:
+        return True
+    if inspect.isclass(type_annotation):
+        # When a type is a class, they are generally not Optional.
+        return False
+    if isinstance(type_annotation, UnionType) or get_origin(type_annotation) == Union:
+        return NoneType in get_args(type_annotation)
+
+    raise ValidationError(f"Unexpected type {type_annotation}")
+
+
+def _get_allowed_types(type_annotation: Any) -> tuple:
+    if type_annotation is None or inspect.isclass(type_annotation):
+        return (type_annotation,)
+    if isinstance(type_annotation, UnionType) or get_origin(type_annotation) == Union:
+        return get_args(type_annotation)
+
+    raise ValidationError(f"Unexpected type {type_annotation}")
@@ -0,0 +1,69 @@
+"""Ida's transformer profiling."""
+from dataclasses import dataclass, field
+from typing import Callable
+
+
+@dataclass
+class Timing:
+    """Represent the calls to, and the total time spent in, a part of a decoder."""
+
+    calls: int = 0
+    total_ns: int = 0
+
+    def record(self, elapsed_ns: int) -> None:
+        """Add a call that took `elapsed_ns` nanoseconds."""
+        self.calls += 1
+        self.total_ns += elapsed_ns
+
+
+@dataclass
+class Profile:
+    """Represent the time spent per field and per kind of converter by the profiled decoders.
+
+    When TRANSFORMER_PROFILE is enabled, the generated decoders time every field, from looking up
+    its value up to and including converting it. The time of a field with a nested dataclass thus
+    includes the time of the nested fields. Fields that raise a ValidationError are not recorded.
+    Fields are keyed as "<dataclass>.<field>", converters by the kind of conversion, e.g.
+    "nested", "type_check" or the name of a container converter such as "convert_list".
+    """
+
+    fields: dict[str, Timing] = field(default_factory=dict)
+    converters: dict[str, Timing] = field(default_factory=dict)
+
+    def recorder(self, field_key: str, converter_key: str) -> Callable[[int], None]:
+        """Get the function that records a call to a field, for the decoder to call."""
+        field_timing = self.fields.setdefault(field_key, Timing())
+        converter_timing = self.converters.setdefault(converter_key, Timing())
+
+        def record(elapsed_ns: int) -> None:
+            field_timing.record(elapsed_ns)
+            converter_timing.record(elapsed_ns)
+
+        return record
+
+    def reset(self) -> None:
+        """Set all timings back to zero, the decoders keep recording into them."""
+        for timing in (*self.fields.values(), *self.converters.values()):
+            timing.calls = timing.total_ns = 0
+
+    def to_dict(self) -> dict[str, dict[str, dict[str, float]]]:
+        """Summarize the timings that were called, e.g. to dump them as JSON."""
+        return {
+            "fields": _summarize(self.fields),
+            "converters": _summarize(self.converters),
+        }
+
+
+def _summarize(timings: dict[str, Timing]) -> dict[str, dict[str, float]]:
+    return {
+        key: {
+            "calls": timing.calls,
+            "total_ms": timing.total_ns / 1e6,
+            "mean_ns": timing.total_ns / timing.calls,
+        }
+        for key, timing in sorted(timings.items(), key=lambda item: -item[1].total_ns)
+        if timing.calls
+    }
+
+
+PROFILE = Profile()
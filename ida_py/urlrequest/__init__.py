@@ -1,4 +1,12 @@
 """Ida's urlrequest."""
-from ida_py.urlrequest.errors import RequestError
-from ida_py.urlrequest.main import get, post
-from ida_py.urlrequest.models import Response
+from ida_py.urlrequest.aio import aget, apost
+from ida_py.urlrequest.errors import RequestError, ResponseTooLargeError
+from ida_py.urlrequest.fanout import map
+from ida_py.urlrequest.main import download, get, post, stream
+from ida_py.urlrequest.models import (
+    Download,
+    Request,
+    Response,
+    Result,
+    StreamingResponse,
+)
@@ -0,0 +1,316 @@
+"""Ida's asyncio urlrequest functionality."""
+import asyncio
+import http.client
+import io
+import ssl
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from email.message import Message
+from typing import Any
+from urllib.parse import urlsplit
+from weakref import WeakKeyDictionary
+
+from ida_py.urlrequest.config import URLRequestConfig
+from ida_py.urlrequest.errors import RequestError
+from ida_py.urlrequest.main import POLICY, URLREQUEST_CONFIG
+from ida_py.urlrequest.models import Response
+from ida_py.urlrequest.utils import attempts, get_data
+
+DEFAULT_PORTS = {"https": 443, "http": 80}
+# Errors that mean a reused connection was closed by the server while it was idle
+STALE_ERRORS = (ConnectionError, asyncio.IncompleteReadError)
+# Errors that mean no valid response was received, e.g. a header that exceeds the reader's limit
+RESPONSE_ERRORS = (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError)
+
+Key = tuple[str, str, int]
+
+
+async def aget(
+    url: str,
+    headers: dict[str, str] | None = None,
+    timeout: int = 10,
+    rate_limit_key: str | None = None,
+) -> Response:
+    """Perform a GET request, see `get`."""
+    return await _request(
+        "GET", url, headers=headers, timeout=timeout, rate_limit_key=rate_limit_key
+    )
+
+
+async def apost(
+    url: str,
+    headers: dict[str, str] | None = None,
+    timeout: int = 10,
+    form: dict | None = None,
+    json: Any = None,
+    rate_limit_key: str | None = None,
+) -> Response:
+    """Perform a POST request, see `post`."""
+    assert not (form and json), "Either pass form or json, not both."
+    headers = headers or {}
+    data = get_data(headers, form, json)
+    return await _request(
+        "POST", url, headers, data=data, timeout=timeout, rate_limit_key=rate_limit_key
+    )
+
+
+async def _request(
+    method: str,
+    url: str,
+    headers: dict[str, str] | None = None,
+    data: bytes | None = None,
+    timeout: int = 10,
+    rate_limit_key: str | None = None,
+) -> Response:
+    """Perform an HTTP request on a pooled keep-alive connection, see `AsyncConnectionPool`.
+
+    The rate limits, retries and circuit breaker are shared with the sync client, see `_request`.
+    """
+    steps = attempts(POLICY, method, url, rate_limit_key)
+    try:
+        delay = next(steps)
+        while True:
+            if delay is not None:
+                await asyncio.sleep(delay)
+                delay = next(steps)
+                continue
+            try:
+                response = await POOL.request(
+                    method, url, headers or {}, data=data, timeout=timeout
+                )
+            except RequestError as exc:
+                delay = steps.throw(exc)
+            else:
+                delay = steps.send(response)
+    except StopIteration as stop:
+        return stop.value
+
+
+@dataclass
+class _Connection:
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    idle_since: float = 0.0
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+@dataclass
+class _LoopState:
+    """Represent the connections and concurrency limit of a pool within a single event loop."""
+
+    semaphore: asyncio.Semaphore
+    idle: dict[Key, deque[_Connection]] = field(default_factory=dict)
+
+
+class AsyncConnectionPool:
+    """Represent a pool of keep-alive connections for asyncio, per scheme, host and port.
+
+    Like `ConnectionPool`, a connection is used for a single request at a time and returned to the
+    pool once its response is read. At most `max_concurrency` requests are in flight at once,
+    others wait for one of them to finish. Connections and their limit belong to the event loop
+    they were made in, so the pool can be used from several (consecutive) event loops.
+
+    Parameters
+    ----------
+    pool_size : int, optional
+        The maximum amount of idle connections kept per host, by default 4.
+    idle_timeout : float, optional
+        The seconds a connection may stay idle before it is closed, by default 30.0.
+    max_concurrency : int, optional
+        The maximum amount of requests in flight per event loop, by default 10.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = URLRequestConfig.pool_size,
+        idle_timeout: float = URLRequestConfig.idle_timeout,
+        max_concurrency: int = URLRequestConfig.max_concurrency,
+    ) -> None:
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.max_concurrency = max_concurrency
+        self._states: WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]
+        self._states = WeakKeyDictionary()
+        self._ssl_context: ssl.SSLContext | None = None
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        headers: dict[str, str],
+        data: bytes | None = None,
+        timeout: float = 10,
+    ) -> Response:
+        """Perform an HTTP request on a pooled connection, redirects are not followed.
+
+        The timeout applies to the request as a whole, waiting for the concurrency limit excluded.
+
+        Returns
+        -------
+        Response
+            The response received from the server, whatever its status code.
+
+        Raises
+        ------
+        RequestError
+            When the request could not reach the server, no valid response was received or the
+            timeout expired.
+        """
+        split_url = urlsplit(url)
+        scheme = split_url.scheme
+        if scheme not in DEFAULT_PORTS:
+            raise RequestError(f"Unsupported scheme: {scheme}")
+        key = (scheme, split_url.hostname or "", split_url.port or DEFAULT_PORTS[scheme])
+        path = split_url.path or "/"
+        if split_url.query:
+            path += "?" + split_url.query
+        head = _build_head(method, path, split_url.netloc, headers, data)
+
+        state = self._state()
+        async with state.semaphore:
+            try:
+                return await asyncio.wait_for(self._exchange(state, key, head, data), timeout)
+            except asyncio.TimeoutError:
+                raise RequestError(f"No response within {timeout} seconds.")
+            except RESPONSE_ERRORS as exc:
+                raise RequestError(str(exc) or type(exc).__name__)
+
+    async def close(self) -> None:
+        """Close the idle connections of the running event loop."""
+        state = self._states.pop(asyncio.get_running_loop(), None)
+        if state is None:
+            return
+        for connections in state.idle.values():
+            for connection in connections:
+                connection.close()
+
+    def idle_connections(self, url: str) -> int:
+        """Get the amount of idle connections to the url's host in the running event loop."""
+        split_url = urlsplit(url)
+        scheme = split_url.scheme
+        key = (scheme, split_url.hostname or "", split_url.port or DEFAULT_PORTS[scheme])
+        return len(self._state().idle.get(key, ()))
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = self._states[loop] = _LoopState(asyncio.Semaphore(self.max_concurrency))
+        return state
+
+    async def _exchange(
+        self, state: _LoopState, key: Key, head: bytes, data: bytes | None
+    ) -> Response:
+        connection, reused = self._acquire(state, key)
+        if connection is None:
+            connection = await self._connect(key)
+        try:
+            try:
+                status, headers, body, keep_alive = await _send(connection, head, data)
+            except STALE_ERRORS:
+                connection.close()
+                if not reused:
+                    raise
+                connection = await self._connect(key)
+                status, headers, body, keep_alive = await _send(connection, head, data)
+        except BaseException:
+            connection.close()
+            raise
+
+        if keep_alive:
+            self._release(state, key, connection)
+        else:
+            connection.close()
+        return Response(
+            body, status_code=status, content_type=headers.get_content_type(), headers=headers
+        )
+
+    def _acquire(self, state: _LoopState, key: Key) -> tuple[_Connection | None, bool]:
+        connections = state.idle.get(key)
+        now = time.monotonic()
+        while connections:
+            connection = connections.pop()
+            if now - connection.idle_since > self.idle_timeout or connection.reader.at_eof():
+                connection.close()
+                continue
+            return connection, True
+        return None, False
+
+    async def _connect(self, key: Key) -> _Connection:
+        scheme, host, port = key
+        if scheme == "https":
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            reader, writer = await asyncio.open_connection(host, port, ssl=self._ssl_context)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return _Connection(reader, writer)
+
+    def _release(self, state: _LoopState, key: Key, connection: _Connection) -> None:
+        connections = state.idle.setdefault(key, deque())
+        if len(connections) >= self.pool_size:
+            connection.close()
+            return
+        connection.idle_since = time.monotonic()
+        connections.append(connection)
+
+
+def _build_head(
+    method: str, path: str, host: str, headers: dict[str, str], data: bytes | None
+) -> bytes:
+    lines = [f"{method} {path} HTTP/1.1", f"Host: {host}"]
+    for name, value in headers.items():
+        if "\r" in name + value or "\n" in name + value:
+            raise RequestError(f"Invalid header: {name!r}")
+        lines.append(f"{name}: {value}")
+    if data is not None or method in ("POST", "PUT", "PATCH"):
+        lines.append(f"Content-Length: {len(data or b'')}")
+    lines.append("Accept-Encoding: identity")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def _send(
+    connection: _Connection, head: bytes, data: bytes | None
+) -> tuple[int, Message, bytes, bool]:
+    """Send the request and read its response, also tell whether the connection can be reused."""
+    connection.writer.write(head + (data or b""))
+    await connection.writer.drain()
+    reader = connection.reader
+
+    response_head = await reader.readuntil(b"\r\n\r\n")
+    status_line, _, header_block = response_head.partition(b"\r\n")
+    version, status, *_ = status_line.decode("latin-1").split(" ", 2)
+    headers = http.client.parse_headers(io.BytesIO(header_block))
+    keep_alive = version == "HTTP/1.1" and headers.get("Connection", "").lower() != "close"
+
+    content_length = headers.get("Content-Length")
+    if head.startswith(b"HEAD ") or status in ("204", "304") or status.startswith("1"):
+        body = b""
+    elif headers.get("Transfer-Encoding", "").lower() == "chunked":
+        body = await _read_chunked(reader)
+    elif content_length is not None:
+        body = await reader.readexactly(int(content_length))
+    else:
+        body = await reader.read()
+        keep_alive = False
+    return int(status), headers, body, keep_alive
+
+
+async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+    chunks: list[bytes] = []
+    while True:
+        size = int((await reader.readline()).split(b";", 1)[0], 16)
+        if size == 0:
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                """Skip the trailers up to the empty line that ends them."""
+            return b"".join(chunks)
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+
+
+POOL = AsyncConnectionPool(
+    URLREQUEST_CONFIG.pool_size, URLREQUEST_CONFIG.idle_timeout, URLREQUEST_CONFIG.max_concurrency
+)
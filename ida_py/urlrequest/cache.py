@@ -0,0 +1,234 @@
+"""Ida's urlrequest response cache."""
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.message import Message
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Iterable
+
+from ida_py.urlrequest.config import URLRequestConfig
+from ida_py.urlrequest.models import Response
+
+# The statuses whose responses are stored, others are never served from the cache
+CACHEABLE_STATUSES = frozenset({200})
+
+
+@dataclass
+class CacheEntry:
+    """Represent a stored response, which is fresh until `expires_at` (a Unix timestamp).
+
+    An entry that must be revalidated (Cache-Control: no-cache) is never fresh, it is only served
+    after the server confirmed it with a 304 (Not Modified) response.
+    """
+
+    response: Response
+    expires_at: float
+    revalidate: bool = False
+
+    def is_fresh(self, now: float | None = None) -> bool:
+        """Check whether the entry may be served without asking the server."""
+        return not self.revalidate and (time.time() if now is None else now) < self.expires_at
+
+    def validators(self) -> dict[str, str]:
+        """Get the headers that ask the server whether the entry is still valid."""
+        headers = {}
+        etag = self.response.headers.get("ETag")
+        if etag:
+            headers["If-None-Match"] = etag
+        last_modified = self.response.headers.get("Last-Modified")
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+
+class ResponseCache:
+    """Represent a cache of responses, keyed by method and URL.
+
+    The most recently used `max_entries` are kept in memory. When a directory is given, entries are
+    also written to it, one file per entry, so they outlive the process. The memory is looked up
+    first, the directory on a miss.
+
+    A response is fresh for as long as its Cache-Control max-age or its Expires header says, or for
+    `default_ttl` seconds when it has neither. Responses with Cache-Control no-store, a Vary
+    header (the key does not hold the request's headers) or another status than 200 are not
+    stored. Stale entries are kept as long as they have an ETag or Last-Modified header, to
+    revalidate them with a conditional request.
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        The maximum amount of entries kept in memory, by default 256.
+    default_ttl : float, optional
+        The seconds a response without freshness information is fresh, by default 60.0.
+    directory : Path | None, optional
+        The directory to store entries in as well, by default None.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = URLRequestConfig.cache_size,
+        default_ttl: float = URLRequestConfig.cache_ttl,
+        directory: Path | None = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.directory = directory
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, method: str, url: str) -> CacheEntry | None:
+        """Get the entry of the request, fresh or stale."""
+        key = _key(method, url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        entry = self._read(key)
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    def store(self, method: str, url: str, response: Response) -> None:
+        """Store the response to the request, if it may be reused, or forget the stored one."""
+        key = _key(method, url)
+        entry = self._entry(response)
+        if entry is None:
+            self._forget(key)
+            return
+        self._remember(key, entry)
+        self._write(key, entry)
+
+    def refresh(self, method: str, url: str, entry: CacheEntry, not_modified: Response) -> Response:
+        """Update the entry with the headers of a 304 response and get the response it holds."""
+        headers = _merge_headers(entry.response.headers.items(), not_modified.headers.items())
+        response = Response(
+            entry.response.body,
+            status_code=entry.response.status_code,
+            content_type=entry.response.content_type,
+            headers=headers,
+        )
+        self.store(method, url, response)
+        return response
+
+    def clear(self) -> None:
+        """Remove all entries, also from the directory."""
+        with self._lock:
+            self._entries.clear()
+        if self.directory is not None:
+            for path in self.directory.glob("*.json"):
+                path.unlink(missing_ok=True)
+
+    def __len__(self) -> int:
+        """Get the amount of entries in memory."""
+        return len(self._entries)
+
+    def _entry(self, response: Response) -> CacheEntry | None:
+        """Create the entry of a response, or get None when it should not be stored."""
+        if response.status_code not in CACHEABLE_STATUSES or response.headers.get("Vary"):
+            return None
+        directives = _cache_control(response.headers.get("Cache-Control", ""))
+        if "no-store" in directives:
+            return None
+
+        now = time.time()
+        max_age = directives.get("max-age")
+        expires = response.headers.get("Expires")
+        if max_age is not None:
+            age = response.headers.get("Age", "0")
+            expires_at = now + _seconds(max_age) - _seconds(age)
+        elif expires is not None:
+            try:
+                expires_at = parsedate_to_datetime(expires).timestamp()
+            except (TypeError, ValueError):
+                expires_at = now  # An invalid date means the response is already stale
+        else:
+            expires_at = now + self.default_ttl
+
+        entry = CacheEntry(response, expires_at, revalidate="no-cache" in directives)
+        if not entry.is_fresh(now) and not entry.validators():
+            return None
+        return entry
+
+    def _remember(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.directory is not None:
+            (self.directory / f"{key}.json").unlink(missing_ok=True)
+
+    def _read(self, key: str) -> CacheEntry | None:
+        if self.directory is None:
+            return None
+        try:
+            data = json.loads((self.directory / f"{key}.json").read_bytes())
+            response = Response(
+                base64.b64decode(data["body"]),
+                status_code=data["status_code"],
+                content_type=data["content_type"],
+                headers=_merge_headers(data["headers"]),
+            )
+            return CacheEntry(response, data["expires_at"], data["revalidate"])
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+
+    def _write(self, key: str, entry: CacheEntry) -> None:
+        """Write the entry to the directory, through a temporary file to never leave half of it."""
+        if self.directory is None:
+            return
+        response = entry.response
+        data: dict[str, Any] = {
+            "status_code": response.status_code,
+            "content_type": response.content_type,
+            "headers": list(response.headers.items()),
+            "body": base64.b64encode(response.body).decode(),
+            "expires_at": entry.expires_at,
+            "revalidate": entry.revalidate,
+        }
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{key}.json"
+        temporary_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        temporary_path.write_text(json.dumps(data))
+        os.replace(temporary_path, path)
+
+
+def _key(method: str, url: str) -> str:
+    """Get the key of a request, hashed so that no URL (which may hold a token) is written out."""
+    return hashlib.sha256(f"{method} {url}".encode()).hexdigest()
+
+
+def _cache_control(value: str) -> dict[str, str | None]:
+    """Parse a Cache-Control header, e.g. "max-age=60, no-cache" to its directives."""
+    directives: dict[str, str | None] = {}
+    for directive in value.split(","):
+        name, has_value, argument = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') if has_value else None
+    return directives
+
+
+def _seconds(value: str | None) -> int:
+    """Parse a delta-seconds value, of which an invalid one counts as 0."""
+    return int(value) if value is not None and value.isdigit() else 0
+
+
+def _merge_headers(*header_items: Iterable[tuple[str, str]]) -> Message:
+    """Get the headers with their later values replacing their earlier ones, case-insensitively."""
+    headers = Message()
+    for items in header_items:
+        for name, value in items:
+            del headers[name]
+            headers[name] = value
+    return headers
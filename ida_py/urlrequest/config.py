@@ -0,0 +1,68 @@
+"""Ida's urlrequest configuration."""
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+from ida_py.config import optional_number
+
+
+@dataclass
+class URLRequestConfig:
+    """Represent the configuration for outbound requests.
+
+    `pool_size` is the maximum amount of idle connections kept per host, `idle_timeout` the
+    seconds after which an idle connection is closed instead of reused. `max_concurrency` limits
+    the requests in flight of the async client and, by default, of `map`.
+
+    `rate_limit` is the maximum amount of requests per second per host and endpoint and
+    `key_rate_limit` per host, endpoint and key (e.g. a chat), 0 disables them. Failed requests
+    are retried at most `max_retries` times, the first time after `backoff` seconds. After
+    `failure_threshold` consecutive failures, requests to the host fail immediately for
+    `reset_timeout` seconds.
+
+    Cached GET responses are kept in memory, at most `cache_size` of them, and in `cache_dir` when
+    it is set. A response that has no freshness information of its own is fresh for `cache_ttl`
+    seconds.
+    """
+
+    pool_size: int = 4
+    idle_timeout: float = 30.0
+    max_concurrency: int = 10
+    rate_limit: float = 30.0
+    key_rate_limit: float = 1.0
+    max_retries: int = 3
+    backoff: float = 0.5
+    failure_threshold: int = 5
+    reset_timeout: float = 30.0
+    cache_size: int = 256
+    cache_ttl: float = 60.0
+    cache_dir: Path | None = None
+
+
+def urlrequest_config() -> URLRequestConfig:
+    """Attempt to get the config's fields from the environment."""
+    cache_dir = os.environ.get("URLREQUEST_CACHE_DIR")
+    return URLRequestConfig(
+        pool_size=optional_number("URLREQUEST_POOL_SIZE", int, URLRequestConfig.pool_size),
+        idle_timeout=optional_number(
+            "URLREQUEST_IDLE_TIMEOUT", float, URLRequestConfig.idle_timeout
+        ),
+        max_concurrency=optional_number(
+            "URLREQUEST_MAX_CONCURRENCY", int, URLRequestConfig.max_concurrency
+        ),
+        rate_limit=optional_number("URLREQUEST_RATE_LIMIT", float, URLRequestConfig.rate_limit),
+        key_rate_limit=optional_number(
+            "URLREQUEST_KEY_RATE_LIMIT", float, URLRequestConfig.key_rate_limit
+        ),
+        max_retries=optional_number("URLREQUEST_MAX_RETRIES", int, URLRequestConfig.max_retries),
+        backoff=optional_number("URLREQUEST_BACKOFF", float, URLRequestConfig.backoff),
+        failure_threshold=optional_number(
+            "URLREQUEST_FAILURE_THRESHOLD", int, URLRequestConfig.failure_threshold
+        ),
+        reset_timeout=optional_number(
+            "URLREQUEST_RESET_TIMEOUT", float, URLRequestConfig.reset_timeout
+        ),
+        cache_size=optional_number("URLREQUEST_CACHE_SIZE", int, URLRequestConfig.cache_size),
+        cache_ttl=optional_number("URLREQUEST_CACHE_TTL", float, URLRequestConfig.cache_ttl),
+        cache_dir=Path(cache_dir) if cache_dir else URLRequestConfig.cache_dir,
+    )
@@ -3,3 +3,7 @@
 
 class RequestError(Exception):
     """Raised whenever a request was unsuccessful."""
+
+
+class ResponseTooLargeError(RequestError):
+    """Raised when a response's body is larger than the maximum size that was given."""
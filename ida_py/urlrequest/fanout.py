@@ -0,0 +1,85 @@
+"""Ida's urlrequest fan-out, performing many requests concurrently."""
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from ida_py.urlrequest.errors import RequestError
+from ida_py.urlrequest.main import URLREQUEST_CONFIG, _request
+from ida_py.urlrequest.models import Request, Result
+from ida_py.urlrequest.utils import get_data
+
+
+def map(
+    requests: Iterable[Request],
+    max_workers: int = URLREQUEST_CONFIG.max_concurrency,
+    ordered: bool = True,
+) -> Iterator[Result]:
+    """Perform the requests concurrently, on at most `max_workers` threads.
+
+    Every request is performed like `get` and `post` do, on the shared connection pool and within
+    the rate limits, so that a bulk of messages is sent as fast as allowed. The requests are taken
+    from `requests` as workers become available, so it can be a (long) generator. A RequestError
+    is returned in the request's result, other errors are raised when their result is reached.
+
+    Parameters
+    ----------
+    requests : Iterable[Request]
+        The requests to perform.
+    max_workers : int, optional
+        The maximum amount of requests in flight, by default URLREQUEST_MAX_CONCURRENCY.
+    ordered : bool, optional
+        Whether to yield the results in the order of the requests, by default True. Otherwise, they
+        are yielded as they complete.
+
+    Yields
+    ------
+    Result
+        The response to a request or the error that prevented it.
+
+    Examples
+    --------
+    >>> requests = (Request(url, "POST", json=message) for message in messages)  # doctest: +SKIP
+    >>> failed = [result for result in map(requests) if result.error]  # doctest: +SKIP
+    """
+    assert max_workers > 0, "At least one worker is required."
+    with ThreadPoolExecutor(max_workers, thread_name_prefix="urlrequest") as executor:
+        pending: deque[Future[Result]] = deque()
+        for index, request in enumerate(requests):
+            if len(pending) >= 2 * max_workers:
+                yield from _completed(pending, ordered, wait_for_all=False)
+            pending.append(executor.submit(_perform, index, request))
+        yield from _completed(pending, ordered, wait_for_all=True)
+
+
+def _completed(
+    pending: deque[Future[Result]], ordered: bool, wait_for_all: bool
+) -> Iterator[Result]:
+    """Yield the results of (some of) the pending futures, removing them from `pending`."""
+    while pending:
+        if ordered:
+            yield pending.popleft().result()
+        else:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                yield future.result()
+        if not wait_for_all:
+            return
+
+
+def _perform(index: int, request: Request) -> Result:
+    assert not (request.form and request.json), "Either pass form or json, not both."
+    headers = dict(request.headers or {})
+    data = get_data(headers, request.form, request.json)
+    try:
+        response = _request(
+            request.method,
+            request.url,
+            headers,
+            data=data,
+            timeout=request.timeout,
+            rate_limit_key=request.rate_limit_key,
+        )
+    except RequestError as exc:
+        return Result(index, request, error=exc)
+    return Result(index, request, response=response)
@@ -0,0 +1,273 @@
+"""Ida's urlrequest rate limiting, retries and circuit breaking."""
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from ida_py.urlrequest.config import URLRequestConfig
+from ida_py.urlrequest.errors import RequestError
+from ida_py.urlrequest.models import Response, StreamingResponse
+
+# Methods that may be sent again when the server failed, as a retry has no additional effect
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# Statuses of an upstream (or a proxy in front of it) that is failing, rather than of a bad request
+SERVER_ERRORS = frozenset({500, 502, 503, 504})
+# A longer `retry_after` is not waited for, the 429 response is returned instead
+MAX_RETRY_AFTER = 60.0
+# The amount of buckets kept before the full ones, which behave like new ones, are dropped
+MAX_BUCKETS = 1024
+
+BucketKey = tuple[str, ...]
+
+
+class TokenBucket:
+    """Represent a token bucket, which allows `rate` requests per second in bursts of `burst`.
+
+    A request reserves a token, also when the bucket is empty. The bucket then goes into debt and
+    the request has to wait until the token would have been refilled. This way, concurrent
+    requests are spread out at `rate` in the order they reserved their token.
+    """
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Reserve a token and get the seconds to wait before it may be used."""
+        self._refill()
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Let the next reservation wait for at least `seconds`."""
+        self._refill()
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    def is_full(self) -> bool:
+        """Check whether the bucket is full, it then behaves as if it was just created."""
+        self._refill()
+        return self.tokens >= self.burst
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class RateLimiter:
+    """Represent token buckets per host and endpoint, and per host, endpoint and key.
+
+    Every request to an endpoint takes a token from the endpoint's bucket, which allows
+    `endpoint_rate` requests per second. A request with a key, e.g. the chat a message is sent to,
+    also takes a token from the bucket of that key, which allows `key_rate` requests per second.
+    A rate of 0 disables the respective buckets.
+    """
+
+    def __init__(self, endpoint_rate: float, key_rate: float) -> None:
+        self.endpoint_rate = endpoint_rate
+        self.key_rate = key_rate
+        self._buckets: dict[BucketKey, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, host: str, endpoint: str, key: str | None = None) -> float:
+        """Reserve a token in the buckets of the request and get the seconds to wait for them."""
+        delay = 0.0
+        with self._lock:
+            for bucket_key, rate in self._bucket_keys(host, endpoint, key):
+                delay = max(delay, self._bucket(bucket_key, rate).reserve())
+        return delay
+
+    def pause(self, seconds: float, host: str, endpoint: str, key: str | None = None) -> None:
+        """Let the next request wait for at least `seconds`, e.g. after a 429 response.
+
+        Only the most specific bucket is paused: the key's when the request has a key.
+        """
+        bucket_keys = self._bucket_keys(host, endpoint, key)
+        if not bucket_keys:
+            return
+        bucket_key, rate = bucket_keys[-1]
+        with self._lock:
+            self._bucket(bucket_key, rate).pause(seconds)
+
+    def _bucket_keys(
+        self, host: str, endpoint: str, key: str | None
+    ) -> list[tuple[BucketKey, float]]:
+        bucket_keys: list[tuple[BucketKey, float]] = []
+        if self.endpoint_rate > 0:
+            bucket_keys.append(((host, endpoint), self.endpoint_rate))
+        if key is not None and self.key_rate > 0:
+            bucket_keys.append(((host, endpoint, key), self.key_rate))
+        return bucket_keys
+
+    def _bucket(self, bucket_key: BucketKey, rate: float) -> TokenBucket:
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            if len(self._buckets) >= MAX_BUCKETS:
+                self._buckets = {k: b for k, b in self._buckets.items() if not b.is_full()}
+            bucket = self._buckets[bucket_key] = TokenBucket(rate, max(1.0, rate))
+        return bucket
+
+
+@dataclass
+class _Circuit:
+    failures: int = 0
+    opened_at: float | None = None
+
+
+class CircuitBreaker:
+    """Represent a circuit breaker per host.
+
+    After `failure_threshold` consecutive failures, the circuit of a host opens: requests to it
+    fail immediately instead of waiting for a timeout or adding to the upstream's load. After
+    `reset_timeout` seconds, a single request is let through. When it succeeds the circuit closes,
+    otherwise it stays open for another `reset_timeout` seconds. A threshold of 0 disables it.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._circuits: dict[str, _Circuit] = {}
+        self._lock = threading.Lock()
+
+    def check(self, host: str) -> None:
+        """Check whether a request to the host may be sent.
+
+        Raises
+        ------
+        RequestError
+            When the host's circuit is open.
+        """
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None or circuit.opened_at is None:
+                return
+            now = time.monotonic()
+            if now - circuit.opened_at < self.reset_timeout:
+                raise RequestError(
+                    f"The circuit for {host} is open after {circuit.failures} consecutive failures."
+                )
+            # Let this request through as a trial, the others wait for its outcome
+            circuit.opened_at = now
+
+    def record(self, host: str, success: bool) -> None:
+        """Record the outcome of a request to the host."""
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            if success:
+                self._circuits.pop(host, None)
+                return
+            circuit = self._circuits.setdefault(host, _Circuit())
+            circuit.failures += 1
+            if circuit.failures >= self.failure_threshold:
+                circuit.opened_at = time.monotonic()
+
+
+class RequestPolicy:
+    """Represent the rate limits, retries and circuit breaker that apply to outbound requests.
+
+    `before` is called before every attempt of a request and `after` with its outcome, which tells
+    whether and when to try again. Responses with status 429 (Too Many Requests) are retried after
+    the `retry_after` the server asked for, or after a backoff. Server errors and requests that
+    did not get a response are retried after a backoff, for idempotent methods only as the server
+    may have processed the request. The backoff doubles every attempt, starting at `backoff`
+    seconds, and is jittered so that clients which failed at once do not retry at once.
+
+    Parameters
+    ----------
+    rate_limit : float, optional
+        The requests per second per host and endpoint, by default 30.0.
+    key_rate_limit : float, optional
+        The requests per second per host, endpoint and key, by default 1.0.
+    max_retries : int, optional
+        The maximum amount of retries of a request, by default 3.
+    backoff : float, optional
+        The seconds to wait before the first retry, by default 0.5.
+    failure_threshold : int, optional
+        The consecutive failures after which the circuit of a host opens, by default 5.
+    reset_timeout : float, optional
+        The seconds after which an open circuit lets a request through, by default 30.0.
+    """
+
+    def __init__(
+        self,
+        rate_limit: float = URLRequestConfig.rate_limit,
+        key_rate_limit: float = URLRequestConfig.key_rate_limit,
+        max_retries: int = URLRequestConfig.max_retries,
+        backoff: float = URLRequestConfig.backoff,
+        failure_threshold: int = URLRequestConfig.failure_threshold,
+        reset_timeout: float = URLRequestConfig.reset_timeout,
+    ) -> None:
+        self.limiter = RateLimiter(rate_limit, key_rate_limit)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def before(self, host: str, endpoint: str, key: str | None = None) -> float:
+        """Get the seconds to wait before the request may be sent.
+
+        Raises
+        ------
+        RequestError
+            When the host's circuit is open.
+        """
+        self.breaker.check(host)
+        return self.limiter.reserve(host, endpoint, key)
+
+    def after(
+        self,
+        method: str,
+        host: str,
+        endpoint: str,
+        key: str | None,
+        attempt: int,
+        response: Response | StreamingResponse | None,
+    ) -> float | None:
+        """Record the outcome of an attempt and get the seconds to wait before retrying it.
+
+        `attempt` counts from 0 and `response` is None when no response was received. None is
+        returned when the request should not be retried.
+        """
+        status_code = None if response is None else response.status_code
+        failed = status_code is None or status_code in SERVER_ERRORS
+        self.breaker.record(host, success=not failed)
+        if attempt >= self.max_retries:
+            return None
+
+        if status_code == 429:
+            assert response is not None
+            retry_after = _retry_after(response)
+            if retry_after is None:
+                return self._backoff(attempt)
+            if retry_after > MAX_RETRY_AFTER:
+                return None
+            self.limiter.pause(retry_after, host, endpoint, key)
+            return retry_after + random.uniform(0, self.backoff)
+        if failed and method in IDEMPOTENT_METHODS:
+            return self._backoff(attempt)
+        return None
+
+    def _backoff(self, attempt: int) -> float:
+        return min(MAX_RETRY_AFTER, self.backoff * 2**attempt) * random.uniform(0.5, 1.0)
+
+
+def _retry_after(response: Response | StreamingResponse) -> float | None:
+    """Get the seconds the server asked to wait, from Telegram's `parameters` or the header.
+
+    The body of a streaming response is not read, only its header is used.
+    """
+    retry_after: Any = response.headers.get("Retry-After")
+    if isinstance(response, Response):
+        try:
+            retry_after = response.json()["parameters"]["retry_after"]
+        except (ValueError, TypeError, KeyError):
+            pass
+    if retry_after is None:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except (ValueError, TypeError):
+        return None
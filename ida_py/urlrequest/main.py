@@ -1,35 +1,95 @@
 """Ida's urlrequest main functionality."""
-import json as _json
-from urllib.error import HTTPError, URLError
-from urllib.parse import urlencode, urlparse
-from urllib.request import Request, urlopen
-from urllib.response import addinfourl
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, TypeVar
 
-from ida_py.urlrequest.errors import RequestError
-from ida_py.urlrequest.models import Response
+from ida_py.metrics import REGISTRY
+from ida_py.urlrequest.cache import ResponseCache
+from ida_py.urlrequest.config import urlrequest_config
+from ida_py.urlrequest.errors import RequestError, ResponseTooLargeError
+from ida_py.urlrequest.limits import RequestPolicy
+from ida_py.urlrequest.models import CHUNK_SIZE, Download, Response, StreamingResponse
+from ida_py.urlrequest.pool import ConnectionPool
+from ida_py.urlrequest.utils import attempts, get_data
 
+URLREQUEST_CONFIG = urlrequest_config()
+POOL = ConnectionPool(URLREQUEST_CONFIG.pool_size, URLREQUEST_CONFIG.idle_timeout)
+POLICY = RequestPolicy(
+    URLREQUEST_CONFIG.rate_limit,
+    URLREQUEST_CONFIG.key_rate_limit,
+    URLREQUEST_CONFIG.max_retries,
+    URLREQUEST_CONFIG.backoff,
+    URLREQUEST_CONFIG.failure_threshold,
+    URLREQUEST_CONFIG.reset_timeout,
+)
+CACHE = ResponseCache(
+    URLREQUEST_CONFIG.cache_size, URLREQUEST_CONFIG.cache_ttl, URLREQUEST_CONFIG.cache_dir
+)
 
-def get(url: str, headers: dict[str, str] = None, timeout: int = 10) -> Response:
-    """Perform a GET request."""
-    return _request("GET", url, headers=headers, timeout=timeout)
+AnyResponse = TypeVar("AnyResponse", Response, StreamingResponse)
+
+CACHE_LOOKUPS = REGISTRY.counter(
+    "ida_urlrequest_cache_lookups_total",
+    "Cached GET requests per result: hit, revalidated or miss.",
+    ("result",),
+)
+
+
+def get(
+    url: str,
+    headers: dict[str, str] | None = None,
+    timeout: int = 10,
+    rate_limit_key: str | None = None,
+    cache: bool = False,
+) -> Response:
+    """Perform a GET request.
+
+    With `cache`, a fresh response from an earlier request to the URL is returned, if any, see
+    `ResponseCache`. A stale one is revalidated with a conditional request when it has an ETag or
+    Last-Modified header. Only use it for requests whose headers do not change the response.
+    """
+    if not cache:
+        return _request("GET", url, headers, timeout=timeout, rate_limit_key=rate_limit_key)
+
+    entry = CACHE.lookup("GET", url)
+    if entry is not None and entry.is_fresh():
+        CACHE_LOOKUPS.inc(result="hit")
+        return entry.response
+    request_headers = dict(headers or {})
+    if entry is not None:
+        request_headers.update(entry.validators())
+    response = _request("GET", url, request_headers, timeout=timeout, rate_limit_key=rate_limit_key)
+    if entry is not None and response.status_code == 304:
+        CACHE_LOOKUPS.inc(result="revalidated")
+        return CACHE.refresh("GET", url, entry, response)
+    CACHE_LOOKUPS.inc(result="miss")
+    CACHE.store("GET", url, response)
+    return response
 
 
 def post(
     url: str,
     headers: dict[str, str] | None = None,
     timeout: int = 10,
-    form: dict = None,
-    json: dict = None,
+    form: dict | None = None,
+    json: Any = None,
+    rate_limit_key: str | None = None,
 ) -> Response:
     """Perform a POST request.
 
     `form` and `json` can both be None.
     `form` and `json` cannot both have a truthy value.
+    `json` can be a dataclass instance, its fields that are None and default to None are left out.
+    `rate_limit_key` limits the rate of the requests with that key, e.g. the messages to a chat.
     """
     assert not (form and json), "Either pass form or json, not both."
     headers = headers or {}
-    data = _get_data(headers, form, json)
-    response = _request("POST", url, headers, data=data, timeout=timeout)
+    data = get_data(headers, form, json)
+    response = _request(
+        "POST", url, headers, data=data, timeout=timeout, rate_limit_key=rate_limit_key
+    )
     return response
 
 
@@ -39,78 +99,160 @@ def _request(
     headers: dict[str, str] | None = None,
     data: bytes | None = None,
     timeout: int = 10,
+    rate_limit_key: str | None = None,
 ) -> Response:
-    """Perform an HTTP request.
+    """Perform an HTTP request on a pooled keep-alive connection, see `ConnectionPool`.
+
+    The request waits for the rate limits and is retried as described by `RequestPolicy`.
 
     Returns
     -------
     Response
-        The response received from the server.
+        The response received from the server, the last one when the request was retried.
 
     Raises
     ------
     RequestError
-        When the request could not reach the server.
+        When the request could not reach the server or the host's circuit is open.
 
     Notes
     -----
-    The timeout does not seem to be taken into account. The socket timeout seems to take precedence.
+    The timeout applies to connecting and to every read of the response, not to the request as a
+    whole, nor to waiting for the rate limits and retries.
+    This module should only be used to make requests to pre-defined URLs and not accept user-input
+    to define the URL. Note that this is not enforced (yet).
     """
-    parsed_url = urlparse(url)
-    assert parsed_url.scheme == "https", f"Missing or unsupported scheme: {parsed_url.scheme}"
-    request = Request(url, headers=headers or {}, data=data, method=method)
+    return _perform(
+        method,
+        url,
+        rate_limit_key,
+        lambda: POOL.request(method, url, headers or {}, data=data, timeout=timeout),
+    )
+
+
+def _perform(
+    method: str, url: str, rate_limit_key: str | None, send: Callable[[], AnyResponse]
+) -> AnyResponse:
+    """Send a request with `send` as often as `POLICY` allows, see `attempts`."""
+    steps = attempts(POLICY, method, url, rate_limit_key)
     try:
-        return _perform_request(request, timeout=timeout)
-    except HTTPError as exc:
-        return _handle_http_error(exc)
-    except URLError as exc:
-        raise RequestError(exc.reason)
-
-
-def _handle_http_error(exc: HTTPError) -> Response:
-    return Response(
-        exc.reason.encode(),
-        status_code=exc.status or 500,
-        content_type=exc.headers.get_content_type(),
-        headers=dict(exc.headers),
+        delay = next(steps)
+        while True:
+            if delay is not None:
+                time.sleep(delay)
+                delay = next(steps)
+                continue
+            try:
+                response = send()
+            except RequestError as exc:
+                delay = steps.throw(exc)
+            else:
+                delay = steps.send(response)
+    except StopIteration as stop:
+        return stop.value
+
+
+def stream(
+    url: str,
+    headers: dict[str, str] | None = None,
+    timeout: int = 10,
+    max_size: int | None = None,
+    rate_limit_key: str | None = None,
+) -> StreamingResponse:
+    """Perform a GET request whose body is read in chunks, see `StreamingResponse`.
+
+    The request is rate limited and retried like `get`, as long as its body was not read yet.
+    Use the response as a context manager, so that its connection is released.
+
+    Examples
+    --------
+    >>> with stream(url, max_size=20 * 1024 * 1024) as response:  # doctest: +SKIP
+    ...     for chunk in response.iter_chunks():
+    ...         ...
+    """
+    response = _perform(
+        "GET",
+        url,
+        rate_limit_key,
+        lambda: POOL.stream("GET", url, headers or {}, timeout=timeout),
     )
+    response.max_size = max_size
+    return response
 
 
-def _perform_request(request: Request, timeout: int = 10) -> Response:
-    """Perform the request by calling urlopen.
+def download(
+    url: str,
+    path: str | Path,
+    headers: dict[str, str] | None = None,
+    timeout: int = 10,
+    max_size: int | None = None,
+    resume: bool = True,
+    rate_limit_key: str | None = None,
+) -> Download:
+    """Download the body of a GET request to `path`, chunk by chunk.
 
-    Notes
-    -----
-    B310:
-        urlopen allows unsafe redirects and supports other schemes than https (e.g.: ftp).
-        This opens up a vulnerability when the user can manipulate the opened url. They could for
-        example open a website that returns a 302 and redirect to a ftp or other unsupported scheme.
-        Therefore this module should only be used to make requests to pre-defined URLs and not
-        accept user-input to define the URL. Note that this is not enforced (yet).
-    no-redef:
-        Allow redefining `response` to add typing. This is for convenience because the IDE will then
-        correctly auto-complete for the current use-case. Since our tests always mock urlopen, the
-        return of this method is never really tested, therefore it is important to statically ensure
-        that accessed attributes exist.
+    The body is written to "<path>.part" first, which is renamed to `path` once it is complete.
+    When the part file exists already, e.g. because an earlier download was interrupted, only the
+    rest of the body is requested with a Range header. The server may ignore it and answer with
+    the whole body instead, which then replaces the part file. The sha256 of the content is
+    computed while it is written, the part that was downloaded before included.
+
+    Returns
+    -------
+    Download
+        The path, size and sha256 of the downloaded file.
+
+    Raises
+    ------
+    ResponseTooLargeError
+        When the file is larger than `max_size` bytes, the part file is removed.
+    RequestError
+        When the download did not succeed, a part file is kept to resume from.
     """
-    with urlopen(request, timeout=timeout) as response:  # nosec B310
-        response: addinfourl  # type: ignore[no-redef]
-        print(response.status)
-        return Response(
-            response.read(),
-            status_code=response.status,
-            content_type=response.headers.get_content_type(),
-            headers=response.headers,
-        )
-
-
-def _get_data(headers: dict[str, str], form: dict = None, json: dict = None) -> bytes | None:
-    if json:
-        headers["Content-Type"] = "application/json"
-        data = _json.dumps(json).encode()
-    elif form:
-        headers["Content-Type"] = "application/x-www-form-urlencoded"
-        data = urlencode(form).encode()
-    else:
-        data = None
-    return data
+    path = Path(path)
+    part_path = path.with_name(path.name + ".part")
+    offset = part_path.stat().st_size if resume and part_path.exists() else 0
+    request_headers = dict(headers or {})
+    if offset:
+        request_headers["Range"] = f"bytes={offset}-"
+
+    with stream(url, request_headers, timeout=timeout, rate_limit_key=rate_limit_key) as response:
+        if response.status_code == 416 and offset:
+            # The part file is no prefix of the body (anymore), start from scratch
+            part_path.unlink()
+            response.close()
+            return download(url, path, headers, timeout, max_size, False, rate_limit_key)
+        if response.status_code == 206 and _range_start(response) == offset:
+            mode = "ab"
+        elif response.status_code == 200:
+            mode, offset = "wb", 0
+        else:
+            raise RequestError(f"Could not download the file ({response.status_code}).")
+
+        digest = hashlib.sha256()
+        if offset:
+            with part_path.open("rb") as part_file:
+                while chunk := part_file.read(CHUNK_SIZE):
+                    digest.update(chunk)
+        response.max_size = None if max_size is None else max_size - offset
+        size = offset
+        try:
+            with part_path.open(mode) as part_file:
+                for chunk in response.iter_chunks():
+                    part_file.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+        except ResponseTooLargeError:
+            part_path.unlink(missing_ok=True)
+            raise
+
+    os.replace(part_path, path)
+    return Download(path, size, digest.hexdigest())
+
+
+def _range_start(response: StreamingResponse) -> int | None:
+    """Get the first byte of the range in a 206 response, e.g. 100 in "bytes 100-199/200"."""
+    content_range = response.headers.get("Content-Range", "")
+    unit, _, byte_range = content_range.partition(" ")
+    start = byte_range.partition("-")[0]
+    return int(start) if unit == "bytes" and start.isdigit() else None
@@ -1,6 +1,17 @@
 """Ida's urlrequest models."""
 import json
+from collections.abc import Iterator, Mapping
 from dataclasses import dataclass, field
+from email.message import Message
+from pathlib import Path
+from typing import Any, Callable
+
+from ida_py.urlrequest.errors import RequestError, ResponseTooLargeError
+
+CHUNK_SIZE = 64 * 1024
+
+# The headers of a response, as given or as parsed (case-insensitively) by http.client
+Headers = Mapping[str, str] | Message
 
 
 @dataclass
@@ -10,8 +21,134 @@ class Response:
     body: bytes
     status_code: int = 200
     content_type: str = "text/html"
-    headers: dict[str, str] = field(default_factory=dict)
+    headers: Headers = field(default_factory=dict)
 
     def json(self):
         """Convert the body to a dictionary using the json module."""
         return json.loads(self.body)
+
+
+@dataclass(frozen=True)
+class Request:
+    """Represent a request to perform, see `map`. The fields are the arguments of `post`."""
+
+    url: str
+    method: str = "GET"
+    headers: dict[str, str] | None = None
+    form: dict | None = None
+    json: Any = None
+    timeout: int = 10
+    rate_limit_key: str | None = None
+
+
+@dataclass(frozen=True)
+class Result:
+    """Represent the outcome of a request performed by `map`, either a response or an error.
+
+    `index` is the position of the request in the requests that were given.
+    """
+
+    index: int
+    request: Request
+    response: Response | None = None
+    error: RequestError | None = None
+
+
+class StreamingResponse:
+    """Represent a Response whose body is read in chunks, instead of at once.
+
+    The response holds on to its connection until the body was read or the response was closed,
+    use it as a context manager to make sure it is closed.
+
+    Parameters
+    ----------
+    status_code : int
+        The status code of the response.
+    content_type : str
+        The content type of the response, without its parameters.
+    headers : Headers
+        The headers of the response.
+    read : Callable[[int], bytes]
+        Read at most the given amount of bytes of the body, an empty result marks its end.
+    release : Callable[[bool], None]
+        Release the connection, which is only reusable when the body was read completely.
+    max_size : int | None, optional
+        The maximum size of the body in bytes, by default unlimited.
+    """
+
+    def __init__(
+        self,
+        status_code: int,
+        content_type: str,
+        headers: Headers,
+        read: Callable[[int], bytes],
+        release: Callable[[bool], None],
+        max_size: int | None = None,
+    ) -> None:
+        self.status_code = status_code
+        self.content_type = content_type
+        self.headers = headers
+        self.max_size = max_size
+        self._read = read
+        self._release: Callable[[bool], None] | None = release
+
+    def __enter__(self) -> "StreamingResponse":
+        """Use the response as a context manager, which closes it on exit."""
+        return self
+
+    def __exit__(self, *_) -> None:
+        """Close the response, see `close`."""
+        self.close()
+
+    def iter_chunks(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Iterate over the body in chunks of at most `chunk_size` bytes.
+
+        The response is closed once the body was read.
+
+        Raises
+        ------
+        ResponseTooLargeError
+            When the body is larger than `max_size`, before it is read if its length is known.
+        RequestError
+            When the body could not be read.
+        """
+        content_length = self.headers.get("Content-Length")
+        if content_length and content_length.isdigit():
+            self._check_size(int(content_length))
+        size = 0
+        try:
+            while chunk := self._read(chunk_size):
+                size += len(chunk)
+                self._check_size(size)
+                yield chunk
+        except BaseException:
+            self.close()
+            raise
+        self._close(complete=True)
+
+    def read(self) -> bytes:
+        """Read the (remaining) body at once, see `iter_chunks`."""
+        return b"".join(self.iter_chunks())
+
+    def close(self) -> None:
+        """Close the response, discarding the part of the body that was not read."""
+        self._close(complete=False)
+
+    def _check_size(self, size: int) -> None:
+        if self.max_size is not None and size > self.max_size:
+            self.close()
+            raise ResponseTooLargeError(f"The response is larger than {self.max_size} bytes.")
+
+    def _close(self, complete: bool) -> None:
+        if self._release is not None:
+            release, self._release = self._release, None
+            release(complete)
+
+
+@dataclass(frozen=True)
+class Download:
+    """Represent a file that was downloaded, with the size and sha256 of its whole content."""
+
+    path: Path
+    size: int
+    sha256: str
@@ -0,0 +1,239 @@
+"""Ida's urlrequest connection pool."""
+import http.client
+import select
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from ida_py.urlrequest.config import URLRequestConfig
+from ida_py.urlrequest.errors import RequestError
+from ida_py.urlrequest.models import Response, StreamingResponse
+
+Connection = http.client.HTTPConnection
+
+CONNECTION_CLASSES: dict[str, type[Connection]] = {
+    "https": http.client.HTTPSConnection,
+    "http": http.client.HTTPConnection,
+}
+# Errors that mean a reused connection was closed by the server while it was idle
+STALE_ERRORS = (ConnectionError, http.client.RemoteDisconnected, http.client.BadStatusLine)
+
+
+class ConnectionPool:
+    """Represent a pool of keep-alive connections, per scheme, host and port.
+
+    A connection is taken from the pool for a single request, at most one request is in flight on
+    it at a time. Once its response is read, the connection is returned to the pool, unless the
+    server asked to close it or `pool_size` connections to the host are idle already. Idle
+    connections are reused most recent first. The ones that were idle for longer than
+    `idle_timeout` seconds, or that the server closed in the meantime, are closed instead.
+
+    When a reused connection turns out to be stale anyway (the server closed it before
+    responding), the request is sent once more on a new connection.
+
+    Parameters
+    ----------
+    pool_size : int, optional
+        The maximum amount of idle connections kept per host, by default 4.
+    idle_timeout : float, optional
+        The seconds a connection may stay idle before it is closed, by default 30.0.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = URLRequestConfig.pool_size,
+        idle_timeout: float = URLRequestConfig.idle_timeout,
+    ) -> None:
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self._idle: dict[tuple[str, str, int | None], deque[tuple[Connection, float]]] = {}
+        self._lock = threading.Lock()
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: dict[str, str],
+        data: bytes | None = None,
+        timeout: float = 10,
+    ) -> Response:
+        """Perform an HTTP request on a pooled connection.
+
+        Redirects are not followed, the redirect itself is returned.
+
+        Returns
+        -------
+        Response
+            The response received from the server, whatever its status code.
+
+        Raises
+        ------
+        RequestError
+            When the request could not reach the server or no valid response was received.
+        """
+        key, path = _split(url)
+        connection, response = self._open(key, method, path, headers, data, timeout)
+        try:
+            body = response.read()
+        except (OSError, http.client.HTTPException) as exc:
+            connection.close()
+            raise RequestError(str(exc) or type(exc).__name__)
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(key, connection)
+        return Response(
+            body,
+            status_code=response.status,
+            content_type=response.headers.get_content_type(),
+            headers=response.headers,
+        )
+
+    def stream(
+        self,
+        method: str,
+        url: str,
+        headers: dict[str, str],
+        data: bytes | None = None,
+        timeout: float = 10,
+    ) -> StreamingResponse:
+        """Perform an HTTP request on a pooled connection, without reading the response's body.
+
+        The connection is held until the body was read or the response was closed. It is only
+        returned to the pool when the body was read completely.
+
+        Returns
+        -------
+        StreamingResponse
+            The response received from the server, whatever its status code.
+
+        Raises
+        ------
+        RequestError
+            When the request could not reach the server or no valid response was received.
+        """
+        key, path = _split(url)
+        connection, response = self._open(key, method, path, headers, data, timeout)
+
+        def read(amount: int) -> bytes:
+            try:
+                return response.read(amount)
+            except (OSError, http.client.HTTPException) as exc:
+                connection.close()
+                raise RequestError(str(exc) or type(exc).__name__)
+
+        def release(complete: bool) -> None:
+            if complete and not response.will_close:
+                self._release(key, connection)
+            else:
+                connection.close()
+
+        return StreamingResponse(
+            status_code=response.status,
+            content_type=response.headers.get_content_type(),
+            headers=response.headers,
+            read=read,
+            release=release,
+        )
+
+    def close(self) -> None:
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection, _ in connections:
+                connection.close()
+
+    def idle_connections(self, url: str) -> int:
+        """Get the amount of idle connections to the scheme, host and port of the url."""
+        key, _ = _split(url)
+        with self._lock:
+            return len(self._idle.get(key, ()))
+
+    def _open(
+        self,
+        key: tuple[str, str, int | None],
+        method: str,
+        path: str,
+        headers: dict[str, str],
+        data: bytes | None,
+        timeout: float,
+    ) -> tuple[Connection, http.client.HTTPResponse]:
+        """Send the request and read the head of its response."""
+        connection, reused = self._acquire(key, timeout)
+        try:
+            try:
+                response = _send(connection, method, path, headers, data)
+            except STALE_ERRORS:
+                connection.close()
+                if not reused:
+                    raise
+                connection = self._connect(key, timeout)
+                response = _send(connection, method, path, headers, data)
+        except (OSError, http.client.HTTPException) as exc:
+            connection.close()
+            raise RequestError(str(exc) or type(exc).__name__)
+        return connection, response
+
+    def _acquire(self, key: tuple[str, str, int | None], timeout: float) -> tuple[Connection, bool]:
+        """Get an idle connection that is still usable, or a new one. Also tell which it is."""
+        expired = []
+        connection = None
+        with self._lock:
+            connections = self._idle.get(key)
+            now = time.monotonic()
+            while connections and connection is None:
+                candidate, idle_since = connections.pop()
+                if now - idle_since > self.idle_timeout or _is_closed(candidate):
+                    expired.append(candidate)
+                else:
+                    connection = candidate
+        for expired_connection in expired:
+            expired_connection.close()
+        if connection is None:
+            return self._connect(key, timeout), False
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        return connection, True
+
+    def _connect(self, key: tuple[str, str, int | None], timeout: float) -> Connection:
+        scheme, host, port = key
+        connection_class = CONNECTION_CLASSES.get(scheme)
+        if connection_class is None:
+            raise RequestError(f"Unsupported scheme: {scheme}")
+        return connection_class(host, port, timeout=timeout)
+
+    def _release(self, key: tuple[str, str, int | None], connection: Connection) -> None:
+        with self._lock:
+            connections = self._idle.setdefault(key, deque())
+            if len(connections) < self.pool_size:
+                connections.append((connection, time.monotonic()))
+                return
+        connection.close()
+
+
+def _split(url: str) -> tuple[tuple[str, str, int | None], str]:
+    """Get the scheme, host and port of the url, and the path to request."""
+    split_url = urlsplit(url)
+    path = split_url.path or "/"
+    if split_url.query:
+        path += "?" + split_url.query
+    return (split_url.scheme, split_url.hostname or "", split_url.port), path
+
+
+def _send(
+    connection: Connection, method: str, path: str, headers: dict[str, str], data: bytes | None
+) -> http.client.HTTPResponse:
+    connection.request(method, path, body=data, headers=headers)
+    return connection.getresponse()
+
+
+def _is_closed(connection: Connection) -> bool:
+    """Check whether an idle connection was closed, an idle socket only turns readable on EOF."""
+    if connection.sock is None:
+        return True
+    readable, _, _ = select.select([connection.sock], [], [], 0)
+    return bool(readable)
@@ -0,0 +1,107 @@
+"""Ida's urlrequest utilities, shared by the sync and the async client."""
+import time
+from collections.abc import Generator
+from typing import Any
+from urllib.parse import urlencode, urlparse
+
+from ida_py import transformer
+from ida_py.metrics import REGISTRY
+from ida_py.urlrequest.errors import RequestError
+from ida_py.urlrequest.limits import RequestPolicy
+from ida_py.urlrequest.models import Response, StreamingResponse
+
+# The Bot API methods that are told apart in the metrics and rate limits
+ENDPOINTS = frozenset(
+    {
+        "answerCallbackQuery",
+        "copyMessage",
+        "deleteMessage",
+        "deleteWebhook",
+        "editMessageReplyMarkup",
+        "editMessageText",
+        "forwardMessage",
+        "getChat",
+        "getFile",
+        "getMe",
+        "getUpdates",
+        "getWebhookInfo",
+        "sendChatAction",
+        "sendDocument",
+        "sendMessage",
+        "sendPhoto",
+        "setMyCommands",
+        "setWebhook",
+    }
+)
+OTHER_ENDPOINT = "other"
+
+REQUEST_DURATION = REGISTRY.histogram(
+    "ida_urlrequest_duration_seconds",
+    "Time spent on outbound requests, per host, endpoint and status.",
+    ("host", "endpoint", "status"),
+)
+
+AnyResponse = Response | StreamingResponse
+
+
+def attempts(
+    policy: RequestPolicy, method: str, url: str, rate_limit_key: str | None
+) -> Generator[float | None, AnyResponse, AnyResponse]:
+    """Run the attempts of a request as often as `policy` allows, and time every attempt.
+
+    This is the retry loop of both the sync and the async client, which only differ in how they
+    sleep and send the request. The generator yields the seconds to sleep, or None when the
+    request should be sent. The response is then sent into the generator, or the RequestError
+    that prevented it is thrown into it. The generator returns the final response, or raises the
+    final error.
+    """
+    parsed_url = urlparse(url)
+    assert parsed_url.scheme == "https", f"Missing or unsupported scheme: {parsed_url.scheme}"
+    host, endpoint = parsed_url.hostname or "", get_endpoint(parsed_url.path)
+    labels = {"host": host, "endpoint": endpoint}
+    attempt = 0
+    while True:
+        wait = policy.before(host, endpoint, rate_limit_key)
+        if wait:
+            yield wait
+        start = time.perf_counter()
+        try:
+            response = yield None
+        except RequestError:
+            REQUEST_DURATION.observe(time.perf_counter() - start, status="error", **labels)
+            retry_delay = policy.after(method, host, endpoint, rate_limit_key, attempt, None)
+            if retry_delay is None:
+                raise
+        else:
+            status = response.status_code
+            REQUEST_DURATION.observe(time.perf_counter() - start, status=status, **labels)
+            retry_delay = policy.after(method, host, endpoint, rate_limit_key, attempt, response)
+            if retry_delay is None:
+                return response
+            if isinstance(response, StreamingResponse):
+                response.close()
+        yield retry_delay
+        attempt += 1
+
+
+def get_endpoint(path: str) -> str:
+    """Get the Bot API method the path ends in, e.g. "sendMessage", or OTHER_ENDPOINT.
+
+    The endpoint is a metric label and a rate limit key, so it must have few values: file paths
+    and identifiers at the end of other URLs are all mapped to OTHER_ENDPOINT.
+    """
+    segment = path.rstrip("/").rsplit("/", 1)[-1]
+    return segment if segment in ENDPOINTS else OTHER_ENDPOINT
+
+
+def get_data(headers: dict[str, str], form: dict | None = None, json: Any = None) -> bytes | None:
+    """Encode `json` or `form` into a request body, and set its Content-Type in `headers`."""
+    if json:
+        headers["Content-Type"] = "application/json"
+        data = transformer.to_json(json, skip_none=True)
+    elif form:
+        headers["Content-Type"] = "application/x-www-form-urlencoded"
+        data = urlencode(form).encode()
+    else:
+        data = None
+    return data
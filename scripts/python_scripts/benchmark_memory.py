@@ -0,0 +1,155 @@
+"""Benchmark the memory footprint of decoded updates and parsed requests.
+
+Every update in tests/data/bot is decoded into a TelegramUpdate and every request in
+tests/data/api is parsed into a server Request, a number of times. The instances are kept alive
+and the memory they hold, as traced by tracemalloc, is reported per instance. This includes the
+strings, lists and nested models of each instance, as they are allocated anew for every update.
+
+The results are written as JSON and, when a baseline is given, compared against it, the exit code
+is 1 when an instance grew.
+
+Examples
+--------
+python scripts/python_scripts/benchmark_memory.py --output baseline.json
+python scripts/python_scripts/benchmark_memory.py --baseline baseline.json --output current.json
+"""
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from string import Template
+from typing import Any, Callable
+
+ROOT_DIR = Path(__file__).parent.parent.parent
+DATA_DIR = ROOT_DIR / "tests" / "data"
+BENCHMARK_ENVIRON = {
+    "CHAT_ID": "123456789",
+    "DOMAIN_NAME": "ida.example.com",
+    "WEBHOOK_TOKEN": "benchmark-token",
+    "BOT_ROUTE": "/bot-benchmark-route",
+    "HOST": "localhost",
+    "PORT": "0",
+    "ENDPOINT": "http://localhost/",
+}
+
+
+def main() -> None:
+    """Run the benchmark, write the results and compare them with the baseline."""
+    args = _parse_args()
+    for key, value in BENCHMARK_ENVIRON.items():
+        os.environ.setdefault(key, value)
+
+    measurements = {
+        name: {"bytes_per_instance": _measure(create, args.instances)}
+        for name, create in _load_fixtures().items()
+    }
+    results: dict[str, Any] = {
+        "environment": {
+            "instances": args.instances,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+        },
+        "fixtures": measurements,
+    }
+
+    regressions = []
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = _compare(baseline, results, args.tolerance)
+    results["regressions"] = regressions
+
+    _print_results(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    if regressions:
+        sys.exit(1)
+
+
+def _parse_args() -> Namespace:
+    parser = ArgumentParser("benchmark_memory", description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--instances", type=int, default=10000, help="instances per fixture, default 10000"
+    )
+    parser.add_argument("--output", type=Path, help="write the results as JSON to this file")
+    parser.add_argument("--baseline", type=Path, help="compare with the results in this file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.05,
+        help="the fraction an instance may be larger than the baseline, default 0.05",
+    )
+    return parser.parse_args()
+
+
+def _load_fixtures() -> dict[str, Callable[[], Any]]:
+    """Get a function per fixture that creates a new instance from the fixture's data."""
+    from ida_py import bot, transformer
+    from ida_py.server.utils import parse_request
+
+    fixtures: dict[str, Callable[[], Any]] = {}
+    for directory in sorted((DATA_DIR / "bot").iterdir()):
+        data = _read(directory, "update.txt").encode()
+        fixtures[f"update_{directory.name}"] = lambda data=data: transformer.from_json(
+            bot.TelegramUpdate, data
+        )
+    for directory in sorted((DATA_DIR / "api").iterdir()):
+        data = _read(directory, "request.txt").encode()
+        fixtures[f"request_{directory.name}"] = lambda data=data: parse_request(data)
+    return fixtures
+
+
+def _read(directory: Path, name: str) -> str:
+    data = (directory / name).read_text()
+    if (directory / ".template").exists():
+        data = Template(data).substitute(os.environ)
+    return data
+
+
+def _measure(create: Callable[[], Any], count: int) -> float:
+    """Create `count` instances and get the bytes that each of them holds on average."""
+    create()  # Build the decode plans and caches outside of the measurement
+    instances: list[Any] = [None] * count
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        for index in range(count):
+            instances[index] = create()
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (after - before) / count
+
+
+def _compare(baseline: dict, results: dict, tolerance: float) -> list[str]:
+    """Describe every fixture whose instances are larger than the baseline allows."""
+    regressions = []
+    for name, current in results["fixtures"].items():
+        previous = baseline.get("fixtures", {}).get(name)
+        if previous is None:
+            continue
+        if current["bytes_per_instance"] > previous["bytes_per_instance"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: {current['bytes_per_instance']:.0f} bytes "
+                f"> baseline {previous['bytes_per_instance']:.0f} bytes"
+            )
+    return regressions
+
+
+def _print_results(results: dict) -> None:
+    print(f"{'fixture':<42} {'bytes/instance':>15}")
+    for name, result in results["fixtures"].items():
+        print(f"{name:<42} {result['bytes_per_instance']:>15.0f}")
+    for regression in results["regressions"]:
+        print(f"REGRESSION {regression}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""Benchmark the api's HTTP server by replaying the tests/data/api fixtures.
+
+The api is served in-process, next to a stub Telegram endpoint so no request leaves the machine.
+The api's own output is silenced while the fixtures are replayed.
+Every fixture is replayed by a number of concurrent clients and its throughput and p50/p95/p99
+latencies are reported. The results are written as JSON and, when a baseline is given, compared
+against it, the exit code is 1 when a fixture regressed.
+
+The clients and the server share the interpreter, so the numbers are only meaningful relative to
+a baseline that was recorded on the same machine with the same options.
+
+Examples
+--------
+python scripts/python_scripts/benchmark_server.py --output baseline.json
+python scripts/python_scripts/benchmark_server.py --baseline baseline.json --output current.json
+"""
+import json
+import os
+import platform
+import re
+import socket
+import statistics
+import sys
+import time
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from string import Template
+from threading import Thread
+from typing import Any
+
+ROOT_DIR = Path(__file__).parent.parent.parent
+FIXTURES_DIR = ROOT_DIR / "tests" / "data" / "api"
+HOST = "localhost"
+BENCHMARK_ENVIRON = {
+    "CHAT_ID": "123456789",
+    "DOMAIN_NAME": "ida.example.com",
+    "WEBHOOK_TOKEN": "benchmark-token",
+    "BOT_ROUTE": "/bot-benchmark-route",
+    "HOST": HOST,
+    "PORT": "0",
+    "ENDPOINT": "http://localhost/",
+}
+
+
+class StubTelegramHandler(BaseHTTPRequestHandler):
+    """Answer every request like a successful Telegram bot API call."""
+
+    def do_GET(self) -> None:  # noqa: N802 (the name is defined by BaseHTTPRequestHandler)
+        """Answer a GET request."""
+        self._answer()
+
+    def do_POST(self) -> None:  # noqa: N802 (the name is defined by BaseHTTPRequestHandler)
+        """Read the body of a POST request, then answer it."""
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self._answer()
+
+    def log_message(self, *_) -> None:
+        """Do not log the requests, it would only slow the benchmark down."""
+
+    def _answer(self) -> None:
+        body = json.dumps({"ok": True, "result": {"message_id": 1}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main() -> None:
+    """Run the benchmark, write the results and compare them with the baseline."""
+    args = _parse_args()
+    for key, value in BENCHMARK_ENVIRON.items():
+        os.environ.setdefault(key, value)
+
+    stub = ThreadingHTTPServer((HOST, 0), StubTelegramHandler)
+    Thread(target=stub.serve_forever, daemon=True).start()
+    address = (HOST, _serve_api(args.engine, f"http://{HOST}:{stub.server_port}/"))
+
+    fixtures = _load_fixtures(args.fixtures, args.keep_alive)
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        measurements = {
+            name: _benchmark_fixture(address, fixture, args) for name, fixture in fixtures.items()
+        }
+    results: dict[str, Any] = {
+        "environment": {
+            "engine": args.engine,
+            "clients": args.clients,
+            "requests": args.requests,
+            "keep_alive": args.keep_alive,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+        },
+        "fixtures": measurements,
+    }
+    stub.shutdown()
+
+    regressions = []
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = _compare(baseline, results, args.tolerance)
+    results["regressions"] = regressions
+
+    _print_results(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    if regressions:
+        sys.exit(1)
+
+
+def _parse_args() -> Namespace:
+    parser = ArgumentParser("benchmark_server", description=__doc__.splitlines()[0])
+    parser.add_argument("--engine", choices=("single", "thread", "asyncio"), default="thread")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent clients, default 8")
+    parser.add_argument(
+        "--requests", type=int, default=1000, help="requests per fixture, default 1000"
+    )
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests per fixture")
+    parser.add_argument(
+        "--keep-alive",
+        action="store_true",
+        help="reuse the client connections instead of replaying `Connection: close`",
+    )
+    parser.add_argument(
+        "--fixtures", nargs="*", help="names of the fixtures to replay, by default all of them"
+    )
+    parser.add_argument("--output", type=Path, help="write the results as JSON to this file")
+    parser.add_argument("--baseline", type=Path, help="compare with the results in this file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="the fraction a metric may be worse than the baseline, default 0.2",
+    )
+    return parser.parse_args()
+
+
+def _serve_api(engine: str, endpoint: str) -> int:
+    """Serve the api on a free port in a background thread and return the port."""
+    from ida_py.api.main import app
+    from ida_py.bot import main as bot_main
+
+    bot_main.BOT_CONFIG.endpoint = endpoint
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        port = sock.getsockname()[1]
+    Thread(target=app.serve, args=(HOST, port), kwargs={"concurrency": engine}, daemon=True).start()
+    for _ in range(50):
+        try:
+            socket.create_connection((HOST, port)).close()
+            return port
+        except ConnectionRefusedError:
+            time.sleep(0.1)
+    raise RuntimeError(f"The api did not start listening on port {port}.")
+
+
+def _load_fixtures(names: list[str] | None, keep_alive: bool) -> dict[str, dict[str, Any]]:
+    """Load the requests to replay, templated and with a Content-Length that matches the body."""
+    fixtures = {}
+    for directory in sorted(FIXTURES_DIR.iterdir()):
+        if names and directory.name not in names:
+            continue
+        data = (directory / "request.txt").read_text()
+        if (directory / ".template").exists():
+            data = Template(data).substitute(os.environ)
+        head, separator, body = data.partition("\n\n")
+        content_length = f"Content-Length: {len(body.encode())}"
+        head = re.sub(r"^Content-Length: \d+$", content_length, head, flags=re.M | re.I)
+        if keep_alive:
+            head = re.sub(r"^Connection: close$", "Connection: keep-alive", head, flags=re.M)
+        expected = (directory / "response.txt").read_text()
+        last_message_id = directory / "last_message_id"
+        fixtures[directory.name] = {
+            "request": (head + separator + body).encode(),
+            "status": expected.split(maxsplit=2)[1],
+            "last_message_id": last_message_id if last_message_id.exists() else None,
+        }
+    return fixtures
+
+
+def _benchmark_fixture(
+    address: tuple[str, int], fixture: dict[str, Any], args: Namespace
+) -> dict[str, Any]:
+    """Replay the fixture with `args.clients` concurrent clients and summarize the latencies."""
+    from ida_py.bot import main as bot_main
+
+    if fixture["last_message_id"] is not None:
+        bot_main.LAST_MESSAGE_ID = fixture["last_message_id"]
+
+    def replay(count: int) -> tuple[list[float], int]:
+        client = _Client(address)
+        latencies, errors = [], 0
+        try:
+            for _ in range(count):
+                start = time.perf_counter()
+                try:
+                    status = client.request(fixture["request"])
+                except OSError:
+                    status = None
+                latencies.append(time.perf_counter() - start)
+                errors += status != fixture["status"]
+        finally:
+            client.close()
+        return latencies, errors
+
+    replay(args.warmup)
+    shares = [len(range(i, args.requests, args.clients)) for i in range(args.clients)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.clients) as executor:
+        outcomes = list(executor.map(replay, shares))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for client_latencies, _ in outcomes for latency in client_latencies]
+    cut_points = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors for _, errors in outcomes),
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": cut_points[49] * 1000,
+        "p95_ms": cut_points[94] * 1000,
+        "p99_ms": cut_points[98] * 1000,
+    }
+
+
+class _Client:
+    """A client that sends raw requests, it reconnects whenever the server closed the connection."""
+
+    def __init__(self, address: tuple[str, int]) -> None:
+        self.address = address
+        self.sock: socket.socket | None = None
+        self.buffer = b""
+
+    def request(self, data: bytes) -> str:
+        """Send the request and read its response, the status code is returned."""
+        if self.sock is None:
+            self.sock = socket.create_connection(self.address, timeout=10)
+            self.buffer = b""
+        self.sock.sendall(data)
+        head = self._read_until_head()
+        content_length = re.search(rb"^Content-Length: (\d+)\r?$", head, flags=re.M | re.I)
+        self._read_exactly(int(content_length.group(1)) if content_length else 0)
+        if re.search(rb"^Connection: close\r?$", head, flags=re.M | re.I):
+            self.close()
+        return head.split(maxsplit=2)[1].decode()
+
+    def close(self) -> None:
+        """Close the connection, if any."""
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def _read_until_head(self) -> bytes:
+        while (match := re.search(rb"\r?\n\r?\n", self.buffer)) is None:
+            self._receive()
+        head, self.buffer = self.buffer[: match.start()], self.buffer[match.end() :]
+        return head
+
+    def _read_exactly(self, size: int) -> bytes:
+        while len(self.buffer) < size:
+            self._receive()
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def _receive(self) -> None:
+        assert self.sock is not None
+        chunk = self.sock.recv(65536)
+        if not chunk:
+            raise ConnectionResetError("The server closed the connection.")
+        self.buffer += chunk
+
+
+def _compare(baseline: dict, results: dict, tolerance: float) -> list[str]:
+    """Describe every fixture whose throughput or latency is worse than the baseline allows.
+
+    The p99 latency is too noisy on short runs to be compared, it is only reported.
+    """
+    regressions = []
+    for name, current in results["fixtures"].items():
+        previous = baseline.get("fixtures", {}).get(name)
+        if previous is None:
+            continue
+        if current["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {current['throughput']:.0f}/s "
+                f"< baseline {previous['throughput']:.0f}/s"
+            )
+        for metric in ("p50_ms", "p95_ms"):
+            if current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: {metric} {current[metric]:.2f} > baseline {previous[metric]:.2f}"
+                )
+    return regressions
+
+
+def _print_results(results: dict) -> None:
+    print(f"{'fixture':<34} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, result in results["fixtures"].items():
+        print(
+            f"{name:<34} {result['throughput']:>9.0f} {result['p50_ms']:>8.2f} "
+            f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['errors']:>7}"
+        )
+    for regression in results["regressions"]:
+        print(f"REGRESSION {regression}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""Benchmark the transformer's decoders on representative payloads.
+
+Every payload is decoded repeatedly, offline. The throughput (objects/s, the best of a number of
+rounds) is reported, as well as the allocations per object traced by tracemalloc: the bytes a
+decoded object holds and the peak of the temporary allocations while decoding it. The payloads
+are the post_bot_200 update (from a dictionary and from JSON), a deeply nested synthetic model,
+a model with union-heavy fields, a list of nested models and two error paths.
+
+With --profile, the decoders are generated with TRANSFORMER_PROFILE enabled and the time spent
+per field and per kind of converter is reported per payload. Profiling slows the decoders down,
+so only compare the throughput of runs with the same setting.
+
+The results are written as JSON and, when a baseline is given, compared against it, the exit code
+is 1 when a payload regressed.
+
+Examples
+--------
+python scripts/python_scripts/benchmark_transformer.py --output baseline.json
+python scripts/python_scripts/benchmark_transformer.py --baseline baseline.json --output new.json
+python scripts/python_scripts/benchmark_transformer.py --profile --payloads unions
+"""
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser, Namespace
+from dataclasses import dataclass, field
+from pathlib import Path
+from string import Template
+from typing import Any, Callable
+
+ROOT_DIR = Path(__file__).parent.parent.parent
+UPDATE_REQUEST = ROOT_DIR / "tests" / "data" / "api" / "post_bot_200" / "request.txt"
+NESTED_DEPTH = 20
+BENCHMARK_ENVIRON = {
+    "CHAT_ID": "123456789",
+    "DOMAIN_NAME": "ida.example.com",
+    "WEBHOOK_TOKEN": "benchmark-token",
+    "BOT_ROUTE": "/bot-benchmark-route",
+    "HOST": "localhost",
+    "PORT": "0",
+    "ENDPOINT": "http://localhost/",
+}
+
+
+@dataclass
+class Level:
+    depth: int
+    name: str
+    child: "Level | None" = None
+
+
+@dataclass
+class Unions:
+    identifier: int | str
+    amount: float | int | None
+    label: str | None
+    tags: list[int | str] | None
+    scores: dict[str, float | None]
+    nested: Level | str | None = None
+    flag: bool | int = False
+
+
+@dataclass
+class Batch:
+    levels: list[Level] = field(default_factory=list)
+
+
+def main() -> None:
+    """Run the benchmark, write the results and compare them with the baseline."""
+    args = _parse_args()
+    for key, value in BENCHMARK_ENVIRON.items():
+        os.environ.setdefault(key, value)
+    if args.profile:
+        os.environ["TRANSFORMER_PROFILE"] = "1"
+
+    from ida_py.transformer.profiling import PROFILE
+
+    payloads = _payloads()
+    measurements = {}
+    for name, decode in payloads.items():
+        if args.payloads and name not in args.payloads:
+            continue
+        PROFILE.reset()
+        measurements[name] = _measure(decode, args.number, args.rounds)
+        if args.profile:
+            measurements[name]["profile"] = PROFILE.to_dict()
+
+    results: dict[str, Any] = {
+        "environment": {
+            "number": args.number,
+            "rounds": args.rounds,
+            "profile": args.profile,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+        },
+        "payloads": measurements,
+    }
+
+    regressions = []
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = _compare(baseline, results, args.tolerance)
+    results["regressions"] = regressions
+
+    _print_results(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    if regressions:
+        sys.exit(1)
+
+
+def _parse_args() -> Namespace:
+    parser = ArgumentParser("benchmark_transformer", description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000, help="decodes per round, default 2000")
+    parser.add_argument("--rounds", type=int, default=5, help="rounds per payload, default 5")
+    parser.add_argument(
+        "--payloads", nargs="*", help="names of the payloads to decode, by default all of them"
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="report the time per field and per converter"
+    )
+    parser.add_argument("--output", type=Path, help="write the results as JSON to this file")
+    parser.add_argument("--baseline", type=Path, help="compare with the results in this file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="the fraction a metric may be worse than the baseline, default 0.2",
+    )
+    return parser.parse_args()
+
+
+def _payloads() -> dict[str, Callable[[], Any]]:
+    """Get a function per payload that decodes it once."""
+    from ida_py import bot, transformer
+
+    data = UPDATE_REQUEST.read_text().partition("\n\n")[2]
+    update_json = Template(data).substitute(os.environ).encode()
+    update = json.loads(update_json)
+
+    nested: dict[str, Any] | None = None
+    for depth in range(NESTED_DEPTH, 0, -1):
+        nested = {"depth": depth, "name": f"level {depth}", "child": nested}
+    assert nested is not None
+
+    unions = {
+        "identifier": "abc",
+        "amount": 12,
+        "label": None,
+        "tags": [1, "two", 3, "four"],
+        "scores": {"a": 1.5, "b": None, "c": 2.0},
+        "nested": {"depth": 1, "name": "level 1"},
+        "flag": 1,
+    }
+    batch = {"levels": [{"depth": index, "name": f"level {index}"} for index in range(50)]}
+
+    def decode_error(obj: type, values: dict) -> Callable[[], Any]:
+        def decode() -> Any:
+            try:
+                return transformer.from_dict(obj, values)
+            except transformer.ValidationError as exc:
+                return exc
+
+        return decode
+
+    return {
+        "post_bot_200": lambda: transformer.from_dict(bot.TelegramUpdate, update),
+        "post_bot_200_json": lambda: transformer.from_json(bot.TelegramUpdate, update_json),
+        "nested": lambda: transformer.from_dict(Level, nested),
+        "unions": lambda: transformer.from_dict(Unions, unions),
+        "list": lambda: transformer.from_dict(Batch, batch),
+        "error_unknown_key": decode_error(Level, {"depth": 1, "name": "a", "unknown": 1}),
+        "error_invalid_value": decode_error(Unions, {**unions, "tags": [[1]]}),
+    }
+
+
+def _measure(decode: Callable[[], Any], number: int, rounds: int) -> dict[str, Any]:
+    """Get the best throughput of the rounds and the allocations per object."""
+    decode()  # Build the decode plan outside of the measurements
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            decode()
+        best = min(best, time.perf_counter() - start)
+
+    objects: list[Any] = [None] * number
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        decode()
+        _, peak = tracemalloc.get_traced_memory()
+        for index in range(number):
+            objects[index] = decode()
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "objects_per_second": number / best,
+        "retained_bytes": (after - before) / number,
+        "peak_bytes": peak - before,
+    }
+
+
+def _compare(baseline: dict, results: dict, tolerance: float) -> list[str]:
+    """Describe every payload whose throughput or retained memory is worse than allowed."""
+    regressions: list[str] = []
+    if baseline.get("environment", {}).get("profile") != results["environment"]["profile"]:
+        print("Not compared to the baseline, it was (not) profiled unlike this run.")
+        return regressions
+    for name, current in results["payloads"].items():
+        previous = baseline.get("payloads", {}).get(name)
+        if previous is None:
+            continue
+        if current["objects_per_second"] < previous["objects_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {current['objects_per_second']:.0f} objects/s "
+                f"< baseline {previous['objects_per_second']:.0f} objects/s"
+            )
+        if current["retained_bytes"] > previous["retained_bytes"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: {current['retained_bytes']:.0f} retained bytes "
+                f"> baseline {previous['retained_bytes']:.0f} bytes"
+            )
+    return regressions
+
+
+def _print_results(results: dict) -> None:
+    print(f"{'payload':<22} {'objects/s':>11} {'retained B':>11} {'peak B':>9}")
+    for name, result in results["payloads"].items():
+        print(
+            f"{name:<22} {result['objects_per_second']:>11.0f} "
+            f"{result['retained_bytes']:>11.0f} {result['peak_bytes']:>9}"
+        )
+        for kind in ("fields", "converters"):
+            for key, timing in result.get("profile", {}).get(kind, {}).items():
+                print(f"    {key:<40} {timing['calls']:>9} calls {timing['mean_ns']:>9.0f} ns")
+    for regression in results["regressions"]:
+        print(f"REGRESSION {regression}")
+
+
+if __name__ == "__main__":
+    main()
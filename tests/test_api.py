@@ -1,6 +1,8 @@
 """Ida's HTTP API tests."""
 import os
+import re
 import socket
+import time
 from pathlib import Path
 from threading import Thread
 
@@ -9,11 +11,13 @@
 
 from ida_py.api import run
 from ida_py.api.config import api_config
+from ida_py.api.main import app
 from ida_py.errors import ConfigurationError
 
 ROOT_DIR = Path(__file__).parent / "data" / "api"
 
 HOST, PORT = "localhost", 9999
+ASYNC_PORT = 9998
 
 
 @pytest.fixture(scope="session")
@@ -32,6 +36,16 @@ def _server(session_mocker: MockerFixture):
     _connect_or_retry()
 
 
+@pytest.fixture(scope="session")
+def _async_server():
+    """Serve the api with the asyncio engine in a separate thread, see `_server`."""
+    serve_thread = Thread(
+        target=app.serve, args=(HOST, ASYNC_PORT), kwargs={"concurrency": "asyncio"}, daemon=True
+    )
+    serve_thread.start()
+    _connect_or_retry(port=ASYNC_PORT)
+
+
 @pytest.mark.parametrize(
     "dirname",
     [
@@ -45,8 +59,9 @@ def _server(session_mocker: MockerFixture):
         "post_bot_400_bot_executionerror",
     ],
 )
-@pytest.mark.usefixtures("_server")
-def test_request(dirname: str, mocker: MockerFixture):
+@pytest.mark.parametrize("port", [PORT, ASYNC_PORT])
+@pytest.mark.usefixtures("_server", "_async_server")
+def test_request(dirname: str, port: int, mocker: MockerFixture):
     """Test a request.
 
     dirname MUST contain at least request.txt and response.txt
@@ -54,14 +69,17 @@ def test_request(dirname: str, mocker: MockerFixture):
     dirname CAN contain an empty .template file, which will cause the test to template the request
     file. A templated variable should be an existing environment variable enclosed in ${}.
     For example: the content ${DUMMY} in request.txt would be extrapolated to the value of
-    os.environ["DUMMY"]. A KeyError is not caught.
+    os.environ["DUMMY"]. A KeyError is not caught. The Content-Length header of a templated request
+    is updated to match its templated body.
 
-    The `_server` fixture is used.
+    The `_server` and `_async_server` fixtures are used, every request is sent to both engines.
 
     Parameters
     ----------
     dirname : str
         The name of the directory containing the files for the test.
+    port : int
+        The port of the server (and thus the engine) to send the request to.
     mocker : MockerFixture
         Mocker fixture provided by pytest-mock.
     """
@@ -75,10 +93,11 @@ def test_request(dirname: str, mocker: MockerFixture):
     dot_template = ROOT_DIR / dirname / ".template"
     if dot_template.exists():
         data = _template_data(data)
+        data = _update_content_length(data)
 
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
         # Connect to server and send data
-        sock.connect((HOST, PORT))
+        sock.connect((HOST, port))
         data_bytes = data.encode()
         sock.sendall(data_bytes)
 
@@ -101,7 +120,7 @@ def test_misconfiguration(mocker: MockerFixture):
         api_config()
 
 
-def _connect_or_retry(max_retries=5, _n=0):
+def _connect_or_retry(max_retries=5, port=PORT, _n=0):
     """Try to connect or retry for the given max_retries.
 
     This method is used to avoid a cold start issue where the client is making requests while the
@@ -111,17 +130,20 @@ def _connect_or_retry(max_retries=5, _n=0):
     ----------
     max_retries : int, optional
         Maximum number of retries to perform, by default 5
+    port : int, optional
+        The port to connect to, by default PORT
     _n : int, optional
         Internal variable used to keep count of how many times the function ran, by default 0
     """
     try:
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
             # Connect to server
-            sock.connect((HOST, PORT))
+            sock.connect((HOST, port))
     except Exception:
         _n += 1
         if _n < max_retries:
-            _connect_or_retry(max_retries, _n)
+            time.sleep(0.1)
+            _connect_or_retry(max_retries, port, _n)
 
 
 def _template_data(data: str):
@@ -146,3 +168,22 @@ def _template_data(data: str):
         start = template_end
         data = data.replace(replace_str, new_str)
     return data
+
+
+def _update_content_length(data: str) -> str:
+    """Set the Content-Length header of the request in `data` to the length of its body.
+
+    Parameters
+    ----------
+    data : str
+        The request to update.
+
+    Returns
+    -------
+    str
+        A copy of the request with a Content-Length that matches the body.
+    """
+    head, separator, body = data.partition("\n\n")
+    content_length = f"Content-Length: {len(body.encode())}"
+    head = re.sub(r"^Content-Length: \d+$", content_length, head, flags=re.MULTILINE | re.I)
+    return head + separator + body
@@ -6,9 +6,15 @@
 import pytest
 from pytest_mock import MockerFixture
 
-from ida_py import bot, transformer
+from ida_py import bot, transformer, urlrequest
 from ida_py.bot.config import bot_config
-from ida_py.bot.main import BOT_CONFIG, _register, send_message, set_webhook
+from ida_py.bot.main import (
+    BOT_CONFIG,
+    _register,
+    download_file,
+    send_message,
+    set_webhook,
+)
 from ida_py.bot.models import Command
 from ida_py.errors import ConfigurationError
 from ida_py.urlrequest import Response
@@ -33,6 +39,7 @@ def test_misconfiguration(mocker: MockerFixture):
     [
         "invalid_chat_id",
         "invalid_command",
+        "invalid_command_photo",
         "invalid_message_id",
         "invalid_token",
         "invalid_update_no_message",
@@ -97,3 +104,30 @@ def test_send_message(mocker: MockerFixture):
     expected_json_return_value = {"ok": True, "result": {"message_id": 100}}
     result = send_message("dummy")
     assert result == expected_json_return_value
+    assert post_patched.call_args.kwargs["rate_limit_key"] == str(BOT_CONFIG.chat_id)
+
+    response_body = b'{"ok": false, "error_code": 429, "parameters": {"retry_after": 600}}'
+    post_patched.return_value = Response(response_body, status_code=429)
+    with pytest.raises(bot.ExecutionError, match="Could not send the message."):
+        send_message("dummy")
+
+
+def test_download_file(mocker: MockerFixture, tmp_path: Path):
+    """Test that a file is looked up with getFile and downloaded from Telegram's file endpoint."""
+    post_patched = mocker.patch("ida_py.bot.main.urlrequest.post")
+    download_patched = mocker.patch("ida_py.bot.main.urlrequest.download")
+    response_body = b'{"ok": true, "result": {"file_id": "a", "file_unique_id": "b", '
+    response_body += b'"file_size": 3, "file_path": "photos/file_0.jpg"}}'
+    post_patched.return_value = Response(response_body, content_type="application/json")
+    download_file("a", tmp_path / "receipt.jpg")
+    url = download_patched.call_args.args[0]
+    assert url.startswith(BOT_CONFIG.endpoint.replace("/bot", "/file/bot", 1))
+    assert url.endswith("/photos/file_0.jpg")
+
+    download_patched.side_effect = urlrequest.ResponseTooLargeError("Dummy Reason")
+    with pytest.raises(bot.ExecutionError, match="Could not download the file. Dummy Reason"):
+        download_file("a", tmp_path / "receipt.jpg")
+
+    post_patched.return_value = Response(b'{"ok": false}', status_code=400)
+    with pytest.raises(bot.ExecutionError, match="Could not get the file."):
+        download_file("a", tmp_path / "receipt.jpg")
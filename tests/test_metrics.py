@@ -0,0 +1,43 @@
+"""Ida's metrics tests."""
+from ida_py.metrics import Registry
+
+
+def test_counter_and_gauge():
+    """Test that counters and gauges keep a value per set of labels."""
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests.", ("route",))
+    requests.inc(route="ping")
+    requests.inc(2, route="ping")
+    requests.inc(route="bot")
+    in_flight = registry.gauge("in_flight", "In flight.")
+    in_flight.inc()
+    in_flight.dec()
+
+    assert requests.value(route="ping") == 3
+    assert registry.counter("requests_total", "Registered twice.", ("route",)) is requests
+    assert registry.render() == (
+        "# HELP requests_total Requests.\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{route="ping"} 3\n'
+        'requests_total{route="bot"} 1\n'
+        "# HELP in_flight In flight.\n"
+        "# TYPE in_flight gauge\n"
+        "in_flight 0\n"
+    )
+
+
+def test_histogram():
+    """Test that a histogram renders cumulative buckets, its count and its sum."""
+    registry = Registry()
+    duration = registry.histogram("duration", "Duration.", ("route",), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2):
+        duration.observe(value, route='a"b')
+
+    assert duration.count(route='a"b') == 4
+    assert registry.render().splitlines()[2:] == [
+        'duration_bucket{route="a\\"b",le="0.1"} 2',
+        'duration_bucket{route="a\\"b",le="1"} 3',
+        'duration_bucket{route="a\\"b",le="+Inf"} 4',
+        'duration_count{route="a\\"b"} 4',
+        'duration_sum{route="a\\"b"} 2.65',
+    ]
@@ -1,23 +1,91 @@
 """Ida's HTTP server tests."""
+import asyncio
+import gzip
+import io
+import json
 import os
+import re
+import signal
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Barrier, Thread
 
 import pytest
 from pytest_mock import MockerFixture
 
+from ida_py.bot.models import Chat
 from ida_py.errors import ConfigurationError
+from ida_py.server import metrics
+from ida_py.server.aio import AsyncApplicationServer
+from ida_py.server.capture import REDACTED, Capture
 from ida_py.server.config import ServerConfig, server_config
-from ida_py.server.main import Application, TCPHandler
-from ida_py.server.models import Response
-from ida_py.server.utils import _build_body_str
+from ida_py.server.errors import ApiException
+from ida_py.server.main import (
+    Application,
+    ApplicationServer,
+    TCPHandler,
+    ThreadPoolApplicationServer,
+    server_capture,
+)
+from ida_py.server.models import JSONResponse, Request, Response
+from ida_py.server.routing import Router
+from ida_py.server.supervisor import Supervisor, _serve_backlog
+from ida_py.server.utils import (
+    RequestReader,
+    _build_body,
+    build_response,
+    parse_request,
+    send_response,
+    wants_keep_alive,
+)
 
 
-def test_write_to_file(mocker: MockerFixture):
-    """Test that we can write to a file from the TCPHandler."""
-    mocker.patch("ida_py.server.main.SERVER_CONFIG", ServerConfig(write_to_file=1))
-    patched_write = mocker.patch("ida_py.server.main.Path.write_text")
-    mocker.patch("ida_py.server.main.Path.mkdir")
-    TCPHandler._write_to_file("foo", "test.txt")
-    assert patched_write.call_args[0][0] == "foo"
+def test_write_to_file(mocker: MockerFixture, tmp_path: Path):
+    """Test that WRITE_TO_FILE enables the capture in the configured directory."""
+    mocker.patch("ida_py.server.main.SERVER_CONFIG", ServerConfig(write_to_file=0))
+    assert server_capture() is None
+
+    server_config = ServerConfig(write_to_file=1, capture_directory=str(tmp_path))
+    mocker.patch("ida_py.server.main.SERVER_CONFIG", server_config)
+    capture = server_capture()
+    assert capture is not None
+    assert capture.directory == tmp_path
+
+
+def test_capture(tmp_path: Path):
+    """Test that exchanges are written to rotated segments, with the secret token redacted."""
+    capture = Capture(tmp_path, segment_size=1, max_segments=2)
+    for index in range(3):
+        headers = {"X-TELEGRAM-BOT-API-SECRET-TOKEN": "secret", "HOST": "ida"}
+        request = Request("POST", headers, f"/bot/{index}", body='{"update_id": 1}')
+        capture.record(request, JSONResponse({"ok": True}))
+    capture.close()
+
+    segments = sorted(tmp_path.glob("*.jsonl.gz"))
+    assert len(segments) == 2
+    records = [json.loads(line) for segment in segments for line in gzip.open(segment, "rt")]
+    assert [record["request"]["path"] for record in records] == ["/bot/1", "/bot/2"]
+    assert records[0]["request"]["headers"] == {
+        "X-TELEGRAM-BOT-API-SECRET-TOKEN": REDACTED,
+        "HOST": "ida",
+    }
+    assert records[0]["response"]["body"] == {"ok": True}
+
+
+def test_capture_sampling_and_drops(mocker: MockerFixture, tmp_path: Path):
+    """Test that unsampled exchanges are skipped and exchanges are dropped on a full queue."""
+    request = Request("GET", {}, "/ping")
+    unsampled_capture = Capture(tmp_path, sample_rate=0)
+    unsampled_capture.record(request, Response("pong"))
+    assert unsampled_capture.queue.empty()
+
+    mocker.patch.object(Capture, "_start")  # Nothing drains the queue
+    full_capture = Capture(tmp_path, queue_size=1)
+    full_capture.record(request, Response("pong"))
+    full_capture.record(request, Response("pong"))
+    assert full_capture.dropped == 1
 
 
 def test_misconfiguration(mocker: MockerFixture):
@@ -26,9 +94,205 @@ def test_misconfiguration(mocker: MockerFixture):
     with pytest.raises(ConfigurationError):
         server_config()
 
+    mocker.patch.dict(os.environ, {"SERVER_CONCURRENCY": "fibers"}, clear=True)
+    with pytest.raises(ConfigurationError):
+        server_config()
+
+    mocker.patch.dict(os.environ, {"SERVER_MAX_WORKERS": "many"}, clear=True)
+    with pytest.raises(ConfigurationError):
+        server_config()
+
     mocker.patch.dict(os.environ, {"DUMMY": ""}, clear=True)  # KeyError
     cfg = server_config()
-    assert cfg.write_to_file == ServerConfig.__dataclass_fields__["write_to_file"].default
+    assert cfg == ServerConfig()
+
+
+def test_thread_pool_server():
+    """Test that the ThreadPoolApplicationServer handles requests concurrently.
+
+    Every request waits on a barrier that only opens once all requests are being handled, which
+    would time out (and return a 500) if the requests were handled one at a time.
+    """
+    concurrent_requests = 4
+    barrier = Barrier(concurrent_requests, timeout=5)
+
+    def wait_for_others(_: Request) -> JSONResponse:
+        barrier.wait()
+        return JSONResponse({"ok": True})
+
+    routes = [(re.compile("/wait$"), wait_for_others)]
+    with ThreadPoolApplicationServer(
+        ("localhost", 0), TCPHandler, routes=routes, max_workers=concurrent_requests
+    ) as server:
+        Thread(target=server.serve_forever, daemon=True).start()
+        with ThreadPoolExecutor(concurrent_requests) as executor:
+            futures = [
+                executor.submit(_send, server.server_address, b"GET /wait HTTP/1.0\r\n\r\n")
+                for _ in range(concurrent_requests)
+            ]
+            responses = [future.result() for future in futures]
+        server.shutdown()
+
+    assert all(response.startswith(b"HTTP/1.1 200") for response in responses)
+
+
+def test_thread_pool_server_async_route():
+    """Test that async routes on the ThreadPoolApplicationServer reuse the loop of their thread."""
+    loops = []
+
+    async def async_route(_: Request) -> JSONResponse:
+        loops.append(asyncio.get_running_loop())
+        return JSONResponse({"engine": "thread"})
+
+    routes = [(re.compile("/async$"), async_route)]
+    with ThreadPoolApplicationServer(
+        ("localhost", 0), TCPHandler, routes=routes, max_workers=1
+    ) as server:
+        Thread(target=server.serve_forever, daemon=True).start()
+        responses = [_send(server.server_address, b"GET /async HTTP/1.0\r\n\r\n") for _ in "ab"]
+        server.shutdown()
+
+    assert all(response.endswith(b'{"engine": "thread"}') for response in responses)
+    assert len(loops) == 2 and loops[0] is loops[1]
+
+
+def test_metrics():
+    """Test that handled requests are counted per route and rendered by the metrics endpoint."""
+
+    def counted(_: Request) -> JSONResponse:
+        return JSONResponse({"ok": True})
+
+    routes = [(re.compile("/counted$"), counted)]
+    before = metrics.REQUESTS.value(route="counted", status="200")
+    unmatched = metrics.REQUESTS.value(route=metrics.UNMATCHED_ROUTE, status="404")
+    with ThreadPoolApplicationServer(("localhost", 0), TCPHandler, routes=routes) as server:
+        Thread(target=server.serve_forever, daemon=True).start()
+        _send(server.server_address, b"GET /counted HTTP/1.0\r\n\r\n")
+        _send(server.server_address, b"GET /missing HTTP/1.0\r\n\r\n")
+        server.shutdown()
+
+    assert metrics.REQUESTS.value(route="counted", status="200") == before + 1
+    assert metrics.REQUESTS.value(route=metrics.UNMATCHED_ROUTE, status="404") == unmatched + 1
+    assert metrics.REQUEST_DURATION.count(route="counted", status="200") >= 1
+    assert metrics.IN_FLIGHT.value() == 0
+    response = metrics.metrics_endpoint(Request("GET", {}, "/metrics"))
+    assert response.content_type.startswith("text/plain")
+    assert 'ida_server_requests_total{route="counted",status="200"}' in response.body
+
+
+def test_supervisor():
+    """Test that the supervisor restarts crashed workers, restarts on SIGHUP and drains on SIGTERM.
+
+    The supervisor runs in a forked process, so its signal handlers do not affect the tests.
+    """
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        address = sock.getsockname()
+
+    def get_pid(_: Request) -> Response:
+        return Response(str(os.getpid()))
+
+    def crash(_: Request) -> Response:
+        os._exit(1)
+
+    def slow(_: Request) -> Response:
+        time.sleep(1)
+        return Response("done")
+
+    routes = [(re.compile("/pid$"), get_pid), (re.compile("/crash$"), crash)]
+    routes.append((re.compile("/slow$"), slow))
+
+    def create_server() -> ThreadPoolApplicationServer:
+        return ThreadPoolApplicationServer(address, TCPHandler, routes=routes, reuse_port=True)
+
+    supervisor_pid = os.fork()
+    if supervisor_pid == 0:  # pragma: no cover (runs in the forked supervisor)
+        try:
+            Supervisor(create_server, 1, drain_timeout=5).run()
+        finally:
+            os._exit(0)
+
+    def get_worker_pid() -> bytes:
+        return _connect_or_retry(address, b"GET /pid HTTP/1.0\r\n\r\n").rsplit(b"\n", 1)[-1]
+
+    try:
+        first_pid = get_worker_pid()
+        assert _send(address, b"GET /crash HTTP/1.0\r\n\r\n") == b""
+        restarted_pid = get_worker_pid()
+        os.kill(supervisor_pid, signal.SIGHUP)
+        time.sleep(0.5)
+        rolled_pid = get_worker_pid()
+        with ThreadPoolExecutor(1) as executor:
+            slow_response = executor.submit(_send, address, b"GET /slow HTTP/1.0\r\n\r\n")
+            time.sleep(0.3)
+            os.kill(supervisor_pid, signal.SIGTERM)
+            assert slow_response.result().endswith(b"done")
+        _, status = os.waitpid(supervisor_pid, 0)
+    except BaseException:
+        os.kill(supervisor_pid, signal.SIGKILL)
+        os.waitpid(supervisor_pid, 0)
+        raise
+
+    assert os.waitstatus_to_exitcode(status) == 0
+
+    assert len({first_pid, restarted_pid, rolled_pid}) == 3
+    with pytest.raises(ConnectionRefusedError):
+        _send(address, b"GET /pid HTTP/1.0\r\n\r\n")
+
+
+def test_supervisor_refill(mocker: MockerFixture):
+    """Test that workers that failed to start are retried with a backoff until all are running."""
+    now = mocker.patch("ida_py.server.supervisor.time.monotonic", return_value=100.0)
+    supervisor = Supervisor(lambda: None, 3)  # type: ignore[arg-type, return-value]
+    pids = iter([1, None, 2, None, 3])
+
+    def spawn() -> int | None:
+        pid = next(pids)
+        if pid is not None:
+            supervisor.workers[pid] = now.return_value
+        return pid
+
+    mocker.patch.object(supervisor, "_spawn", side_effect=spawn)
+    supervisor._refill()
+    assert list(supervisor.workers) == [1]
+    supervisor._refill()  # Too soon after the failure
+    assert list(supervisor.workers) == [1]
+
+    now.return_value = 101.0
+    supervisor._refill()
+    assert list(supervisor.workers) == [1, 2]
+    now.return_value = 102.5  # The backoff doubled to 2 seconds
+    supervisor._refill()
+    assert list(supervisor.workers) == [1, 2]
+    now.return_value = 103.0
+    supervisor._refill()
+    assert list(supervisor.workers) == [1, 2, 3]
+
+    now.return_value = 104.0
+    supervisor._refill()
+    assert supervisor._respawn_delay == 1.0
+
+
+def test_serve_backlog():
+    """Test that a draining server answers the connections still in its backlog before closing."""
+
+    def ping(_: Request) -> JSONResponse:
+        return JSONResponse({"ok": True})
+
+    routes = [(re.compile("/ping$"), ping)]
+    with ThreadPoolApplicationServer(("localhost", 0), TCPHandler, routes=routes) as server:
+        server.draining = True
+        clients = [socket.create_connection(server.server_address, 5) for _ in range(3)]
+        for client in clients:
+            client.sendall(b"GET /ping HTTP/1.1\r\n\r\n")
+        _serve_backlog(server)
+    responses = []
+    for client in clients:
+        with client:
+            responses.append(client.recv(4096))
+
+    assert all(response.startswith(b"HTTP/1.1 200") for response in responses)
+    assert all(b"Connection: close" in response for response in responses)
 
 
 def test_shutdown():
@@ -37,8 +301,303 @@ def test_shutdown():
         Application.shutdown()
 
 
-def test_build_body_str():
-    """Ensure that the response.body is returned if it's a string."""
+def test_build_body():
+    """Ensure that the response.body is encoded if it's a string and kept if it's bytes-like."""
     dummy = "dummy"
     response = Response(dummy)
-    assert _build_body_str(response) == dummy
+    assert _build_body(response) == dummy.encode()
+    view = memoryview(b"dummy")
+    assert _build_body(Response(view)) is view
+
+
+def test_build_response():
+    """Ensure that the Content-Length is the length of the encoded body."""
+    response = build_response(JSONResponse({"name": "Sönny"}, headers={"X-Dummy": "1"}))
+    assert response == (
+        b"HTTP/1.1 200\n"
+        b"Content-Type: application/json; charset=utf-8\n"
+        b"Content-Length: 22\n"
+        b"Connection: close\n"
+        b"X-Dummy: 1\n"
+        b"\n"
+        b'{"name": "S\\u00f6nny"}'
+    )
+    body = {"ok": True, "result": Chat(1, "private")}
+    assert build_response(JSONResponse(body)).endswith(
+        b'{"ok": true, "result": {"id": 1, "type": "private", "first_name": null, '
+        b'"last_name": null, "username": null}}'
+    )
+    assert build_response(Response("€")).endswith(
+        b"Content-Length: 3\n\n\xe2\x82\xac".replace(b"\n\n", b"\nConnection: close\n\n")
+    )
+
+
+@pytest.mark.parametrize("file_type", ["regular", "bytesio"])
+def test_send_response_file(file_type: str, tmp_path):
+    """Test that file bodies are streamed after the head with the correct Content-Length."""
+    content = b"0123456789" * 10_000
+    if file_type == "regular":
+        filepath = tmp_path / "invoice.pdf"
+        filepath.write_bytes(content)
+        body = filepath.open("rb")
+    else:
+        body = io.BytesIO(content)
+    body.read(10)  # Only the remainder of the file is sent
+
+    def send_and_close(tcp_socket: socket.socket) -> None:
+        with tcp_socket:
+            send_response(tcp_socket, Response(body, content_type="application/pdf"))
+
+    sending_socket, receiving_socket = socket.socketpair()
+    Thread(target=send_and_close, args=(sending_socket,)).start()
+    with receiving_socket:
+        received = b""
+        while chunk := receiving_socket.recv(65536):
+            received += chunk
+
+    assert f"Content-Length: {len(content) - 10}\n".encode() in received
+    assert received.endswith(b"\n\n" + content[10:])
+    assert body.closed
+
+
+def test_async_server():
+    """Test that the AsyncApplicationServer runs async routes on the loop and others in a thread.
+
+    The async route only answers once the sync route started, which would deadlock if the sync
+    route blocked the event loop.
+    """
+
+    async def serve_and_send() -> list[bytes]:
+        sync_route_started = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        async def async_route(_: Request) -> JSONResponse:
+            await asyncio.wait_for(sync_route_started.wait(), timeout=5)
+            return JSONResponse({"engine": "async"})
+
+        def sync_route(_: Request) -> JSONResponse:
+            loop.call_soon_threadsafe(sync_route_started.set)
+            return JSONResponse({"engine": "sync"})
+
+        routes = [(re.compile("/async$"), async_route), (re.compile("/sync$"), sync_route)]
+        aio_server = AsyncApplicationServer(routes, max_in_flight=2)
+        server = await aio_server.start("localhost", 0)
+        address = server.sockets[0].getsockname()
+        async with server:
+            return await asyncio.gather(
+                asyncio.to_thread(_send, address, b"GET /async HTTP/1.0\r\n\r\n"),
+                asyncio.to_thread(_send, address, b"GET /sync HTTP/1.0\r\n\r\n"),
+            )
+
+    async_response, sync_response = asyncio.run(serve_and_send())
+    assert async_response.endswith(b'{"engine": "async"}')
+    assert sync_response.endswith(b'{"engine": "sync"}')
+
+
+def test_keep_alive_pipelining():
+    """Test that pipelined requests on a persistent connection are answered in order."""
+
+    def echo_path(request: Request) -> JSONResponse:
+        return JSONResponse({"path": request.path})
+
+    routes = [(re.compile("/.*"), echo_path)]
+    requests = (
+        b"GET /first HTTP/1.1\r\nHost: ida\r\n\r\n"
+        b"POST /second HTTP/1.1\r\nContent-Length: 2\r\n\r\n{}"
+        b"GET /third HTTP/1.1\r\nConnection: close\r\n\r\n"
+        b"GET /never HTTP/1.1\r\n\r\n"
+    )
+    with ThreadPoolApplicationServer(("localhost", 0), TCPHandler, routes=routes) as server:
+        Thread(target=server.serve_forever, daemon=True).start()
+        received = _send(server.server_address, requests)
+        server.shutdown()
+
+    assert received.count(b"Connection: keep-alive") == 2
+    assert received.count(b"Connection: close") == 1
+    paths = re.findall(rb'"path": "(/\w+)"', received)
+    assert paths == [b"/first", b"/second", b"/third"]
+
+
+def test_idle_keep_alive_connection():
+    """Test that idle kept-alive connections hold no thread, so they do not delay new ones."""
+
+    def ping(_: Request) -> JSONResponse:
+        return JSONResponse({"ok": True})
+
+    routes = [(re.compile("/ping$"), ping)]
+    with ThreadPoolApplicationServer(
+        ("localhost", 0), TCPHandler, routes=routes, max_workers=2
+    ) as server:
+        Thread(target=server.serve_forever, daemon=True).start()
+        idle_sockets = [socket.create_connection(server.server_address, 5) for _ in range(2)]
+        for idle_socket in idle_sockets:
+            idle_socket.sendall(b"GET /ping HTTP/1.1\r\n\r\n")
+            assert b"Connection: keep-alive" in idle_socket.recv(4096)
+
+        start = time.perf_counter()
+        response = _send(server.server_address, b"GET /ping HTTP/1.0\r\n\r\n")
+        duration = time.perf_counter() - start
+        idle_sockets[0].sendall(b"GET /ping HTTP/1.1\r\nConnection: close\r\n\r\n")
+        reused_response = idle_sockets[0].recv(4096)
+        for idle_socket in idle_sockets:
+            idle_socket.close()
+        server.shutdown()
+
+    assert response.startswith(b"HTTP/1.1 200")
+    assert duration < 1  # Waiting for an idle connection would take SERVER_KEEP_ALIVE_TIMEOUT
+    assert reused_response.startswith(b"HTTP/1.1 200")
+
+
+def test_single_server_closes_connections():
+    """Test that the single threaded server closes connections, keeping one would block it."""
+
+    def ping(_: Request) -> JSONResponse:
+        return JSONResponse({"ok": True})
+
+    routes = [(re.compile("/ping$"), ping)]
+    with ApplicationServer(("localhost", 0), TCPHandler, routes=routes) as server:
+        Thread(target=server.serve_forever, daemon=True).start()
+        response = _send(server.server_address, b"GET /ping HTTP/1.1\r\n\r\n")
+        server.shutdown()
+
+    assert b"Connection: close" in response
+
+
+@pytest.mark.parametrize(
+    ("version", "connection", "expected"),
+    [
+        ("HTTP/1.1", None, True),
+        ("HTTP/1.1", "close", False),
+        ("HTTP/1.1", "Upgrade, Close", False),
+        ("HTTP/1.0", None, False),
+        ("HTTP/1.0", "Keep-Alive", True),
+    ],
+)
+def test_wants_keep_alive(version: str, connection: str | None, expected: bool):
+    """Test that the Connection header and the HTTP version decide on keeping the connection."""
+    headers = {"CONNECTION": connection} if connection else {}
+    request = Request("GET", headers, "/", version=version)
+    assert wants_keep_alive(request) is expected
+
+
+def test_request_reader():
+    """Test that the RequestReader handles requests split over, or sharing, several segments."""
+    body = '{"text": "' + "x" * 5000 + '"}'
+    data = (
+        f"POST /bot?a=1 HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n{body}"
+        "POST /chunked HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+        "5;ext=1\r\nhello\r\n7\r\n, world\r\n0\r\nTrailer: 1\r\n\r\n"
+        "GET /lf HTTP/1.0\nHost: ida\n\n"
+    ).encode()
+    reader = RequestReader(max_header_size=1024, max_body_size=10_000)
+    requests = []
+    for index in range(0, len(data), 7):  # Feed the data in tiny segments
+        reader.feed(data[index : index + 7])
+        while (request := reader.next_request()) is not None:
+            requests.append(request)
+
+    assert [request.path for request in requests] == ["/bot", "/chunked", "/lf"]
+    assert requests[0].body == body
+    assert requests[0].query_params == {"a": ["1"]}
+    assert requests[1].body == "hello, world"
+    assert requests[2].version == "HTTP/1.0"
+    assert requests[2].headers == {"HOST": "ida"}
+
+
+@pytest.mark.parametrize(
+    ("data", "status_code"),
+    [
+        (b"POST / HTTP/1.1\r\nContent-Length: 101\r\n\r\n", 413),
+        (b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n65\r\n", 413),
+        (b"GET / HTTP/1.1\r\nX-Big: " + b"x" * 200, 431),
+        (b"POST / HTTP/1.1\r\nContent-Length: -1\r\n\r\n", 400),
+        (b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\n", 400),
+        (b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n-1\r\n", 400),
+        (b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n+5\r\n", 400),
+        (b"GARBLE\r\n\r\n", 400),
+        (b"GET / HTTP/1.1\r\nNo colon\r\n\r\n", 400),
+    ],
+)
+def test_request_reader_error(data: bytes, status_code: int):
+    """Test that the RequestReader rejects malformed or oversized requests early."""
+    reader = RequestReader(max_header_size=128, max_body_size=100)
+    reader.feed(data)
+    with pytest.raises(ApiException) as exc_info:
+        reader.next_request()
+    assert exc_info.value.status_code == status_code
+
+
+def test_parse_request():
+    """Test that parse_request considers everything after the headers to be the body."""
+    request = parse_request("POST /bot HTTP/1.1\nHost: ida\n\nfoo\nbar")
+    assert request.body == "foo\nbar"
+    with pytest.raises(ApiException):
+        parse_request(b"GET / HTTP/1.1\r\n")
+
+
+def test_router():
+    """Test that the Router resolves literal and pattern routes by-occurrence."""
+
+    def route_function(name: str):
+        return lambda request: name
+
+    routes = []
+    router = Router(routes)
+    for path in ["/ping", "/invoices/(?P<invoice_id>[0-9]+)", "/a-b", "/(?P<name>.*)", "/late"]:
+        routes.append((re.compile(path + "$"), route_function(path)))
+
+    function, path_params = router.resolve("/ping")
+    assert function(None) == "/ping"
+    assert path_params == {}
+    function, path_params = router.resolve("/invoices/42")
+    assert function(None) == "/invoices/(?P<invoice_id>[0-9]+)"
+    assert path_params == {"invoice_id": "42"}
+    function, _ = router.resolve("/a-b")
+    assert function(None) == "/a-b"
+    function, path_params = router.resolve("/late")
+    assert function(None) == "/(?P<name>.*)"  # The wildcard hides the routes defined after it
+    assert path_params == {"name": "late"}
+
+    routes.insert(0, (re.compile("/late$"), route_function("/early")))
+    function, _ = router.resolve("/late")
+    assert function(None) == "/early"
+
+    with pytest.raises(ApiException):
+        Router(routes[:3]).resolve("/unknown")
+
+
+def test_router_separate_routes():
+    """Test that routes which can not be merged into one expression are matched on their own."""
+    paths = ["/ping", "(?i)/Hello", r"/x/([0-9]+)/\1", "/(?P<name>[a-z]+)", "/(?P<rest>.*)"]
+    router = Router([(re.compile(path + "$"), lambda request, path=path: path) for path in paths])
+    router.routes.insert(1, (re.compile("/upper/[a-z]+$", re.IGNORECASE), lambda request: "/up"))
+
+    assert router.resolve("/ping")[0](None) == "/ping"
+    assert router.resolve("/UPPER/Case")[0](None) == "/up"
+    assert router.resolve("/HELLO")[0](None) == "(?i)/Hello"
+    assert router.resolve("/hello")[0](None) == "(?i)/Hello"  # Precedes the "/<name>" route
+    assert router.resolve("/x/7/7")[0](None) == r"/x/([0-9]+)/\1"
+    function, path_params = router.resolve("/x/7/8")
+    assert function(None) == "/(?P<rest>.*)"
+    assert path_params == {"rest": "x/7/8"}
+    assert router.resolve("/other")[1] == {"name": "other"}
+
+
+def _connect_or_retry(address: tuple[str, int], data: bytes, max_retries: int = 20) -> bytes:
+    """Send `data` like `_send`, retrying while the server is still (re)starting."""
+    for _ in range(max_retries):
+        try:
+            return _send(address, data)
+        except ConnectionError:
+            time.sleep(0.1)
+    return _send(address, data)
+
+
+def _send(address: tuple[str, int], data: bytes) -> bytes:
+    """Send `data` to the server at `address` and return everything it answers."""
+    with socket.create_connection(address, timeout=10) as sock:
+        sock.sendall(data)
+        chunks = []
+        while chunk := sock.recv(4096):
+            chunks.append(chunk)
+    return b"".join(chunks)
@@ -1,11 +1,22 @@
 """Ida's transformer tests."""
+import os
 from dataclasses import dataclass, field
-from typing import Optional, Union
+from datetime import datetime, timezone
+from decimal import Decimal
+from enum import Enum
+from typing import ClassVar, Literal, Optional, Union
 
 import pytest
+from pytest_mock import MockerFixture
 
 from ida_py import transformer
-from ida_py.transformer.main import _get_allowed_types, _none_allowed
+from ida_py.bot.models import PhotoSize, TelegramUpdate
+from ida_py.errors import ConfigurationError
+from ida_py.transformer.backends import get_loads
+from ida_py.transformer.config import transformer_config
+from ida_py.transformer.containers import LazyList
+from ida_py.transformer.plans import _get_allowed_types, _none_allowed, get_plan
+from ida_py.transformer.profiling import PROFILE
 
 MY_OPTIONAL_TYPE = str | int | None
 
@@ -32,7 +43,7 @@ class TypeTest:
     optional_not_none: int | str = 0
     optional_none: Optional[Union[int, str]] = None
     optional_custom_type: MY_OPTIONAL_TYPE = None
-    container_type: list = field(default_factory=list)  # Recursive is not supported!
+    container_type: list = field(default_factory=list)
     none_type: None = None
 
 
@@ -85,3 +96,346 @@ def test_unexpected_type() -> None:
         _none_allowed("dummy")
     with pytest.raises(transformer.ValidationError, match="Unexpected type"):
         _get_allowed_types("dummy")
+
+
+@dataclass
+class Node:
+    value: int
+    next_: "Node | None" = field(default=None, metadata={"alias": "next"})
+    unsupported: "set[int]" = field(default_factory=set)
+
+
+def test_get_plan() -> None:
+    """Test that plans are cached per dataclass and built again after clearing the cache."""
+    plan = get_plan(TypeTest)
+    assert get_plan(TypeTest) is plan
+    assert plan.fields[0].nested is get_plan(RecursiveDataclassTest)
+
+    transformer.clear_cache()
+    assert get_plan(TypeTest) is not plan
+
+
+def test_from_dict_recursive_alias() -> None:
+    """Test that a dataclass referring to itself shares its plan and that aliases are used."""
+    node_plan = get_plan(Node)
+    assert node_plan.fields[1].nested is node_plan
+
+    node = transformer.from_dict(Node, {"value": "1", "next": {"value": 2, "next": None}})
+    assert node == Node(1, Node(2))
+
+    with pytest.raises(transformer.ValidationError, match="is invalid for the field 'next'"):
+        transformer.from_dict(Node, {"value": 1, "next": 2})
+    with pytest.raises(transformer.ValidationError, match="Unexpected type"):
+        transformer.from_dict(Node, {"value": 1, "unsupported": [1]})
+
+
+def test_compile_decoder(mocker: MockerFixture, capsys: pytest.CaptureFixture) -> None:
+    """Test that a decoder is generated per dataclass and its source is dumped in debug mode."""
+    mocker.patch("ida_py.transformer.codegen.TRANSFORMER_CONFIG.debug", True)
+    transformer.clear_cache()
+    plan = get_plan(TypeTest)
+
+    assert plan.decode is not None
+    assert plan.source.startswith("def decode_TypeTest(values):")
+    assert "for " not in plan.source
+    assert plan.fields[0].nested.source in capsys.readouterr().out
+    assert plan.decode(
+        {"required_recursive": {"foo": 1}, "required_not_none": "", "required_none": 1}
+    )
+
+
+def test_profile(mocker: MockerFixture) -> None:
+    """Test that profiled decoders record the calls per field and per kind of converter."""
+    mocker.patch("ida_py.transformer.codegen.TRANSFORMER_CONFIG.profile", True)
+    transformer.clear_cache()
+    PROFILE.reset()
+    try:
+        values = {"required_recursive": {"foo": "1"}, "required_not_none": "", "required_none": 1}
+        transformer.from_dict(TypeTest, values)
+        transformer.from_dict(TypeTest, values)
+    finally:
+        transformer.clear_cache()
+
+    profile = PROFILE.to_dict()
+    assert profile["fields"]["TypeTest.required_recursive"]["calls"] == 2
+    assert profile["fields"]["RecursiveDataclassTest.foo"]["calls"] == 2
+    assert profile["converters"]["nested"]["calls"] == 2
+    # All fields but required_recursive, as well as RecursiveDataclassTest.foo
+    assert profile["converters"]["type_check"]["calls"] == 2 * 9
+    assert profile["fields"]["TypeTest.required_recursive"]["mean_ns"] > 0
+
+
+def test_misconfiguration(mocker: MockerFixture) -> None:
+    """Test that the correct error is thrown when TRANSFORMER_DEBUG is not a boolean."""
+    mocker.patch.dict(os.environ, {"TRANSFORMER_DEBUG": "dummy"})
+    with pytest.raises(ConfigurationError):
+        transformer_config()
+    mocker.patch.dict(os.environ, {"TRANSFORMER_DEBUG": "0", "TRANSFORMER_JSON_BACKEND": "ujson"})
+    with pytest.raises(ConfigurationError, match="TRANSFORMER_JSON_BACKEND"):
+        transformer_config()
+
+
+@dataclass
+class ContainerTest:
+    nodes: list[Node]
+    pairs: dict[str, tuple[int, str]] = field(default_factory=dict)
+    scores: tuple[float, ...] = ()
+    mixed: list[int | list[int] | None] = field(default_factory=list)
+    optional: list[RecursiveDataclassTest] | None = None
+    lazy: list[RecursiveDataclassTest] = field(default_factory=list, metadata={"lazy": True})
+
+
+def test_from_dict_containers() -> None:
+    """Test that lists, tuples and dicts are converted item by item."""
+    container = transformer.from_dict(
+        ContainerTest,
+        {
+            "nodes": [{"value": 1}, {"value": "2", "next": {"value": 3}}],
+            "pairs": {"a": [1, "b"]},
+            "scores": ["1.5", 2],
+            "mixed": ["1", [2, "3"], None],
+            "optional": None,
+        },
+    )
+    assert container == ContainerTest(
+        nodes=[Node(1), Node(2, Node(3))],
+        pairs={"a": (1, "b")},
+        scores=(1.5, 2.0),
+        mixed=[1, [2, 3], None],
+    )
+
+
+@pytest.mark.parametrize(
+    ("input_", "match_str"),
+    [
+        ({"nodes": {"value": 1}}, "'{'value': 1}' is invalid for the field 'nodes' on"),
+        ({"nodes": [1]}, "'1' is invalid for the field 'nodes\\[\\]' on ContainerTest"),
+        ({"nodes": [], "pairs": {"a": [1]}}, "'\\[1\\]' is invalid for the field 'pairs{}' on"),
+        ({"nodes": [], "pairs": {"a": ["b", "c"]}}, "'b' is invalid for the field 'pairs{}\\[\\]'"),
+        ({"nodes": [], "mixed": [{}]}, "is invalid for the field 'mixed\\[\\]'"),
+    ],
+)
+def test_from_dict_containers_error_flow(input_: dict, match_str: str) -> None:
+    """Test that invalid items raise a ValidationError that shows where the item was found."""
+    with pytest.raises(transformer.ValidationError, match=match_str):
+        transformer.from_dict(ContainerTest, input_)
+
+
+def test_from_dict_lazy() -> None:
+    """Test that the items of a lazy list are only converted when they are accessed."""
+    container = transformer.from_dict(ContainerTest, {"nodes": [], "lazy": [{"foo": "1"}, None]})
+
+    assert isinstance(container.lazy, LazyList)
+    assert len(container.lazy) == 2
+    assert container.lazy[0] == RecursiveDataclassTest(1)
+    assert container.lazy[:1] == [RecursiveDataclassTest(1)]
+    with pytest.raises(transformer.ValidationError, match="'None' is invalid for the field 'lazy"):
+        container.lazy[1]
+
+
+@dataclass(frozen=True, slots=True)
+class CompactTest:
+    version: ClassVar[int] = 1
+    value: int
+    from_: str | None = field(default=None, metadata={"alias": "from"})
+    computed: int = field(init=False, default=0)
+
+
+def test_compact_dataclass() -> None:
+    """Test that frozen and slotted dataclasses are supported, without their non-init fields."""
+    compact = transformer.from_dict(CompactTest, {"value": "1", "from": "ida"})
+    assert compact == CompactTest(1, "ida")
+    assert transformer.to_dict(compact) == {"value": 1, "from": "ida"}
+    for key in ("version", "computed"):
+        with pytest.raises(transformer.ValidationError, match=f"'{key}' is an invalid field"):
+            transformer.from_dict(CompactTest, {"value": 1, key: 1})
+
+
+class Color(Enum):
+    RED = "red"
+    BLUE = 1
+
+
+@dataclass
+class CoercionTest:
+    color: Color
+    created: datetime
+    amount: Decimal
+    kind: Literal["a", 1]
+    optional_amount: Decimal | None = None
+    colors: list[Color] = field(default_factory=list)
+
+
+def test_coercions() -> None:
+    """Test that enums, datetimes, decimals and literals are converted and encoded back."""
+    values = {
+        "color": "red",
+        "created": 1660000000,
+        "amount": "1.10",
+        "kind": 1,
+        "optional_amount": 2,
+        "colors": [1, "red"],
+    }
+    coercion_test = transformer.from_dict(CoercionTest, values)
+    assert coercion_test == CoercionTest(
+        color=Color.RED,
+        created=datetime(2022, 8, 8, 23, 6, 40, tzinfo=timezone.utc),
+        amount=Decimal("1.10"),
+        kind=1,
+        optional_amount=Decimal(2),
+        colors=[Color.BLUE, Color.RED],
+    )
+    assert transformer.to_dict(coercion_test) == {**values, "optional_amount": "2"}
+    assert transformer.to_json(coercion_test.created) == b"1660000000"
+
+    values = {**values, "created": "2022-08-08T23:06:40+00:00", "color": Color.RED}
+    assert transformer.from_dict(CoercionTest, values) == coercion_test
+
+
+@pytest.mark.parametrize(
+    ("key", "value"),
+    [
+        ("color", "green"),
+        ("color", [1]),
+        ("created", "yesterday"),
+        ("created", 1e20),
+        ("created", True),
+        ("amount", 1.1),
+        ("amount", "NaN"),
+        ("amount", "abc"),
+        ("kind", True),
+        ("kind", [1]),
+        ("optional_amount", "abc"),
+        ("colors", ["green"]),
+    ],
+)
+def test_coercions_error_flow(key: str, value: object) -> None:
+    """Test that values that can not be converted are reported as a ValidationError."""
+    values = {"color": "red", "created": 0, "amount": "1", "kind": "a", key: value}
+    with pytest.raises(transformer.ValidationError, match=f"is invalid for the field '{key}"):
+        transformer.from_dict(CoercionTest, values)
+
+
+def test_register_coercion() -> None:
+    """Test that a coercion registered for a custom type is used once the plans are rebuilt."""
+
+    class Cents(int):
+        pass
+
+    @dataclass
+    class Price:
+        cents: Cents
+
+    transformer.register_coercion(Cents, lambda cls: lambda value: cls(round(value * 100)), float)
+    transformer.clear_cache()
+    price = transformer.from_dict(Price, {"cents": 1.5})
+    assert price == Price(Cents(150))
+    assert isinstance(price.cents, Cents)
+    assert transformer.to_json(price) == b'{"cents": 150.0}'
+
+
+@pytest.mark.parametrize("json_backend", ["json", "orjson"])
+def test_from_json(mocker: MockerFixture, json_backend: str) -> None:
+    """Test that JSON bytes and strings are decoded, with errors for invalid or non-object JSON."""
+    mocker.patch("ida_py.transformer.backends.loads", get_loads(json_backend))
+    data = '{"value": 1, "next": {"value": "2"}}'
+    assert transformer.from_json(Node, data) == Node(1, Node(2))
+    assert transformer.from_json(Node, data.encode()) == Node(1, Node(2))
+
+    with pytest.raises(transformer.ValidationError, match="Invalid JSON."):
+        transformer.from_json(Node, b'{"value": 1')
+    with pytest.raises(transformer.ValidationError, match="Unsupported JSON."):
+        transformer.from_json(Node, b"[1]")
+    with pytest.raises(transformer.ValidationError, match="'extra' is an invalid field"):
+        transformer.from_json(Node, b'{"value": 1, "extra": {"big": [1, 2, 3]}}')
+
+
+@pytest.mark.parametrize("processes", [None, 2])
+def test_from_dicts(processes: int | None) -> None:
+    """Test that a batch yields instances in order and errors in place of invalid items.
+
+    Instances with lazy fields are sent back from the pool processes too, their items converted.
+    """
+    values_iterable = ({"foo": i} if i % 3 else {"bar": i} for i in range(10))
+    results = list(
+        transformer.from_dicts(RecursiveDataclassTest, values_iterable, processes, chunk_size=3)
+    )
+
+    assert len(results) == 10
+    for i, result in enumerate(results):
+        if i % 3:
+            assert result == RecursiveDataclassTest(i)
+        else:
+            assert isinstance(result, transformer.ValidationError)
+            assert "'bar' is an invalid field" in str(result)
+
+    message = {"message_id": 1, "date": 1657653210, "chat": {"id": 1, "type": "private"}}
+    photo_size = {"file_id": "a", "file_unique_id": "b", "width": 90, "height": 67}
+    updates = [
+        {"update_id": 1, "message": {**message, "photo": [photo_size]}},
+        {"update_id": 2, "message": {**message, "photo": [{"file_id": "a"}]}},
+    ]
+    valid, invalid = transformer.from_dicts(TelegramUpdate, updates, processes)
+
+    assert valid.message.photo == [PhotoSize("a", "b", 90, 67)]
+    if processes:
+        # Sending the instance back converts its lazy fields, the invalid size fails its own item
+        assert isinstance(invalid, transformer.ValidationError)
+    else:
+        with pytest.raises(transformer.ValidationError):
+            invalid.message.photo[0]
+
+
+def test_from_dicts_not_a_dict() -> None:
+    """Test that an item which is not a dictionary is reported as a ValidationError."""
+    (result,) = transformer.from_dicts(RecursiveDataclassTest, [[1]])
+    assert isinstance(result, transformer.ValidationError)
+    assert "expected a dict" in str(result)
+
+
+def test_to_dict() -> None:
+    """Test that to_dict is the inverse of from_dict, with aliases and None fields skipped."""
+    values = {
+        "nodes": [{"value": 1, "next": {"value": 2, "next": None}}],
+        "pairs": {"a": [1, "b"]},
+        "lazy": [{"foo": 3}],
+    }
+    container = transformer.from_dict(ContainerTest, values)
+
+    encoded = transformer.to_dict(container)
+    assert encoded["nodes"] == [
+        {"value": 1, "next": {"value": 2, "next": None, "unsupported": set()}, "unsupported": set()}
+    ]
+    assert encoded["pairs"] == {"a": [1, "b"]}
+    assert encoded["lazy"] == [{"foo": 3}]
+    assert encoded["optional"] is None
+
+    encoded = transformer.to_dict(container, skip_none=True)
+    assert "optional" not in encoded
+    assert encoded["nodes"][0]["next"] == {"value": 2, "unsupported": set()}
+
+    type_test = TypeTest(RecursiveDataclassTest(1), "a", None)
+    encoded = transformer.to_dict(type_test, skip_none=True)
+    assert encoded == {
+        "required_recursive": {"foo": 1},
+        "required_not_none": "a",
+        "required_none": None,
+        "optional_another": 0,
+        "optional_not_none": 0,
+        "container_type": [],
+    }
+    assert transformer.from_dict(TypeTest, encoded) == type_test
+
+
+def test_to_json() -> None:
+    """Test that dataclasses are encoded wherever they occur in the value."""
+    type_test = TypeTest(RecursiveDataclassTest(1), "a", None, container_type=[(1, 2)])
+    assert transformer.to_json(type_test, skip_none=True) == (
+        b'{"required_recursive": {"foo": 1}, "required_not_none": "a", "required_none": null, '
+        b'"optional_another": 0, "optional_not_none": 0, "container_type": [[1, 2]]}'
+    )
+    assert transformer.to_json({"ok": True, "result": [RecursiveDataclassTest(1)]}) == (
+        b'{"ok": true, "result": [{"foo": 1}]}'
+    )
+    with pytest.raises(TypeError, match="Object of type set is not JSON serializable"):
+        transformer.to_json(Node(1))
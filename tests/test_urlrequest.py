@@ -1,61 +1,125 @@
 """Ida's request tests."""
+import asyncio
+import hashlib
 import json
-from http.client import HTTPMessage
-from urllib.error import HTTPError, URLError
+import socket
+import time
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Thread
+from unittest.mock import AsyncMock
 from urllib.parse import urlencode
-from urllib.request import Request
 
 import pytest
 from pytest_mock import MockerFixture
 
 from ida_py import urlrequest
+from ida_py.bot.models import SetWebhook
+from ida_py.urlrequest.aio import AsyncConnectionPool
+from ida_py.urlrequest.cache import ResponseCache
+from ida_py.urlrequest.limits import (
+    CircuitBreaker,
+    RateLimiter,
+    RequestPolicy,
+    TokenBucket,
+)
+from ida_py.urlrequest.models import StreamingResponse
+from ida_py.urlrequest.pool import ConnectionPool
+
+
+@pytest.fixture(autouse=True)
+def policy(mocker: MockerFixture) -> RequestPolicy:
+    """Give every test a policy of its own, so rate limits and failures do not carry over."""
+    policy = RequestPolicy()
+    mocker.patch("ida_py.urlrequest.main.POLICY", policy)
+    mocker.patch("ida_py.urlrequest.aio.POLICY", policy)
+    return policy
+
+
+@pytest.fixture()
+def sleeps(mocker: MockerFixture) -> list[float]:
+    """Record the delays of the sync and async clients instead of waiting for them."""
+    delays: list[float] = []
+
+    async def sleep(delay: float) -> None:
+        delays.append(delay)
+
+    mocker.patch("ida_py.urlrequest.main.time.sleep", side_effect=delays.append)
+    mocker.patch("ida_py.urlrequest.aio.asyncio.sleep", side_effect=sleep)
+    return delays
 
 
 def test_post_json(mocker: MockerFixture):
     """Test a POST request whilst providing the `json` argument."""
-    urlopen_patch = mocker.patch("ida_py.urlrequest.main.urlopen")
+    request_patch = mocker.patch("ida_py.urlrequest.main.POOL.request")
     data = {"hello": "world"}
     url = "https://httpbin.org/post"
     urlrequest.post(url, json=data)
-    urlopen_request: Request = urlopen_patch.call_args[0][0]
-    assert urlopen_request.method == "POST"
-    assert urlopen_request.full_url == url
-    assert urlopen_request.headers["Content-type"] == "application/json"
-    assert urlopen_request.data == json.dumps(data).encode()
+    method, request_url, headers = request_patch.call_args.args
+    assert method == "POST"
+    assert request_url == url
+    assert headers["Content-Type"] == "application/json"
+    assert request_patch.call_args.kwargs["data"] == json.dumps(data).encode()
+
+
+def test_post_dataclass(mocker: MockerFixture):
+    """Test that a dataclass passed as `json` is encoded without its None defaults."""
+    request_patch = mocker.patch("ida_py.urlrequest.main.POOL.request")
+    urlrequest.post("https://httpbin.org/post", json=SetWebhook(url="https://ida.example.com"))
+    _, _, headers = request_patch.call_args.args
+    assert headers["Content-Type"] == "application/json"
+    assert request_patch.call_args.kwargs["data"] == b'{"url": "https://ida.example.com"}'
 
 
 def test_post_form(mocker: MockerFixture):
     """Test a POST request whilst providing the `form` argument."""
-    urlopen_patch = mocker.patch("ida_py.urlrequest.main.urlopen")
+    request_patch = mocker.patch("ida_py.urlrequest.main.POOL.request")
     data = {"hello": "world"}
     url = "https://httpbin.org/post"
     urlrequest.post(url, form=data)
-    urlopen_request: Request = urlopen_patch.call_args[0][0]
-    assert urlopen_request.method == "POST"
-    assert urlopen_request.full_url == url
-    assert urlopen_request.headers["Content-type"] == "application/x-www-form-urlencoded"
-    assert urlopen_request.data == urlencode(data).encode()
+    method, request_url, headers = request_patch.call_args.args
+    assert method == "POST"
+    assert request_url == url
+    assert headers["Content-Type"] == "application/x-www-form-urlencoded"
+    assert request_patch.call_args.kwargs["data"] == urlencode(data).encode()
 
 
 def test_post_no_data(mocker: MockerFixture):
     """Test a POST request whilst providing the `form` argument."""
-    urlopen_patch = mocker.patch("ida_py.urlrequest.main.urlopen")
+    request_patch = mocker.patch("ida_py.urlrequest.main.POOL.request")
     url = "https://httpbin.org/post"
     urlrequest.post(url)
-    urlopen_request: Request = urlopen_patch.call_args[0][0]
-    assert urlopen_request.method == "POST"
-    assert urlopen_request.full_url == url
-    assert urlopen_request.data is None
+    method, request_url, _ = request_patch.call_args.args
+    assert method == "POST"
+    assert request_url == url
+    assert request_patch.call_args.kwargs["data"] is None
 
 
 def test_get(mocker: MockerFixture):
     """Test a GET request."""
-    urlopen_patch = mocker.patch("ida_py.urlrequest.main.urlopen")
+    request_patch = mocker.patch("ida_py.urlrequest.main.POOL.request")
     url = "https://httpbin.org/get"
     urlrequest.get(url)
-    urlopen_request: Request = urlopen_patch.call_args[0][0]
-    assert urlopen_request.method == "GET"
-    assert urlopen_request.full_url == url
+    method, request_url, _ = request_patch.call_args.args
+    assert method == "GET"
+    assert request_url == url
+
+
+def test_request_duration(mocker: MockerFixture):
+    """Test that requests are timed per Bot API method, without the path leading up to it."""
+    request_patch = mocker.patch("ida_py.urlrequest.main.POOL.request")
+    request_patch.return_value = urlrequest.Response(b"", status_code=200)
+    labels = {"host": "api.telegram.org", "endpoint": "getMe", "status": "200"}
+    before = urlrequest.utils.REQUEST_DURATION.count(**labels)
+    urlrequest.get("https://api.telegram.org/botsecret/getMe")
+    assert urlrequest.utils.REQUEST_DURATION.count(**labels) == before + 1
+
+    labels = {"host": "api.telegram.org", "endpoint": "other", "status": "200"}
+    before = urlrequest.utils.REQUEST_DURATION.count(**labels)
+    urlrequest.get("https://api.telegram.org/file/botsecret/photos/file_1.jpg")
+    urlrequest.get("https://api.telegram.org/file/botsecret/photos/file_2.jpg")
+    assert urlrequest.utils.REQUEST_DURATION.count(**labels) == before + 2
 
 
 def test_response_json():
@@ -68,18 +132,469 @@ def test_response_json():
         urlrequest.Response(body=body).json()
 
 
-def test_failing_request_urlerror(mocker: MockerFixture):
-    """Test that an URLError is converted to a RequestError."""
-    urlopen_patch = mocker.patch("ida_py.urlrequest.main.urlopen")
-    urlopen_patch.side_effect = URLError("Dummy Reason")
+def test_failing_request(mocker: MockerFixture, sleeps: list[float]):
+    """Test that a RequestError of the pool is timed as an error, retried and raised."""
+    request_patch = mocker.patch("ida_py.urlrequest.main.POOL.request")
+    request_patch.side_effect = urlrequest.RequestError("Dummy Reason")
+    labels = {"host": "garble", "endpoint": "other", "status": "error"}
+    before = urlrequest.utils.REQUEST_DURATION.count(**labels)
     with pytest.raises(urlrequest.RequestError, match="Dummy Reason"):
         urlrequest.get("https://garble")
+    assert urlrequest.utils.REQUEST_DURATION.count(**labels) == before + 4
+    assert len(sleeps) == 3
+
+
+FILE = bytes(range(256)) * 1024
+
+
+def test_cache(mocker: MockerFixture, sleeps: list[float]):
+    """Test that cached responses are served while fresh and revalidated once stale."""
+    cache = mocker.patch("ida_py.urlrequest.main.CACHE", ResponseCache())
+    request_patch = mocker.patch("ida_py.urlrequest.main.POOL.request")
+    request_patch.return_value = urlrequest.Response(b'{"ok": true}')
+    url = "https://api.telegram.org/getMe"
+    assert urlrequest.get(url, cache=True).json() == {"ok": True}
+    assert urlrequest.get(url, cache=True).json() == {"ok": True}
+    assert request_patch.call_count == 1
+    urlrequest.get(url)  # Not cached
+    assert request_patch.call_count == 2
+
+    url = "https://httpbin.org/etag"
+    headers = {"Cache-Control": "max-age=0", "ETag": '"v1"'}
+    request_patch.return_value = urlrequest.Response(b"1", headers=headers)
+    assert urlrequest.get(url, cache=True).body == b"1"
+    request_patch.return_value = urlrequest.Response(b"", status_code=304, headers=headers)
+    assert urlrequest.get(url, cache=True).body == b"1"
+    assert request_patch.call_args.args[2]["If-None-Match"] == '"v1"'
+
+    url = "https://httpbin.org/no-store"
+    headers = {"Cache-Control": "no-store"}
+    request_patch.return_value = urlrequest.Response(b"1", headers=headers)
+    urlrequest.get(url, cache=True)
+    assert cache.lookup("GET", url) is None
+
+    request_patch.return_value = urlrequest.Response(b"", status_code=500)
+    urlrequest.get("https://httpbin.org/status/500", cache=True)
+    assert len(cache) == 2
+
+
+def test_cache_freshness(mocker: MockerFixture, tmp_path: Path):
+    """Test the freshness of entries, their eviction and that they are kept on disk."""
+    now = mocker.patch("ida_py.urlrequest.cache.time.time", return_value=1000.0)
+    cache = ResponseCache(max_entries=1, default_ttl=60, directory=tmp_path)
+    cache.store("GET", "https://a", urlrequest.Response(b"a"))
+    headers = {"Cache-Control": "public, max-age=120", "Age": "20"}
+    cache.store("GET", "https://b", urlrequest.Response(b"b", headers=headers))
+    headers = {"Expires": "Thu, 01 Jan 1970 00:20:00 GMT", "Last-Modified": "yesterday"}
+    cache.store("GET", "https://c", urlrequest.Response(b"c", headers=headers))
+    cache.store(
+        "GET", "https://d", urlrequest.Response(b"d", headers={"Cache-Control": "no-cache"})
+    )
+    assert len(cache) == 1
+    assert len(list(tmp_path.iterdir())) == 3  # d is never fresh and can not be revalidated
+
+    entries = {url: cache.lookup("GET", url) for url in ("https://a", "https://b", "https://c")}
+    assert {url: entry.expires_at for url, entry in entries.items()} == {
+        "https://a": 1060.0,
+        "https://b": 1100.0,
+        "https://c": 1200.0,
+    }
+    now.return_value = 1080.0
+    assert [entry.is_fresh() for entry in entries.values()] == [False, True, True]
+    assert entries["https://c"].validators() == {"If-Modified-Since": "yesterday"}
+
+    cache = ResponseCache(directory=tmp_path)
+    assert cache.lookup("GET", "https://b").response.body == b"b"  # type: ignore[union-attr]
+    assert cache.lookup("POST", "https://b") is None
+    cache.clear()
+    assert cache.lookup("GET", "https://a") is None
+    assert not list(tmp_path.iterdir())
+
+
+def test_map(mocker: MockerFixture):
+    """Test that requests are performed concurrently, with their results in order or not."""
+
+    def request(method: str, url: str, headers: dict, data: bytes | None, timeout: float):
+        delay = int(url.rsplit("/", 1)[-1])
+        if delay < 0:
+            raise urlrequest.RequestError("Dummy Reason")
+        time.sleep(delay / 100)
+        return urlrequest.Response(data or b"{}")
+
+    request_patch = mocker.patch("ida_py.urlrequest.main.POOL.request", side_effect=request)
+    requests = [
+        urlrequest.Request(f"https://httpbin.org/{delay}", "POST", json={"delay": delay})
+        for delay in (20, 10, -1, 0)
+    ]
+    results = list(urlrequest.map(requests, max_workers=4))
+    assert [result.index for result in results] == [0, 1, 2, 3]
+    assert results[0].response.json() == {"delay": 20}  # type: ignore[union-attr]
+    assert str(results[2].error) == "Dummy Reason" and results[2].response is None
+    assert request_patch.call_count == 4  # A POST request is not retried
+
+    results = list(urlrequest.map(requests, max_workers=4, ordered=False))
+    assert [result.index for result in results] == [2, 3, 1, 0]
+
+    requests = [urlrequest.Request("https://httpbin.org/10") for _ in range(20)]
+    start = time.perf_counter()
+    assert len(list(urlrequest.map(requests, max_workers=10))) == 20
+    assert time.perf_counter() - start < 1  # Sequentially, it would take 2 seconds
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """Echo the body of the request, the path "/close" closes the connection without notice.
+
+    The path "/chunked" answers with a chunked body and "/file" with FILE, or the range of it that
+    was requested. The path "/huge" answers with a header that exceeds the async client's limit.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:  # noqa: N802 (the name is defined by BaseHTTPRequestHandler)
+        """Answer a GET request."""
+        if self.path == "/file":
+            self._answer_file()
+            return
+        self._answer(b"{}")
+
+    def do_POST(self) -> None:  # noqa: N802 (the name is defined by BaseHTTPRequestHandler)
+        """Echo the body of a POST request."""
+        self._answer(self.rfile.read(int(self.headers["Content-Length"])))
+
+    def log_message(self, *_) -> None:
+        """Do not log the requests."""
+
+    def _answer(self, body: bytes) -> None:
+        self.server.client_ports.add(self.client_address[1])  # type: ignore[attr-defined]
+        self.send_response(404 if self.path == "/missing" else 200)
+        self.send_header("Content-Type", "application/json")
+        if self.path == "/huge":
+            self.send_header("X-Huge", "x" * 128 * 1024)
+        if self.path == "/chunked":
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.wfile.write(b"1;ext=1\r\n[\r\n2\r\n1]\r\n0\r\nX-Trailer: 1\r\n\r\n")
+            return
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.close_connection = self.path == "/close"
+
+    def _answer_file(self) -> None:
+        self.server.client_ports.add(self.client_address[1])  # type: ignore[attr-defined]
+        start = int(self.headers.get("Range", "bytes=0-")[6:-1])
+        if start >= len(FILE):
+            self.send_response(416)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(FILE) - 1}/{len(FILE)}")
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(FILE) - start))
+        self.end_headers()
+        self.wfile.write(FILE[start:])
+
+
+@pytest.fixture()
+def keep_alive_server() -> Iterator[ThreadingHTTPServer]:
+    """Serve KeepAliveHandler on a free port, the ports of its clients are kept in client_ports."""
+    server = ThreadingHTTPServer(("localhost", 0), KeepAliveHandler)
+    server.client_ports = set()  # type: ignore[attr-defined]
+    Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_pool_reuse(keep_alive_server: ThreadingHTTPServer):
+    """Test that a connection is reused for subsequent requests, whatever their status."""
+    url = f"http://localhost:{keep_alive_server.server_port}"
+    pool = ConnectionPool(pool_size=1)
+    response = pool.request("POST", url + "/echo?x=1", {}, data=b'{"hello": "world"}')
+    assert response.json() == {"hello": "world"}
+    assert response.status_code == 200
+    assert response.content_type == "application/json"
+    assert pool.request("GET", url + "/missing", {}).status_code == 404
+    assert len(keep_alive_server.client_ports) == 1  # type: ignore[attr-defined]
+    assert pool.idle_connections(url) == 1
+    pool.close()
+    assert pool.idle_connections(url) == 0
+
+
+@pytest.mark.parametrize(
+    ("pool_size", "idle_timeout"),
+    [
+        (0, 30.0),  # No connection is kept
+        (1, -1.0),  # The idle connection expired
+    ],
+)
+def test_pool_new_connection(
+    keep_alive_server: ThreadingHTTPServer, pool_size: int, idle_timeout: float
+):
+    """Test that connections are not reused beyond the pool size or idle timeout."""
+    url = f"http://localhost:{keep_alive_server.server_port}/"
+    pool = ConnectionPool(pool_size, idle_timeout)
+    pool.request("GET", url, {})
+    pool.request("GET", url, {})
+    assert len(keep_alive_server.client_ports) == 2  # type: ignore[attr-defined]
+    assert pool.idle_connections(url) == pool_size
+    pool.close()
+
+
+@pytest.mark.parametrize("detect_closed", [True, False])
+def test_pool_stale_connection(
+    keep_alive_server: ThreadingHTTPServer, mocker: MockerFixture, detect_closed: bool
+):
+    """Test that a connection closed by the server is replaced, also when only sending fails."""
+    if not detect_closed:
+        mocker.patch("ida_py.urlrequest.pool._is_closed", return_value=False)
+    url = f"http://localhost:{keep_alive_server.server_port}"
+    pool = ConnectionPool()
+    pool.request("GET", url + "/close", {})
+    time.sleep(0.1)  # Leave the server time to close the connection
+    assert pool.request("POST", url, {}, data=b"[1]").json() == [1]
+    assert len(keep_alive_server.client_ports) == 2  # type: ignore[attr-defined]
+    pool.close()
+
+
+def test_pool_request_error():
+    """Test that a connection error is raised as a RequestError."""
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        port = sock.getsockname()[1]
+    with pytest.raises(urlrequest.RequestError, match="Connection refused"):
+        ConnectionPool().request("GET", f"http://localhost:{port}/", {})
+    with pytest.raises(urlrequest.RequestError, match="Unsupported scheme: ftp"):
+        ConnectionPool().request("GET", "ftp://localhost/", {})
+
+
+def test_pool_stream(keep_alive_server: ThreadingHTTPServer):
+    """Test that a streamed body is read in chunks and its connection reused once it was read."""
+    url = f"http://localhost:{keep_alive_server.server_port}/file"
+    pool = ConnectionPool()
+    with pool.stream("GET", url, {}) as response:
+        assert response.status_code == 200
+        chunks = list(response.iter_chunks(chunk_size=100_000))
+    assert [len(chunk) for chunk in chunks] == [100_000, 100_000, 62_144]
+    assert b"".join(chunks) == FILE
+    assert pool.idle_connections(url) == 1
+
+    with pool.stream("GET", url, {}) as response:
+        assert len(next(response.iter_chunks())) == 64 * 1024
+    assert pool.idle_connections(url) == 0  # The body was not read completely
+
+    response = pool.stream("GET", url, {})
+    response.max_size = len(FILE) - 1
+    with pytest.raises(urlrequest.ResponseTooLargeError, match=f"larger than {len(FILE) - 1}"):
+        response.read()
+    pool.close()
+
+
+@pytest.fixture()
+def file_url(keep_alive_server: ThreadingHTTPServer, mocker: MockerFixture) -> str:
+    """Get the https URL of FILE, which is streamed over http from the keep-alive server."""
+    pool = ConnectionPool()
+
+    def stream(method: str, url: str, *args, **kwargs) -> StreamingResponse:
+        return pool.stream(method, url.replace("https://", "http://"), *args, **kwargs)
+
+    mocker.patch("ida_py.urlrequest.main.POOL.stream", side_effect=stream)
+    yield f"https://localhost:{keep_alive_server.server_port}/file"
+    pool.close()
+
+
+def test_download(file_url: str, tmp_path: Path):
+    """Test that a download is hashed, limited in size and resumed from its part file."""
+    path = tmp_path / "receipt.jpg"
+    part_path = tmp_path / "receipt.jpg.part"
+    sha256 = hashlib.sha256(FILE).hexdigest()
+    assert urlrequest.download(file_url, path) == urlrequest.Download(path, len(FILE), sha256)
+    assert path.read_bytes() == FILE
+    assert not part_path.exists()
+
+    part_path.write_bytes(FILE[:1000])
+    assert urlrequest.download(file_url, path).sha256 == sha256
+    assert path.read_bytes() == FILE
+
+    part_path.write_bytes(FILE + b"garble")  # Not a prefix of the file, which is downloaded anew
+    assert urlrequest.download(file_url, path).sha256 == sha256
+
+    part_path.write_bytes(FILE[:1000])
+    with pytest.raises(urlrequest.ResponseTooLargeError):
+        urlrequest.download(file_url, path, max_size=len(FILE) - 1)
+    assert not part_path.exists()
+
+
+def test_aget_apost(mocker: MockerFixture, sleeps: list[float]):
+    """Test that the async requests are performed on the async pool."""
+    request_patch = mocker.patch("ida_py.urlrequest.aio.POOL.request", new_callable=AsyncMock)
+    request_patch.return_value = urlrequest.Response(b"{}")
+    url = "https://httpbin.org/post"
+
+    assert asyncio.run(urlrequest.apost(url, json={"hello": "world"})).json() == {}
+    method, request_url, headers = request_patch.call_args.args
+    assert (method, request_url, headers["Content-Type"]) == ("POST", url, "application/json")
+    assert request_patch.call_args.kwargs["data"] == b'{"hello": "world"}'
+
+    asyncio.run(urlrequest.aget(url))
+    assert request_patch.call_args.args[:2] == ("GET", url)
+
+    request_patch.side_effect = urlrequest.RequestError("Dummy Reason")
+    with pytest.raises(urlrequest.RequestError, match="Dummy Reason"):
+        asyncio.run(urlrequest.aget(url))
+    assert len(sleeps) == 3
+
+
+def test_async_pool(keep_alive_server: ThreadingHTTPServer):
+    """Test that connections are reused and that concurrency is limited to max_concurrency."""
+    url = f"http://localhost:{keep_alive_server.server_port}"
+    pool = AsyncConnectionPool(pool_size=2, max_concurrency=2)
+
+    async def requests() -> None:
+        keep_alive_server.client_ports.clear()  # type: ignore[attr-defined]
+        response = await pool.request("POST", url + "/echo?x=1", {}, data=b'{"hello": "world"}')
+        assert response.json() == {"hello": "world"}
+        assert response.status_code == 200
+        assert response.content_type == "application/json"
+        assert (await pool.request("GET", url + "/missing", {})).status_code == 404
+        assert (await pool.request("GET", url + "/chunked", {})).json() == [1]
+        assert len(keep_alive_server.client_ports) == 1  # type: ignore[attr-defined]
+
+        responses = await asyncio.gather(*(pool.request("GET", url, {}) for _ in range(6)))
+        assert [response.body for response in responses] == [b"{}"] * 6
+        assert len(keep_alive_server.client_ports) == 2  # type: ignore[attr-defined]
+        assert pool.idle_connections(url) == 2
+        await pool.close()
+
+    asyncio.run(requests())
+    asyncio.run(requests())  # A pool can be used from consecutive event loops
+
+
+def test_async_pool_stale_connection(keep_alive_server: ThreadingHTTPServer):
+    """Test that a connection closed by the server is replaced."""
+    url = f"http://localhost:{keep_alive_server.server_port}"
+    pool = AsyncConnectionPool()
+
+    async def requests() -> None:
+        await pool.request("GET", url + "/close", {})
+        assert (await pool.request("POST", url, {}, data=b"[1]")).json() == [1]
+        await pool.close()
+
+    asyncio.run(requests())
+    assert len(keep_alive_server.client_ports) == 2  # type: ignore[attr-defined]
+
+
+def test_async_pool_request_error():
+    """Test that connection errors and timeouts are raised as a RequestError."""
+    pool = AsyncConnectionPool()
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        port = sock.getsockname()[1]
+        with pytest.raises(urlrequest.RequestError, match="Connect call failed"):
+            asyncio.run(pool.request("GET", f"http://localhost:{port}/", {}))
+        sock.listen()
+        with pytest.raises(urlrequest.RequestError, match="No response within 0.1 seconds."):
+            asyncio.run(pool.request("GET", f"http://localhost:{port}/", {}, timeout=0.1))
+    with pytest.raises(urlrequest.RequestError, match="Unsupported scheme: ftp"):
+        asyncio.run(pool.request("GET", "ftp://localhost/", {}))
+    with pytest.raises(urlrequest.RequestError, match="Invalid header: 'X-Injected'"):
+        asyncio.run(pool.request("GET", "http://localhost/", {"X-Injected": "1\r\nHost: evil"}))
+
+
+def test_async_pool_header_limit(keep_alive_server: ThreadingHTTPServer):
+    """Test that a response header which exceeds the reader's limit is raised as a RequestError."""
+    url = f"http://localhost:{keep_alive_server.server_port}"
+    with pytest.raises(urlrequest.RequestError, match="exceed the limit"):
+        asyncio.run(AsyncConnectionPool().request("GET", url + "/huge", {}))
+
+
+def test_token_bucket(mocker: MockerFixture):
+    """Test that reservations beyond the burst wait for their token, also after a pause."""
+    now = mocker.patch("ida_py.urlrequest.limits.time.monotonic", return_value=100.0)
+    bucket = TokenBucket(rate=2, burst=2)
+    assert [bucket.reserve() for _ in range(4)] == [0, 0, 0.5, 1.0]
+    now.return_value = 102.0
+    assert bucket.is_full()
+    bucket.pause(3)
+    assert bucket.reserve() == 3.0
+
+
+def test_rate_limiter(mocker: MockerFixture):
+    """Test that requests are limited per endpoint and per key, and that a rate of 0 disables it."""
+    mocker.patch("ida_py.urlrequest.limits.time.monotonic", return_value=100.0)
+    limiter = RateLimiter(endpoint_rate=30, key_rate=1)
+    assert limiter.reserve("api.telegram.org", "sendMessage", "1") == 0
+    assert limiter.reserve("api.telegram.org", "sendMessage", "1") == 1.0
+    assert limiter.reserve("api.telegram.org", "sendMessage", "2") == 0
+    limiter.pause(5, "api.telegram.org", "sendMessage", "2")
+    assert limiter.reserve("api.telegram.org", "sendMessage", "2") == 5.0
+    assert limiter.reserve("api.telegram.org", "sendMessage", "3") == 0
+
+    limiter = RateLimiter(endpoint_rate=0, key_rate=0)
+    assert [limiter.reserve("api.telegram.org", "sendMessage", "1") for _ in range(3)] == [0] * 3
+
+
+def test_retry_after(mocker: MockerFixture, sleeps: list[float]):
+    """Test that a 429 response is retried after its `retry_after`, also for a POST request."""
+    too_many_requests = urlrequest.Response(
+        b'{"ok": false, "error_code": 429, "parameters": {"retry_after": 2}}', status_code=429
+    )
+    request_patch = mocker.patch("ida_py.urlrequest.main.POOL.request")
+    request_patch.side_effect = [too_many_requests, urlrequest.Response(b"{}")]
+    response = urlrequest.post("https://api.telegram.org/sendMessage", rate_limit_key="1")
+    assert response.status_code == 200
+    assert request_patch.call_count == 2
+    assert 2 <= sleeps[0] <= 2.5
+    assert 1.0 <= sleeps[1] <= 2.0  # The paused bucket of the chat
+
+    too_many_requests.headers = {"Retry-After": "3"}
+    too_many_requests.body = b""
+    request_patch.side_effect = [too_many_requests] * 4
+    assert urlrequest.post("https://api.telegram.org/sendMessage").status_code == 429
+    assert request_patch.call_count == 6
+
+
+def test_retry_server_error(mocker: MockerFixture, sleeps: list[float]):
+    """Test that server errors are retried with a backoff for idempotent methods only."""
+    request_patch = mocker.patch("ida_py.urlrequest.main.POOL.request")
+    request_patch.side_effect = [
+        urlrequest.RequestError("Dummy Reason"),
+        urlrequest.Response(b"", status_code=503),
+        urlrequest.Response(b"{}"),
+    ]
+    assert urlrequest.get("https://httpbin.org/get").status_code == 200
+    assert 0.25 <= sleeps[0] <= 0.5
+    assert 0.5 <= sleeps[1] <= 1.0
+
+    request_patch.side_effect = [urlrequest.Response(b"", status_code=503)]
+    assert urlrequest.post("https://httpbin.org/post").status_code == 503
+    assert len(sleeps) == 2
+
+
+def test_circuit_breaker(mocker: MockerFixture, sleeps: list[float]):
+    """Test that the circuit opens after consecutive failures and closes after a trial."""
+    now = mocker.patch("ida_py.urlrequest.limits.time.monotonic", return_value=100.0)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record("api.telegram.org", success=False)
+    breaker.check("api.telegram.org")
+    breaker.record("api.telegram.org", success=False)
+    with pytest.raises(urlrequest.RequestError, match="after 2 consecutive failures"):
+        breaker.check("api.telegram.org")
+    breaker.check("httpbin.org")
 
+    now.return_value = 131.0
+    breaker.check("api.telegram.org")  # The trial
+    with pytest.raises(urlrequest.RequestError):
+        breaker.check("api.telegram.org")
+    breaker.record("api.telegram.org", success=True)
+    breaker.check("api.telegram.org")
 
-def test_failing_request_httperror(mocker: MockerFixture):
-    """Test that an HTTPError is returned as a Response with the respective reason and status."""
-    urlopen_patch = mocker.patch("ida_py.urlrequest.main.urlopen")
-    urlopen_patch.side_effect = HTTPError("https://dummy.url", 500, "DUMMY", HTTPMessage(), None)
-    response = urlrequest.get("https://dummy.url")
-    assert response.body == b"DUMMY"
-    assert response.status_code == 500
+    request_patch = mocker.patch("ida_py.urlrequest.main.POOL.request")
+    request_patch.return_value = urlrequest.Response(b"", status_code=500)
+    for _ in range(5):
+        urlrequest.post("https://httpbin.org/post")
+    with pytest.raises(urlrequest.RequestError, match="The circuit for httpbin.org is open"):
+        urlrequest.post("https://httpbin.org/post")
+    assert request_patch.call_count == 5